@@ -1,15 +1,15 @@
-import gradio as gr
-import requests
-import json
+from __future__ import annotations
+
+import startup
+startup.begin()
+
+import asyncio
 import os
 import base64
-from cryptography.fernet import Fernet
-from PIL import Image
-import io
 import uuid
+import secrets
 import threading
 import time
-import httpx
 import sys
 import platform
 import webbrowser
@@ -17,77 +17,113 @@ import subprocess
 from pathlib import Path
 import logging
 
+import openrouter_client
+import settings
+import metrics
+import model_fanout
+from conversation_store import ConversationStore
+from fileutil import create_text_once
+from config_store import ConfigStore
+from image_pipeline import ImagePipeline
+from model_catalog import ModelCatalog
+from model_stats import ModelStats
+import context_window
+import frameworks
+import prompt_builder
+from context_window import ContextManager, estimate_tokens
+from reasoning_cache import ReasoningCache
+from reasoning_prefetch import ReasoningPrefetcher
+from response_cache import ResponseCache
+from session_config import SessionConfig
+from session_memory import SessionMemory
+
+# Gradio takes seconds to import; it loads when the UI is built or a handler first touches it.
+gr = startup.lazy_import("gradio")
+
 # --- MacOS App Support Directory ---
 def get_app_support_dir():
-    # Use ~/Library/Application Support/NeuroPrime for config/data
-    home = os.path.expanduser("~")
-    support_dir = os.path.join(home, "Library", "Application Support", "NeuroPrime")
+    # Use ~/Library/Application Support/NeuroPrime for config/data unless overridden
+    # (benchmarks point this at a scratch directory).
+    support_dir = os.environ.get("NEUROPRIME_APP_SUPPORT_DIR")
+    if not support_dir:
+        home = os.path.expanduser("~")
+        support_dir = os.path.join(home, "Library", "Application Support", "NeuroPrime")
     os.makedirs(support_dir, exist_ok=True)
     return support_dir
 
 APP_SUPPORT_DIR = get_app_support_dir()
 CONFIG_FILE = os.path.join(APP_SUPPORT_DIR, "config.json")
 KEY_FILE = os.path.join(APP_SUPPORT_DIR, "key.bin")
+REASONING_CACHE_FILE = os.path.join(APP_SUPPORT_DIR, "reasoning_cache.json")
+CONVERSATIONS_DB = os.path.join(APP_SUPPORT_DIR, "conversations.db")
+RESPONSE_CACHE_DB = os.path.join(APP_SUPPORT_DIR, "response_cache.db")
+MODEL_CATALOG_FILE = os.path.join(APP_SUPPORT_DIR, "model_catalog.json")
+MODEL_STATS_FILE = os.path.join(APP_SUPPORT_DIR, "model_stats.json")
+BROWSER_SECRET_FILE = os.path.join(APP_SUPPORT_DIR, "browser_secret")
+SESSION_SPILL_DIR = os.path.join(APP_SUPPORT_DIR, "session_spill")
 DEFAULT_MODELS = ["openai/gpt-3.5-turbo", "anthropic/claude-3-haiku"]
+SYSTEM_PROMPT = "You are a helpful assistant."
+# Model dropdown value that routes each request to the fastest healthy model on measured data.
+AUTO_MODEL = "auto"
 
-# --- Encryption Key Management ---
-def get_encryption_key():
-    if os.path.exists(KEY_FILE):
-        with open(KEY_FILE, "rb") as f:
-            return f.read()
-    else:
-        key = Fernet.generate_key()
-        with open(KEY_FILE, "wb") as f:
-            f.write(key)
-        return key
+# --- Config Management ---
+config_store = ConfigStore(
+    CONFIG_FILE,
+    KEY_FILE,
+    defaults={"api_key": "", "models": list(DEFAULT_MODELS)},
+    flush_delay=settings.CONFIG_FLUSH_DELAY
+)
 
-def encrypt_api_key(api_key):
-    key = get_encryption_key()
-    cipher = Fernet(key)
-    return cipher.encrypt(api_key.encode()).decode()
+# Shared defaults; what each browser session may change is layered on top of them per session.
+session_config = SessionConfig(config_store, multi_user=settings.MULTI_USER)
 
-def decrypt_api_key(encrypted_api_key):
-    key = get_encryption_key()
-    cipher = Fernet(key)
-    return cipher.decrypt(encrypted_api_key.encode()).decode()
+conversation_store = ConversationStore(CONVERSATIONS_DB)
 
-# --- Config Management ---
-def load_config():
-    try:
-        if os.path.exists(CONFIG_FILE):
-            with open(CONFIG_FILE, "r") as f:
-                config = json.load(f)
-                if "api_key" in config and config["api_key"]:
-                    try:
-                        config["api_key"] = decrypt_api_key(config["api_key"])
-                    except Exception:
-                        config["api_key"] = ""
-                if "models" not in config or not config["models"]:
-                    config["models"] = DEFAULT_MODELS
-                return config
-    except Exception:
-        pass
-    return {"api_key": "", "models": DEFAULT_MODELS, "conversations": []}
+# OpenRouter's model listing: names, context lengths and input modalities.
+model_catalog = ModelCatalog(MODEL_CATALOG_FILE, openrouter_client.get_models, ttl=settings.MODEL_CATALOG_TTL)
+
+# Rolling speed, error rate and cost per model, recorded from every API call.
+model_stats = ModelStats(MODEL_STATS_FILE, window=settings.MODEL_STATS_WINDOW, max_age=settings.MODEL_STATS_MAX_AGE)
+openrouter_client.add_call_listener(model_stats.observe_call)
+
+context_manager = ContextManager(
+    default_window=settings.CONTEXT_DEFAULT_WINDOW,
+    model_windows=settings.CONTEXT_MODEL_WINDOWS,
+    max_budget=settings.CONTEXT_MAX_BUDGET,
+    reply_reserve=settings.CONTEXT_REPLY_RESERVE,
+    summary_share=settings.CONTEXT_SUMMARY_SHARE,
+    window_lookup=model_catalog.context_length,
+    fold_target=settings.CONTEXT_FOLD_TARGET
+)
+
+image_pipeline = ImagePipeline(
+    default_max_edge=settings.IMAGE_MAX_EDGE,
+    model_max_edges=settings.IMAGE_MODEL_MAX_EDGES,
+    byte_budget=settings.IMAGE_BYTE_BUDGET,
+    cache_size=settings.IMAGE_CACHE_SIZE
+)
+
+reasoning_cache = ReasoningCache(
+    REASONING_CACHE_FILE,
+    max_entries=settings.REASONING_CACHE_SIZE,
+    ttl=settings.REASONING_CACHE_TTL,
+    similarity_threshold=settings.REASONING_CACHE_SIMILARITY
+)
 
-def save_config(config):
-    config_to_save = config.copy()
-    if "api_key" in config_to_save and config_to_save["api_key"]:
-        config_to_save["api_key"] = encrypt_api_key(config_to_save["api_key"])
-    os.makedirs(os.path.dirname(CONFIG_FILE), exist_ok=True)
-    with open(CONFIG_FILE, "w") as f:
-        json.dump(config_to_save, f)
-    return True
+response_cache = ResponseCache(
+    RESPONSE_CACHE_DB,
+    max_bytes=settings.RESPONSE_CACHE_MAX_BYTES,
+    enabled=settings.RESPONSE_CACHE_ENABLED
+)
 
-config = load_config()
+# Picks a curated framework pair locally for common kinds of query, skipping the reasoning call.
+framework_classifier = (
+    frameworks.FrameworkClassifier(min_score=settings.REASONING_LOCAL_MIN_SCORE)
+    if settings.REASONING_LOCAL_FAST_PATH else None
+)
 
 # --- OpenRouter API Functions ---
-def get_reasoning_approach(query, api_key, model):
-    if not api_key:
-        return "API key is required.", None
-    headers = {
-        "Authorization": f"Bearer {api_key}",
-        "Content-Type": "application/json"
-    }
+def build_reasoning_payload(query, model):
     reasoning_prompt = f"""
     I have a question/task: "{query}"
 
@@ -100,134 +136,518 @@ def get_reasoning_approach(query, api_key, model):
     Explain briefly why these two specific frameworks combined would yield the best results for this particular 
     query. Be specific about how they complement each other.
 
-    FORMAT YOUR RESPONSE AS:
-    1. Framework 1: [name] - [brief justification]
-    2. Framework 2: [name] - [brief justification]
-    3. Why combining them works: [explanation]
-    4. Hybrid prompt prefix to add: [A paragraph that instructs how to use these two frameworks together]
+    RESPOND WITH A JSON OBJECT ONLY, with these keys:
+    "framework_1": {{"name": ..., "justification": ...}},
+    "framework_2": {{"name": ..., "justification": ...}},
+    "why_combined": why combining them works,
+    "hybrid_prefix": a paragraph that instructs how to use these two frameworks together
     """
-    payload = {
+    return {
         "model": model,
         "messages": [
             {"role": "user", "content": reasoning_prompt}
-        ]
+        ],
+        # Providers without structured outputs ignore this; the prompt still asks for the same JSON.
+        "response_format": {"type": "json_schema", "json_schema": frameworks.RESPONSE_SCHEMA}
     }
+
+def parse_reasoning_response(response_data):
+    """Return (reasoning text, hybrid prompt), raising ValueError when the reply has no usable prefix."""
+    if not response_data.get("choices"):
+        raise ValueError("Failed to get reasoning approach.")
+    content = response_data["choices"][0]["message"]["content"] or ""
     try:
-        response = requests.post("https://openrouter.ai/api/v1/chat/completions", 
-                                 headers=headers, json=payload)
-        response.raise_for_status()
-        response_data = response.json()
-        if "choices" in response_data and len(response_data["choices"]) > 0:
-            result = response_data["choices"][0]["message"]["content"]
-            sections = result.split("Hybrid prompt prefix to add:")
-            if len(sections) > 1:
-                hybrid_prompt = sections[1].strip()
-                return result, hybrid_prompt
-            else:
-                return result, None
-        else:
-            return "Failed to get reasoning approach.", None
+        pair = frameworks.parse_structured(content)
+    except ValueError as e:
+        # Older replies (or models that ignore response_format) use the numbered text layout.
+        sections = content.split("Hybrid prompt prefix to add:")
+        if len(sections) > 1 and sections[1].strip():
+            return content, sections[1].strip()
+        raise ValueError(f"Unusable reasoning reply: {e}") from e
+    return frameworks.format_reasoning(pair), pair.hybrid_prefix
+
+def local_reasoning(query):
+    """(reasoning text, hybrid prompt) from the framework library when the classifier is confident, else None."""
+    pair = framework_classifier.classify(query) if framework_classifier else None
+    if pair is None:
+        return None
+    return frameworks.format_reasoning(pair), pair.hybrid_prefix
+
+async def fetch_reasoning(query, api_key, model, operation="reasoning"):
+    """(reasoning text, hybrid prompt) from the framework library, the reasoning cache or the model.
+
+    Raises when the model call fails or its reply has no usable prefix.
+    """
+    local = local_reasoning(query)
+    if local:
+        metrics.REASONING_RESULTS.inc(source="library")
+        return local
+    if not api_key:
+        raise ValueError("API key is required.")
+    cached = reasoning_cache.get(query, model)
+    if cached:
+        metrics.REASONING_RESULTS.inc(source="cache")
+        return cached
+    payload = build_reasoning_payload(query, model)
+    response_data = await openrouter_client.async_post_chat_completion(api_key, payload, operation=operation)
+    result, hybrid_prompt = parse_reasoning_response(response_data)
+    metrics.REASONING_RESULTS.inc(source="model")
+    if hybrid_prompt:
+        await asyncio.to_thread(reasoning_cache.put, query, model, result, hybrid_prompt)
+    return result, hybrid_prompt
+
+async def get_reasoning_approach_async(query, api_key, model):
+    """fetch_reasoning for the UI: a failure comes back as an error message with no hybrid prompt."""
+    try:
+        return await fetch_reasoning(query, api_key, model)
     except Exception as e:
         return f"Error: {str(e)}", None
 
-def send_message(messages, api_key, model, hybrid_prompt=None, image_data=None):
-    if not api_key:
-        return "API key is required."
-    headers = {
-        "Authorization": f"Bearer {api_key}",
-        "Content-Type": "application/json"
-    }
-    formatted_messages = []
-    for msg in messages:
-        if msg["role"] == "system":
-            formatted_messages.append({"role": "system", "content": msg["content"]})
-        else:
-            content = msg["content"]
-            if hybrid_prompt and msg == messages[-1] and msg["role"] == "user":
-                content = f"{hybrid_prompt}\n\nUser query: {content}"
-            if image_data and msg == messages[-1] and msg["role"] == "user":
-                formatted_messages.append({
-                    "role": msg["role"],
-                    "content": [
-                        {"type": "text", "text": content},
-                        {"type": "image_url", "image_url": {"url": f"data:image/jpeg;base64,{image_data}"}}
-                    ]
-                })
-            else:
-                formatted_messages.append({"role": msg["role"], "content": content})
+reasoning_prefetcher = ReasoningPrefetcher(get_reasoning_approach_async, debounce=settings.PIPELINE_DEBOUNCE)
+
+# Bounds what open sessions keep in RAM: idle histories and pending images spill to disk.
+session_memory = SessionMemory(
+    SESSION_SPILL_DIR,
+    budget_bytes=settings.SESSION_MEMORY_BUDGET,
+    idle_ttl=settings.SESSION_IDLE_TTL
+)
+
+def build_chat_payload(messages, model, hybrid_prompt=None, image_data=None):
+    started = time.perf_counter()
     payload = {
         "model": model,
-        "messages": formatted_messages
+        "messages": prompt_builder.build_messages(
+            messages, hybrid_prompt, image_data, prompt_builder.supports_cache_control(model)
+        ),
+        # Asks for the usage block on streams too; it carries the cached-token counts.
+        "usage": {"include": True}
     }
+    if settings.CHAT_TEMPERATURE is not None:
+        payload["temperature"] = settings.CHAT_TEMPERATURE
+    if settings.CHAT_SEED is not None:
+        payload["seed"] = settings.CHAT_SEED
+    metrics.observe_stage("chat", model, "prompt_build", time.perf_counter() - started)
+    return payload
+
+def extract_reply(response_data):
+    if "choices" in response_data and len(response_data["choices"]) > 0:
+        return response_data["choices"][0]["message"]["content"]
+    else:
+        return "No response from the model."
+
+async def send_message_async(messages, api_key, model, hybrid_prompt=None, image_data=None):
+    if not api_key:
+        return "API key is required."
+    payload = build_chat_payload(messages, model, hybrid_prompt, image_data)
+    cached = await asyncio.to_thread(response_cache.get, payload) if response_cache.enabled else None
+    if cached is not None:
+        return cached
     try:
-        response = requests.post("https://openrouter.ai/api/v1/chat/completions", 
-                                 headers=headers, json=payload)
-        response.raise_for_status()
-        response_data = response.json()
-        if "choices" in response_data and len(response_data["choices"]) > 0:
-            return response_data["choices"][0]["message"]["content"]
-        else:
-            return "No response from the model."
+        response_data = await openrouter_client.async_post_chat_completion(api_key, payload)
     except Exception as e:
         return f"Error: {str(e)}"
+    reply = extract_reply(response_data)
+    if response_cache.enabled and response_data.get("choices"):
+        await asyncio.to_thread(response_cache.put, payload, reply)
+    return reply
+
+async def stream_message_async(messages, api_key, model, hybrid_prompt=None, image_data=None):
+    """Async generator of the assistant reply text so far."""
+    if not api_key:
+        yield "API key is required."
+        return
+    payload = build_chat_payload(messages, model, hybrid_prompt, image_data)
+    cached = await asyncio.to_thread(response_cache.get, payload) if response_cache.enabled else None
+    if cached is not None:
+        yield cached
+        return
+    content = ""
+    try:
+        async for chunk in openrouter_client.async_stream_chat_completion(api_key, payload):
+            delta = openrouter_client.chunk_delta(chunk)
+            if delta:
+                content += delta
+                yield content
+    except Exception as e:
+        content = f"{content}\n\nError: {str(e)}" if content else f"Error: {str(e)}"
+        yield content
+        return
+    if not content:
+        yield "No response from the model."
+    elif response_cache.enabled:
+        await asyncio.to_thread(response_cache.put, payload, content)
 
 def encode_image(image_path):
     with open(image_path, "rb") as image_file:
         return base64.b64encode(image_file.read()).decode('utf-8')
 
 # --- UI Functions ---
-def save_api_key(api_key):
-    global config
-    config["api_key"] = api_key
-    success = save_config(config)
-    return "API key saved successfully!" if api_key and success else "API key cleared."
-
-def add_model(model_name):
-    global config
-    if model_name and model_name not in config["models"]:
-        config["models"].append(model_name)
-        success = save_config(config)
-        return gr.Dropdown(choices=config["models"], value=model_name), f"Model {model_name} added!"
-    elif model_name in config["models"]:
-        return gr.Dropdown(choices=config["models"], value=model_name), f"Model {model_name} already exists."
+# session_id -> owner of the conversations it stores and lists, set by identify_browser on page load.
+session_owners = {}
+
+def conversation_owner(session_id):
+    # Multi-user deployments scope history to a user: the signed-in name, else a per-browser id.
+    if not settings.MULTI_USER:
+        return None
+    return session_owners.get(session_id, session_id)
+
+def identify_browser(session_id, browser_id, request: gr.Request = None):
+    """Tie this page's session to a persistent owner; returns the browser id to keep in localStorage."""
+    if not browser_id:
+        browser_id = uuid.uuid4().hex
+    username = getattr(request, "username", None)
+    session_owners[session_id] = f"user:{username}" if username else browser_id
+    return browser_id
+
+def load_browser_secret():
+    """Key for the browser id in localStorage; stable across restarts so the id (and its history) survives them."""
+    if settings.BROWSER_STATE_SECRET:
+        return settings.BROWSER_STATE_SECRET
+    try:
+        with open(BROWSER_SECRET_FILE, "r") as f:
+            return f.read().strip()
+    except FileNotFoundError:
+        pass
+    # Two processes starting together both get here; each ends up with the first one's secret.
+    return create_text_once(BROWSER_SECRET_FILE, secrets.token_urlsafe(32)).strip()
+
+async def save_api_key(api_key, overrides):
+    overrides = session_config.update(overrides, api_key=api_key)
+    return ("API key saved successfully!" if api_key else "API key cleared."), overrides
+
+def add_model(model_name, overrides):
+    model_name = (model_name or "").strip()
+    models = session_config.get(overrides, "models")
+    if model_name and model_name not in models:
+        model_catalog.refresh()  # no-op unless the cached listing is stale
+        if model_catalog.is_known(model_name) is False:
+            suggestions = model_catalog.complete(model_name.rpartition("/")[2], limit=3)
+            hint = f" Did you mean {', '.join(suggestions)}?" if suggestions else ""
+            return gr.Dropdown(choices=model_choices(models)), f"Model {model_name} is not in the OpenRouter catalog.{hint}", overrides
+        def add(models):
+            if model_name not in models:
+                models.append(model_name)
+        overrides, models = session_config.edit_models(overrides, add)
+        return gr.Dropdown(choices=model_choices(models), value=model_name), f"Model {model_name} added!", overrides
+    elif model_name in models:
+        return gr.Dropdown(choices=model_choices(models), value=model_name), f"Model {model_name} already exists.", overrides
     else:
-        return gr.Dropdown(choices=config["models"]), "Please enter a valid model name."
-
-def remove_model(model_name):
-    global config
-    if model_name in config["models"] and len(config["models"]) > 1:
-        config["models"].remove(model_name)
-        success = save_config(config)
-        return gr.Dropdown(choices=config["models"], value=config["models"][0]), f"Model {model_name} removed!"
-    elif len(config["models"]) <= 1:
-        return gr.Dropdown(choices=config["models"]), "Cannot remove the last model."
+        return gr.Dropdown(choices=model_choices(models)), "Please enter a valid model name.", overrides
+
+def model_choices(models):
+    return [("auto (fastest measured model)", AUTO_MODEL)] + list(models)
+
+def route_model(model, overrides=None, image=False):
+    """model itself, or for AUTO_MODEL the fastest healthy session model (image: one that takes images).
+
+    Returns None when auto routing finds no model that fits.
+    """
+    if model != AUTO_MODEL:
+        return model
+    return model_stats.route(
+        session_config.get(overrides, "models"),
+        accept=(lambda candidate: image_rejection(candidate) is None) if image else None,
+        min_samples=settings.ROUTER_MIN_SAMPLES,
+        max_error_rate=settings.ROUTER_MAX_ERROR_RATE,
+        reply_tokens=settings.ROUTER_REPLY_TOKENS
+    )
+
+def model_stats_report(overrides):
+    auto_pick = route_model(AUTO_MODEL, overrides)
+    rows = []
+    for model in session_config.get(overrides, "models"):
+        s = model_stats.summary(model)
+        rows.append([
+            model + (" (auto)" if model == auto_pick else ""),
+            s["samples"],
+            f"{s['ttft']:.2f}" if s["ttft"] is not None else "--",
+            f"{s['tokens_per_second']:.1f}" if s["tokens_per_second"] else "--",
+            f"{s['error_rate']:.0%}" if s["samples"] else "--",
+            f"{s['cost']:.5f}" if s["cost"] is not None else "--",
+        ])
+    return rows
+
+def complete_model_name(key_up: gr.KeyUpData):
+    return gr.Dropdown(choices=model_catalog.complete(key_up.input_value))
+
+def image_rejection(model):
+    """An error message when the catalog says model takes no image input, else None."""
+    if model_catalog.supports(model, "image") is False:
+        return f"{model} does not accept images. Remove the image or pick a vision model."
+    return None
+
+def remove_model(model_name, overrides):
+    models = session_config.get(overrides, "models")
+    if model_name in models and len(models) > 1:
+        def remove(models):
+            if model_name in models and len(models) > 1:
+                models.remove(model_name)
+        overrides, models = session_config.edit_models(overrides, remove)
+        return gr.Dropdown(choices=model_choices(models), value=models[0]), f"Model {model_name} removed!", overrides
+    elif len(models) <= 1:
+        return gr.Dropdown(choices=model_choices(models)), "Cannot remove the last model.", overrides
     else:
-        return gr.Dropdown(choices=config["models"]), f"Model {model_name} not found."
+        return gr.Dropdown(choices=model_choices(models)), f"Model {model_name} not found.", overrides
 
-def get_reasoning(query, api_key, model):
-    reasoning_result, hybrid_prompt = get_reasoning_approach(query, api_key, model)
-    return reasoning_result, hybrid_prompt
+async def get_reasoning(query, api_key, model, session_id=None, conversation_id=None, overrides=None,
+                        request: gr.Request = None):
+    model = route_model(model, overrides)
+    metrics.observe_queue_wait("reasoning", model, request)
+    started = time.perf_counter()
+    try:
+        reasoning_result, hybrid_prompt = await get_reasoning_approach_async(query, api_key, model)
+        if hybrid_prompt:
+            conversation_id = await record_reasoning(conversation_id, session_id, query, reasoning_result)
+        outcome = "ok" if hybrid_prompt else "error"
+        return reasoning_result, hybrid_prompt, conversation_id
+    except BaseException as e:
+        outcome = metrics.outcome_of(e)
+        raise
+    finally:
+        metrics.observe_stage("reasoning", model, "handler", time.perf_counter() - started, outcome)
 
-def upload_image(image):
-    if image is None:
-        return None
-    img_byte_arr = io.BytesIO()
-    image.save(img_byte_arr, format='JPEG')
-    img_byte_arr = img_byte_arr.getvalue()
-    return base64.b64encode(img_byte_arr).decode('utf-8')
-
-def on_submit(message, chat_history, api_key, model, hybrid_prompt, image_data):
-    if not message:
-        return "", chat_history
-    chat_history.append({"role": "user", "content": message})
-    messages = [{"role": "system", "content": "You are a helpful assistant."}]
-    messages.extend(chat_history)
-    response = send_message(messages, api_key, model, hybrid_prompt, image_data)
-    chat_history.append({"role": "assistant", "content": response})
-    return "", chat_history, None, None
-
-def format_chat_history(chat_history):
-    return chat_history
+async def record_reasoning(conversation_id, session_id, query, reasoning_result):
+    """Store a reasoning framework with its conversation so history search can find it."""
+    if conversation_id is None:
+        conversation_id = await asyncio.to_thread(
+            conversation_store.create_conversation, query, conversation_owner(session_id)
+        )
+    await asyncio.to_thread(conversation_store.append_message, conversation_id, "reasoning", reasoning_result)
+    return conversation_id
+
+async def prefetch_reasoning(message, api_key, model, pipeline, session_id, overrides=None):
+    if not pipeline or not message or not message.strip() or not api_key:
+        reasoning_prefetcher.discard(session_id)
+        return gr.skip()
+    model = route_model(model, overrides)
+    speculation = await reasoning_prefetcher.speculate(session_id, message, api_key, model)
+    if speculation is None:
+        return gr.skip()
+    reasoning_result, _ = speculation
+    return reasoning_result
+
+def upload_image(image, model=None):
+    started = time.perf_counter()
+    image_data = image_pipeline.prepare(image, model)
+    metrics.observe_stage("image", model, "image_encode", time.perf_counter() - started)
+    return image_data
+
+async def on_submit(message, chat_history, api_key, model, hybrid_prompt, image_data,
+                    stream=settings.STREAM_RESPONSES, pipeline=False, session_id=None, conversation_id=None,
+                    context_summary=None, overrides=None, request: gr.Request = None):
+    started = time.perf_counter()
+    selected = model
+    error = None
+    try:
+        if message:
+            model = route_model(selected, overrides, image=bool(image_data))
+        # Labelled with the routed model, so "auto" never shows up as a model on /metrics.
+        metrics.observe_queue_wait("chat", model or selected, request)
+        if not message:
+            yield "", chat_history, gr.skip(), hybrid_prompt, image_data, conversation_id, context_summary
+            return
+        if model is None:
+            gr.Warning("None of your models accepts images. Remove the image or add a vision model.")
+            yield message, chat_history, gr.skip(), hybrid_prompt, image_data, conversation_id, context_summary
+            return
+        if selected == AUTO_MODEL:
+            gr.Info(f"Auto: {model}")
+        rejection = image_data and image_rejection(model)
+        if rejection:
+            # Refuse before anything is sent or saved; the message stays in the box to retry.
+            gr.Warning(rejection)
+            yield message, chat_history, gr.skip(), hybrid_prompt, image_data, conversation_id, context_summary
+            return
+        # Reloads a history that was spilled to disk, and keeps this session resident until the turn ends.
+        with session_memory.use(session_id, chat_history):
+            image = session_memory.resolve(session_id, image_data)
+            if pipeline and not hybrid_prompt and api_key:
+                # Picks up the speculative prefetch for this text, or fetches it now if none is ready.
+                reasoning_result, hybrid_prompt = await reasoning_prefetcher.result_for(
+                    session_id, message, api_key, route_model(selected, overrides)
+                )
+                if hybrid_prompt:
+                    conversation_id = await record_reasoning(conversation_id, session_id, message, reasoning_result)
+            if conversation_id is None:
+                conversation_id = await asyncio.to_thread(
+                    conversation_store.create_conversation, message, conversation_owner(session_id)
+                )
+            await asyncio.to_thread(conversation_store.append_message, conversation_id, "user", message)
+            chat_history.append({"role": "user", "content": message})
+            # Older turns beyond the model's budget are folded into a rolling summary.
+            context_started = time.perf_counter()
+            extra_tokens = estimate_tokens(hybrid_prompt) + (context_window.IMAGE_TOKENS if image else 0)
+            messages, context_summary = context_manager.build(
+                SYSTEM_PROMPT, chat_history, context_manager.budget_for(model), context_summary, extra_tokens
+            )
+            metrics.observe_stage("chat", model, "context_build", time.perf_counter() - context_started)
+            try:
+                if stream:
+                    chat_history.append({"role": "assistant", "content": ""})
+                    yield "", chat_history, chat_window(chat_history), hybrid_prompt, image_data, conversation_id, context_summary
+                    async for partial in stream_message_async(messages, api_key, model, hybrid_prompt, image):
+                        chat_history[-1] = {"role": "assistant", "content": partial}
+                        yield "", chat_history, chat_window(chat_history), hybrid_prompt, image_data, conversation_id, context_summary
+                else:
+                    response = await send_message_async(messages, api_key, model, hybrid_prompt, image)
+                    chat_history.append({"role": "assistant", "content": response})
+            except asyncio.CancelledError:
+                # Stop button: the request's connection is closed by now; keep whatever had arrived.
+                partial = chat_history.pop()["content"] if chat_history[-1]["role"] == "assistant" else ""
+                chat_history.append({"role": "assistant", "content": f"{partial}\n\n[Stopped]" if partial else "[Stopped]"})
+                conversation_store.append_message(conversation_id, "assistant", chat_history[-1]["content"])
+                raise
+            await asyncio.to_thread(conversation_store.append_message, conversation_id, "assistant", chat_history[-1]["content"])
+            session_memory.release_blob(session_id)  # the image has been sent; its state is cleared below
+            yield "", chat_history, chat_window(chat_history), None, None, conversation_id, context_summary
+    except BaseException as e:
+        error = e
+        raise
+    finally:
+        metrics.observe_stage("chat", model or selected, "handler", time.perf_counter() - started, metrics.outcome_of(error))
+
+def format_conversation_label(conversation):
+    updated = time.strftime("%Y-%m-%d %H:%M", time.localtime(conversation["updated_at"]))
+    return f"{conversation['title']} ({updated})"
+
+async def refresh_conversation_choices(session_id=None):
+    conversations = await asyncio.to_thread(
+        conversation_store.list_conversations, settings.HISTORY_LIST_SIZE, 0, conversation_owner(session_id)
+    )
+    return gr.Dropdown(choices=[(format_conversation_label(c), c["id"]) for c in conversations])
+
+def _history_page(page):
+    return [{"role": m["role"], "content": m["content"]} for m in page]
+
+async def load_conversation(conversation_id, session_id=None):
+    if not conversation_id:
+        return gr.skip(), gr.skip(), gr.skip(), gr.skip(), gr.skip()
+    page = await asyncio.to_thread(
+        conversation_store.load_messages, conversation_id, None, settings.HISTORY_PAGE_SIZE, conversation_owner(session_id)
+    )
+    chat_history = _history_page(page)
+    session_memory.track(session_id, chat_history)
+    cursor = page[0]["id"] if page else None
+    return chat_history, chat_window(chat_history), conversation_id, cursor, None
+
+async def load_older_messages(conversation_id, cursor, chat_history, session_id=None):
+    if not conversation_id or cursor is None:
+        return gr.skip(), gr.skip(), gr.skip(), gr.skip()
+    page = await asyncio.to_thread(
+        conversation_store.load_messages, conversation_id, cursor, settings.HISTORY_PAGE_SIZE, conversation_owner(session_id)
+    )
+    if not page:
+        return gr.skip(), gr.skip(), None, gr.skip()
+    with session_memory.use(session_id, chat_history):
+        chat_history = _history_page(page) + chat_history
+    session_memory.track(session_id, chat_history)
+    # Asked-for older pages are shown in full until the next turn narrows the view again.
+    # Prepending shifts message positions, so the rolling summary starts over.
+    return chat_history, chat_history, page[0]["id"], None
+
+def new_conversation(session_id=None):
+    chat_history = []
+    session_memory.track(session_id, chat_history)
+    return chat_history, [], None, None, None
+
+def end_session(session_id):
+    session_owners.pop(session_id, None)
+    reasoning_prefetcher.discard(session_id)
+    session_memory.forget(session_id)
+
+def session_memory_report(session_id=None):
+    stats = session_memory.stats()
+    mine = session_id[:8] if session_id else None
+    rows = [
+        [("> " if s["session"] == mine else "") + s["session"], s["messages"], round(s["resident_bytes"] / 1024, 1),
+         round(s["spilled_bytes"] / 1024, 1), s["idle_seconds"], "yes" if s["busy"] else ""]
+        for s in stats["sessions"]
+    ]
+    summary = (
+        f"**{len(rows)} sessions** | resident {stats['resident_bytes'] / 2**20:.2f} MiB of "
+        f"{stats['budget_bytes'] / 2**20:.0f} MiB budget | spilled to disk {stats['spilled_bytes'] / 2**20:.2f} MiB"
+    )
+    return summary, rows
+
+def format_search_result(result):
+    role = "REASONING" if result["role"] == "reasoning" else result["role"].upper()
+    return f"{result['title']} | {role}: {' '.join(result['snippet'].split())}"
+
+async def search_history(text, session_id=None):
+    results = await asyncio.to_thread(
+        conversation_store.search, text or "", settings.SEARCH_RESULTS, conversation_owner(session_id)
+    )
+    return gr.Dropdown(choices=[(format_search_result(r), r["conversation_id"]) for r in results], value=None)
+
+def reindex_search():
+    started = time.perf_counter()
+    count = conversation_store.reindex()
+    print(f"Reindexed {count} messages in {time.perf_counter() - started:.2f}s")
+
+def format_run_stats(run):
+    if run.error:
+        return f"**ERR0R** after {run.latency:.2f}s: {run.error}"
+    parts = [f"TTFT {run.ttft:.2f}s" if run.ttft is not None else "TTFT --"]
+    parts.append(f"{'total' if run.done else 'elapsed'} {run.latency:.2f}s")
+    if run.tokens_per_second is not None:
+        parts.append(f"{run.tokens_per_second:.1f} tok/s")
+    parts.append(f"{run.completion_tokens} tokens")
+    cached = prompt_builder.cached_tokens(run.usage)
+    if cached:
+        parts.append(f"{cached} prompt tokens cached")
+    return " | ".join(parts)
+
+def render_compare_panes(runs):
+    columns, outputs, stats = [], [], []
+    for i in range(settings.MAX_COMPARE_MODELS):
+        if i < len(runs):
+            columns.append(gr.update(visible=True))
+            outputs.append(f"### {runs[i].model}\n\n{runs[i].content}")
+            stats.append(format_run_stats(runs[i]))
+        else:
+            columns.append(gr.update(visible=False))
+            outputs.append("")
+            stats.append("")
+    return columns + outputs + stats
+
+async def on_compare(message, chat_history, api_key, models, hybrid_prompt, image_data, session_id=None,
+                     request: gr.Request = None):
+    metrics.observe_queue_wait("compare", None, request)
+    image_data = session_memory.resolve(session_id, image_data)
+    if not message or not models:
+        yield render_compare_panes([])
+        return
+    if not api_key:
+        yield render_compare_panes([model_fanout.ModelRun(model, error="API key is required.", started_at=0, finished_at=0)
+                                    for model in models[:settings.MAX_COMPARE_MODELS]])
+        return
+    models = models[:settings.MAX_COMPARE_MODELS]
+    rejected = []
+    if image_data:
+        rejections = {model: image_rejection(model) for model in models}
+        rejected = [model_fanout.ModelRun(model, error=error, started_at=0, finished_at=0)
+                    for model, error in rejections.items() if error]
+        models = [model for model, error in rejections.items() if not error]
+        if not models:
+            yield render_compare_panes(rejected)
+            return
+    budget = min(context_manager.budget_for(model) for model in models)
+    extra_tokens = estimate_tokens(hybrid_prompt) + (context_window.IMAGE_TOKENS if image_data else 0)
+    with session_memory.use(session_id, chat_history):
+        messages, _ = context_manager.build(
+            SYSTEM_PROMPT, chat_history + [{"role": "user", "content": message}], budget, None, extra_tokens
+        )
+    payload = build_chat_payload(messages, None, hybrid_prompt, image_data)
+    async for runs in model_fanout.fan_out(api_key, payload, models):
+        yield render_compare_panes(runs + rejected)
+
+def refresh_compare_choices(overrides):
+    return gr.CheckboxGroup(choices=session_config.get(overrides, "models"))
+
+def chat_window(chat_history):
+    """The newest messages, which are all the Chatbot shows; the full history stays server-side in chat_state."""
+    limit = settings.CHAT_WINDOW_MESSAGES
+    return chat_history[-limit:] if limit > 0 else chat_history
 
 # --- Custom CSS for 90s hacker aesthetic ---
 custom_css = """
@@ -365,117 +785,272 @@ button:hover {
 """
 
 # --- Main UI ---
-with gr.Blocks(css=custom_css) as demo:
-    current_hybrid_prompt = gr.State(None)
-    current_image_data = gr.State(None)
-    chat_state = gr.State([])
-
-    gr.HTML("""
-    <div class="scanlines"></div>
-    <div class="crt-flicker"></div>
-    <div class="app-header">
-        <h1 class="glitch" data-text="NeuroPrime">NeuroPrime</h1>
-        <p>Advanced Neural Reasoning Framework</p>
-    </div>
-    """)
-
-    with gr.Row():
-        with gr.Column(scale=3):
-            chatbot = gr.Chatbot(
-                [],
-                elem_id="chatbot",
-                avatar_images=("🧠", "🤖"),
-                height=500,
-                container=True,
-                type="messages"
-            )
-            with gr.Row():
-                with gr.Column(scale=8):
-                    msg = gr.Textbox(
-                        show_label=False,
-                        placeholder="H4CK TH3 PL4N3T...",
-                        container=False,
-                        elem_classes=["input-box"]
+def load_api_key(overrides):
+    # Read per page load rather than baked into the Blocks, so the key is decrypted on first use
+    # and, in multi-user mode, only ever comes from the visitor's own session.
+    return session_config.get(overrides, "api_key", "")
+
+def build_ui():
+    """Build the Blocks tree and configure its queue."""
+    with gr.Blocks(css=custom_css) as demo:
+        current_hybrid_prompt = gr.State(None)
+        current_image_data = gr.State(None)
+        chat_state = gr.State([])
+        session_id = gr.State(lambda: uuid.uuid4().hex, delete_callback=end_session)
+        # Survives reloads, so a multi-user browser keeps seeing its saved conversations.
+        browser_id = (
+            gr.BrowserState(None, storage_key="neuroprime_browser_id", secret=load_browser_secret())
+            if settings.MULTI_USER else None
+        )
+        # This session's changes to the API key and model list (see SessionConfig).
+        session_overrides = gr.State({})
+        conversation_id = gr.State(None)
+        history_cursor = gr.State(None)
+        context_summary = gr.State(None)
+
+        gr.HTML("""
+        <div class="scanlines"></div>
+        <div class="crt-flicker"></div>
+        <div class="app-header">
+            <h1 class="glitch" data-text="NeuroPrime">NeuroPrime</h1>
+            <p>Advanced Neural Reasoning Framework</p>
+        </div>
+        """)
+
+        with gr.Row():
+            with gr.Column(scale=3):
+                chatbot = gr.Chatbot(
+                    [],
+                    elem_id="chatbot",
+                    avatar_images=("🧠", "🤖"),
+                    height=500,
+                    container=True,
+                    type="messages"
+                )
+                with gr.Row():
+                    with gr.Column(scale=8):
+                        msg = gr.Textbox(
+                            show_label=False,
+                            placeholder="H4CK TH3 PL4N3T...",
+                            container=False,
+                            elem_classes=["input-box"]
+                        )
+                        # The draft pipeline mode prefetches for; only written while pipeline mode is on.
+                        pipeline_draft = gr.Textbox(visible=False)
+                        image_upload = gr.Image(
+                            type="pil", 
+                            label="Upload Image (if model supports it)",
+                            visible=True
+                        )
+                    with gr.Column(scale=2):
+                        get_reasoning_btn = gr.Button("GET R34S0NING", variant="primary")
+                        submit_btn = gr.Button("S3ND M3SS4G3", variant="primary")
+                        stop_btn = gr.Button("5T0P", variant="stop")
+            with gr.Column(scale=1):
+                with gr.Group():
+                    api_key = gr.Textbox(
+                        placeholder="Enter OpenRouter API Key",
+                        type="password",
+                        label="OpenRouter API Key"
                     )
-                    image_upload = gr.Image(
-                        type="pil", 
-                        label="Upload Image (if model supports it)",
-                        visible=True
+                    save_key_btn = gr.Button("S4V3 K3Y")
+                    model_dropdown = gr.Dropdown(
+                        choices=model_choices(config_store.get("models")),
+                        value=config_store.get("models")[0],
+                        label="Select Model"
                     )
-                with gr.Column(scale=2):
-                    get_reasoning_btn = gr.Button("GET R34S0NING", variant="primary")
-                    submit_btn = gr.Button("S3ND M3SS4G3", variant="primary")
-        with gr.Column(scale=1):
-            with gr.Group():
-                api_key = gr.Textbox(
-                    placeholder="Enter OpenRouter API Key",
-                    value=config.get("api_key", ""),
-                    type="password",
-                    label="OpenRouter API Key"
+                    with gr.Row():
+                        new_model = gr.Dropdown(
+                            choices=[], value=None, allow_custom_value=True, filterable=True,
+                            label="Add New Model", info="Start typing (e.g. openai/gpt-4o or gpt-4o) for suggestions"
+                        )
+                        add_model_btn = gr.Button("ADD", scale=1)
+                    with gr.Row():
+                        remove_model_btn = gr.Button("R3M0V3 M0D3L")
+                    stream_toggle = gr.Checkbox(value=settings.STREAM_RESPONSES, label="Stream Responses")
+                    pipeline_toggle = gr.Checkbox(value=settings.PIPELINE_MODE, label="Pipeline Mode (prefetch reasoning while typing)")
+                with gr.Group():
+                    conversation_list = gr.Dropdown(choices=[], label="Conversation History", interactive=True)
+                    with gr.Row():
+                        load_conversation_btn = gr.Button("L04D")
+                        new_conversation_btn = gr.Button("N3W CH4T")
+                    load_older_btn = gr.Button("L04D 0LD3R M3SS4G3S")
+                with gr.Group():
+                    search_box = gr.Textbox(placeholder="Search past messages and reasoning...", label="S34RCH H1ST0RY")
+                    search_results = gr.Dropdown(choices=[], label="Matches (best first; pick one to open it)", interactive=True)
+                reasoning_output = gr.Textbox(
+                    label="Reasoning Framework",
+                    placeholder="Click 'GET REASONING' to see the AI's approach...",
+                    lines=10,
+                    max_lines=10
                 )
-                save_key_btn = gr.Button("S4V3 K3Y")
-                model_dropdown = gr.Dropdown(
-                    choices=config.get("models", DEFAULT_MODELS),
-                    value=config.get("models", DEFAULT_MODELS)[0] if config.get("models", DEFAULT_MODELS) else None,
-                    label="Select Model"
+        with gr.Accordion("C0MP4R3 M0D3LS", open=False):
+            with gr.Row():
+                compare_models = gr.CheckboxGroup(
+                    choices=config_store.get("models"),
+                    label=f"Models to compare (up to {settings.MAX_COMPARE_MODELS}, queried in parallel)",
+                    scale=4
                 )
-                with gr.Row():
-                    new_model = gr.Textbox(placeholder="Model name (e.g., openai/gpt-4)", label="Add New Model")
-                    add_model_btn = gr.Button("ADD", scale=1)
-                with gr.Row():
-                    remove_model_btn = gr.Button("R3M0V3 M0D3L")
-            reasoning_output = gr.Textbox(
-                label="Reasoning Framework",
-                placeholder="Click 'GET REASONING' to see the AI's approach...",
-                lines=10,
-                max_lines=10
+                compare_btn = gr.Button("C0MP4R3", variant="primary", scale=1)
+            compare_columns, compare_outputs, compare_stats = [], [], []
+            with gr.Row():
+                for _ in range(settings.MAX_COMPARE_MODELS):
+                    with gr.Column(visible=False, elem_classes=["settings-panel"]) as column:
+                        compare_outputs.append(gr.Markdown())
+                        compare_stats.append(gr.Markdown(elem_classes=["footer"]))
+                    compare_columns.append(column)
+        with gr.Accordion("M0D3L ST4TS", open=False):
+            model_stats_table = gr.Dataframe(
+                headers=["Model", "Calls", "TTFT s (median)", "Tokens/s (median)", "Errors", "Avg cost $"],
+                interactive=False
             )
-    gr.HTML("""
-    <div class="footer">
-        <p>©2025 NeuroPrime | SYST3M STAT5: FULL P0W3R | Initializing Neural Pathways...</p>
-    </div>
-    """)
-
-    def update_chat_display(chat_history):
-        formatted = format_chat_history(chat_history)
-        return formatted
-
-    def process_image(image):
-        if image is None:
-            return None
-        return upload_image(image)
-
-    save_key_btn.click(save_api_key, inputs=[api_key], outputs=[gr.Textbox()])
-    add_model_btn.click(add_model, inputs=[new_model], outputs=[model_dropdown, gr.Textbox()])
-    remove_model_btn.click(remove_model, inputs=[model_dropdown], outputs=[model_dropdown, gr.Textbox()])
-    get_reasoning_btn.click(
-        get_reasoning, 
-        inputs=[msg, api_key, model_dropdown], 
-        outputs=[reasoning_output, current_hybrid_prompt]
-    )
-    image_upload.change(
-        process_image,
-        inputs=[image_upload],
-        outputs=[current_image_data]
-    )
-    submit_event = submit_btn.click(
-        on_submit,
-        inputs=[msg, chat_state, api_key, model_dropdown, current_hybrid_prompt, current_image_data],
-        outputs=[msg, chat_state, current_hybrid_prompt, current_image_data]
-    ).then(
-        update_chat_display,
-        inputs=[chat_state],
-        outputs=[chatbot]
-    )
-    msg.submit(
-        on_submit,
-        inputs=[msg, chat_state, api_key, model_dropdown, current_hybrid_prompt, current_image_data],
-        outputs=[msg, chat_state, current_hybrid_prompt, current_image_data]
-    ).then(
-        update_chat_display,
-        inputs=[chat_state],
-        outputs=[chatbot]
+            model_stats_btn = gr.Button("R3FR35H")
+        with gr.Accordion("S3SS10N M3M0RY", open=False):
+            session_memory_summary = gr.Markdown()
+            session_memory_table = gr.Dataframe(
+                headers=["Session", "Messages", "Resident KiB", "Spilled KiB", "Idle s", "Busy"],
+                interactive=False
+            )
+            session_memory_btn = gr.Button("R3FR35H")
+        gr.HTML("""
+        <div class="footer">
+            <p>©2025 NeuroPrime | SYST3M STAT5: FULL P0W3R | Initializing Neural Pathways...</p>
+        </div>
+        """)
+
+        def process_image(image, model, session_id):
+            if image is None:
+                session_memory.release_blob(session_id)
+                return None
+            warn_if_image_rejected(model)
+            # gr.State keeps a short handle; the encoded image lives in session_memory.
+            return session_memory.store_blob(session_id, upload_image(image, model))
+
+        def reprocess_image_for_model(image, model, image_data, session_id):
+            # Only re-encode an image that is still pending; one already sent stays cleared.
+            if image is None or image_data is None:
+                return image_data
+            warn_if_image_rejected(model)
+            return session_memory.store_blob(session_id, upload_image(image, model))
+
+        def warn_if_image_rejected(model):
+            rejection = image_rejection(model)
+            if rejection:
+                gr.Warning(rejection)
+
+        save_key_btn.click(save_api_key, inputs=[api_key, session_overrides], outputs=[gr.Textbox(), session_overrides])
+        add_model_btn.click(
+            add_model, inputs=[new_model, session_overrides], outputs=[model_dropdown, gr.Textbox(), session_overrides]
+        ).then(
+            refresh_compare_choices, inputs=[session_overrides], outputs=[compare_models]
+        )
+        new_model.key_up(
+            complete_model_name, outputs=[new_model], queue=False, show_progress="hidden", trigger_mode="always_last"
+        )
+        remove_model_btn.click(
+            remove_model, inputs=[model_dropdown, session_overrides], outputs=[model_dropdown, gr.Textbox(), session_overrides]
+        ).then(
+            refresh_compare_choices, inputs=[session_overrides], outputs=[compare_models]
+        )
+        demo.load(load_api_key, inputs=[session_overrides], outputs=[api_key])
+        if browser_id is not None:
+            demo.load(identify_browser, inputs=[session_id, browser_id], outputs=[browser_id]).then(
+                refresh_conversation_choices, inputs=[session_id], outputs=[conversation_list]
+            )
+        else:
+            demo.load(refresh_conversation_choices, inputs=[session_id], outputs=[conversation_list])
+        conversation_list.focus(refresh_conversation_choices, inputs=[session_id], outputs=[conversation_list])
+        load_conversation_btn.click(
+            load_conversation,
+            inputs=[conversation_list, session_id],
+            outputs=[chat_state, chatbot, conversation_id, history_cursor, context_summary]
+        )
+        load_older_btn.click(
+            load_older_messages,
+            inputs=[conversation_id, history_cursor, chat_state, session_id],
+            outputs=[chat_state, chatbot, history_cursor, context_summary]
+        )
+        search_box.change(
+            search_history, inputs=[search_box, session_id], outputs=[search_results],
+            trigger_mode="always_last", show_progress="hidden"
+        )
+        search_results.input(
+            load_conversation,
+            inputs=[search_results, session_id],
+            outputs=[chat_state, chatbot, conversation_id, history_cursor, context_summary]
+        )
+        model_stats_btn.click(model_stats_report, inputs=[session_overrides], outputs=[model_stats_table])
+        session_memory_btn.click(
+            session_memory_report, inputs=[session_id], outputs=[session_memory_summary, session_memory_table]
+        )
+        new_conversation_btn.click(new_conversation, inputs=[session_id], outputs=[chat_state, chatbot, conversation_id, history_cursor, context_summary])
+        compare_event = compare_btn.click(
+            on_compare,
+            inputs=[msg, chat_state, api_key, compare_models, current_hybrid_prompt, current_image_data, session_id],
+            outputs=compare_columns + compare_outputs + compare_stats,
+            concurrency_limit=settings.CHAT_CONCURRENCY_LIMIT,
+            concurrency_id="chat"
+        )
+        reasoning_event = get_reasoning_btn.click(
+            get_reasoning,
+            inputs=[msg, api_key, model_dropdown, session_id, conversation_id, session_overrides],
+            outputs=[reasoning_output, current_hybrid_prompt, conversation_id],
+            concurrency_limit=settings.REASONING_CONCURRENCY_LIMIT
+        )
+        # Keystrokes are relayed in the browser: with pipeline mode off the draft is left as it
+        # is, so typing sends no events at all. Turning the mode off clears the draft, which
+        # discards this session's speculation.
+        msg.change(
+            None, inputs=[msg, pipeline_toggle, pipeline_draft], outputs=[pipeline_draft],
+            js="(message, pipeline, draft) => pipeline ? message : draft"
+        )
+        pipeline_toggle.change(
+            None, inputs=[pipeline_toggle, msg], outputs=[pipeline_draft],
+            js="(pipeline, message) => pipeline ? message : ''"
+        )
+        # "multiple" so every draft reaches the prefetcher, which debounces and cancels superseded
+        # drafts itself; "always_last" would hold new drafts back until the previous fetch finished.
+        pipeline_draft.change(
+            prefetch_reasoning,
+            inputs=[pipeline_draft, api_key, model_dropdown, pipeline_toggle, session_id, session_overrides],
+            outputs=[reasoning_output],
+            trigger_mode="multiple",
+            show_progress="hidden",
+            concurrency_limit=settings.REASONING_CONCURRENCY_LIMIT
+        )
+        image_upload.change(
+            process_image,
+            inputs=[image_upload, model_dropdown, session_id],
+            outputs=[current_image_data]
+        )
+        model_dropdown.change(
+            reprocess_image_for_model,
+            inputs=[image_upload, model_dropdown, current_image_data, session_id],
+            outputs=[current_image_data]
+        )
+        submit_event = submit_btn.click(
+            on_submit,
+            inputs=[msg, chat_state, api_key, model_dropdown, current_hybrid_prompt, current_image_data, stream_toggle, pipeline_toggle, session_id, conversation_id, context_summary, session_overrides],
+            outputs=[msg, chat_state, chatbot, current_hybrid_prompt, current_image_data, conversation_id, context_summary],
+            concurrency_limit=settings.CHAT_CONCURRENCY_LIMIT,
+            concurrency_id="chat"
+        )
+        msg_submit_event = msg.submit(
+            on_submit,
+            inputs=[msg, chat_state, api_key, model_dropdown, current_hybrid_prompt, current_image_data, stream_toggle, pipeline_toggle, session_id, conversation_id, context_summary, session_overrides],
+            outputs=[msg, chat_state, chatbot, current_hybrid_prompt, current_image_data, conversation_id, context_summary],
+            concurrency_limit=settings.CHAT_CONCURRENCY_LIMIT,
+            concurrency_id="chat"
+        )
+        # Cancelling a handler task unwinds its open stream, which closes the HTTP connection.
+        stop_btn.click(None, cancels=[submit_event, msg_submit_event, reasoning_event, compare_event], queue=False)
+
+    # Handlers are async, so concurrency is bounded by these limits rather than by worker threads.
+    demo.queue(
+        default_concurrency_limit=settings.QUEUE_DEFAULT_CONCURRENCY_LIMIT,
+        max_size=settings.QUEUE_MAX_SIZE or None
     )
+    return demo
 
 # --- Logging Configuration ---
 logging.basicConfig(
@@ -549,7 +1124,62 @@ def open_in_default_browser(url: str):
     else:                                          # Linux / BSD
         webbrowser.open(url)
 
+# --- Server ---
+def create_server(demo=None):
+    """Mount the Blocks (built here unless given) on a FastAPI app that also serves Prometheus metrics at /metrics."""
+    if demo is None:
+        demo = build_ui()
+    from fastapi import FastAPI
+    server = FastAPI()
+    server.add_middleware(metrics.RequestTimingMiddleware)
+    server.add_api_route("/metrics", metrics.metrics_endpoint, methods=["GET"], include_in_schema=False)
+    return gr.mount_gradio_app(
+        server, demo, path="", server_name=settings.SERVER_HOST, server_port=settings.SERVER_PORT, show_error=True
+    )
+
+def serve(open_browser=False):
+    import uvicorn
+    with startup.phase("build_ui"):
+        demo = build_ui()
+    with startup.phase("create_server"):
+        app = create_server(demo)
+        server = uvicorn.Server(uvicorn.Config(app, host=settings.SERVER_HOST, port=settings.SERVER_PORT))
+    host = "localhost" if settings.SERVER_HOST in ("127.0.0.1", "0.0.0.0") else settings.SERVER_HOST
+    url = f"http://{host}:{settings.SERVER_PORT}"
+    if open_browser:
+        def open_when_ready():
+            while not server.started and not server.should_exit:
+                time.sleep(0.1)
+            if server.started:
+                open_in_default_browser(url)
+        threading.Thread(target=open_when_ready, daemon=True).start()
+    # Revalidate the model listing off the startup path; lookups use the disk copy meanwhile.
+    model_catalog.refresh_in_background()
+    session_memory.clear_stale()
+    session_memory.start(settings.SESSION_SWEEP_INTERVAL)
+    logger.info(startup.summary())
+    logger.info(f"Serving NeuroPrime at {url} (metrics at {url}/metrics)")
+    server.run()
+
+def profile_startup():
+    """Run every startup phase short of serving and print where the time went."""
+    with startup.phase("build_ui"):
+        demo = build_ui()
+    with startup.phase("create_server"):
+        create_server(demo)
+    with startup.phase("decrypt_api_key"):
+        config_store.get("api_key")
+    print(startup.report())
+
+startup.mark("import app")
+
 if __name__ == "__main__":
+    if startup.profiling():
+        profile_startup()
+        sys.exit(0)
+    if "--reindex-search" in sys.argv:
+        reindex_search()
+        sys.exit(0)
     try:
         # Determine if running as a bundled app
         bundled_app = is_running_as_bundled_app()
@@ -558,24 +1188,14 @@ if __name__ == "__main__":
             # Show splash screen when running as bundled app
             show_splash_screen()
             
-            # When running as a bundled app, use the embedded browser approach
-            # Launch Gradio server without opening a browser
+            # When running as a bundled app, open the UI in the default browser once the server is up
             logger.info("Starting Gradio server in bundled app mode")
-            launch_result = demo.launch(
-                prevent_thread_lock=False,
-                share=False,
-                show_error=True,
-                quiet=False,
-                inline=False,
-                inbrowser=True,
-                favicon_path=None,
-                ssl_verify=False
-            )
+            serve(open_browser=True)
             
         else:
-            # Standard development mode - let Gradio handle browser launch
+            # Standard development mode
             logger.info("Starting Gradio server in development mode")
-            demo.launch(share=False)
+            serve()
     except Exception as e:
         logger.error(f"Application error: {e}")
         # If we're in a bundled app, display an error dialog
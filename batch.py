@@ -0,0 +1,147 @@
+import argparse
+import asyncio
+import json
+import logging
+import os
+import sys
+import time
+
+import app
+import openrouter_client
+import settings
+
+# Headless runner for the reasoning + answer pipeline over a JSONL file of queries.
+#
+# Input lines look like {"id": "q1", "query": "...", "model": "openai/gpt-4o"}; id defaults
+# to the line number and model to --model. Each finished query is appended to the output
+# as one JSON line, which doubles as the checkpoint: rerunning the same command skips ids
+# already present there.
+
+def load_checkpoint(output_path, retry_errors=False):
+    """Return the ids already recorded in output_path, dropping a torn final line left by a crash."""
+    done = set()
+    if not os.path.exists(output_path):
+        return done
+    with open(output_path, "rb+") as f:
+        good_end = 0
+        for line in f:
+            try:
+                record = json.loads(line)
+            except ValueError:
+                break
+            good_end += len(line)
+            if not (retry_errors and record.get("error")):
+                done.add(str(record["id"]))
+        f.truncate(good_end)
+    return done
+
+def read_queries(input_path, default_model, done):
+    """Yield (id, query, model) for every input line not yet in done, reading lazily."""
+    with open(input_path, "r", encoding="utf-8") as f:
+        for number, line in enumerate(f, 1):
+            line = line.strip()
+            if not line:
+                continue
+            record = json.loads(line)
+            query_id = str(record.get("id", number))
+            if query_id in done:
+                continue
+            query = record.get("query") or record.get("prompt")
+            if not query:
+                raise ValueError(f"{input_path}:{number}: missing 'query'")
+            yield query_id, query, record.get("model") or default_model
+
+async def run_query(query_id, query, model, api_key, skip_reasoning):
+    record = {"id": query_id, "model": model, "query": query, "reasoning": None, "hybrid_prompt": None,
+              "reply": None, "usage": None, "error": None}
+    started = time.perf_counter()
+    try:
+        if not skip_reasoning:
+            record["reasoning"], record["hybrid_prompt"] = await app.fetch_reasoning(
+                query, api_key, model, operation="batch_reasoning"
+            )
+        messages = [{"role": "system", "content": app.SYSTEM_PROMPT}, {"role": "user", "content": query}]
+        payload = app.build_chat_payload(messages, model, record["hybrid_prompt"])
+        if app.response_cache.enabled:
+            record["reply"] = await asyncio.to_thread(app.response_cache.get, payload)
+        record["cached"] = record["reply"] is not None
+        if not record["cached"]:
+            response_data = await openrouter_client.async_post_chat_completion(api_key, payload, operation="batch_chat")
+            record["reply"] = app.extract_reply(response_data)
+            record["usage"] = response_data.get("usage")
+            if app.response_cache.enabled and response_data.get("choices"):
+                await asyncio.to_thread(app.response_cache.put, payload, record["reply"])
+    except Exception as e:
+        record["error"] = f"{type(e).__name__}: {e}"
+    record["latency_s"] = round(time.perf_counter() - started, 3)
+    return record
+
+async def run_batch(args, api_key):
+    done = load_checkpoint(args.output, args.retry_errors)
+    if done:
+        print(f"Resuming: {len(done)} queries already in {args.output}", file=sys.stderr)
+    queries = read_queries(args.input, args.model, done)
+    # The bounded queue keeps memory flat however large the input file is.
+    queue = asyncio.Queue(maxsize=args.concurrency * 2)
+    stats = {"completed": 0, "errors": 0, "started": time.perf_counter(), "reported": time.perf_counter()}
+
+    with open(args.output, "a", encoding="utf-8") as out:
+        def write(record):
+            out.write(json.dumps(record, ensure_ascii=False) + "\n")
+            out.flush()
+            stats["completed"] += 1
+            stats["errors"] += bool(record["error"])
+            now = time.perf_counter()
+            if now - stats["reported"] >= args.progress_interval:
+                stats["reported"] = now
+                rate = stats["completed"] / (now - stats["started"])
+                print(f"{stats['completed']} done, {stats['errors']} errors, {rate:.2f} queries/s", file=sys.stderr)
+
+        async def worker():
+            while True:
+                item = await queue.get()
+                if item is None:
+                    return
+                write(await run_query(*item, api_key, args.skip_reasoning))
+
+        async def produce():
+            for item in queries:
+                await queue.put(item)
+            for _ in range(args.concurrency):
+                await queue.put(None)
+
+        tasks = [asyncio.create_task(produce())] + [asyncio.create_task(worker()) for _ in range(args.concurrency)]
+        try:
+            await asyncio.gather(*tasks)
+        finally:
+            for task in tasks:
+                task.cancel()
+            os.fsync(out.fileno())
+
+    elapsed = time.perf_counter() - stats["started"]
+    print(f"Finished {stats['completed']} queries ({stats['errors']} errors) in {elapsed:.1f}s", file=sys.stderr)
+    return stats["errors"]
+
+def main():
+    parser = argparse.ArgumentParser(description="Run a JSONL file of queries through NeuroPrime's reasoning + answer pipeline.")
+    parser.add_argument("input", help="JSONL file with one {\"id\", \"query\", \"model\"} object per line")
+    parser.add_argument("output", help="JSONL results file; also the checkpoint that a rerun resumes from")
+    parser.add_argument("--model", default=None, help="model for lines without one (default: first configured model)")
+    parser.add_argument("--api-key", default=None, help="OpenRouter key (default: $OPENROUTER_API_KEY, then the saved key)")
+    parser.add_argument("--concurrency", type=int, default=settings.BATCH_CONCURRENCY, help="queries in flight at once")
+    parser.add_argument("--skip-reasoning", action="store_true", help="send queries straight to the answer stage")
+    parser.add_argument("--retry-errors", action="store_true", help="rerun queries whose recorded result is an error")
+    parser.add_argument("--progress-interval", type=float, default=10.0, help="seconds between progress lines")
+    args = parser.parse_args()
+
+    # One INFO line per HTTP request drowns the progress output at batch volumes.
+    logging.getLogger("httpx").setLevel(logging.WARNING)
+    api_key = args.api_key or os.environ.get("OPENROUTER_API_KEY") or app.config_store.get("api_key")
+    if not api_key:
+        parser.error("no API key: pass --api-key, set OPENROUTER_API_KEY or save one in the app")
+    args.model = args.model or app.config_store.get("models")[0]
+    errors = asyncio.run(run_batch(args, api_key))
+    sys.exit(1 if errors else 0)
+
+if __name__ == "__main__":
+    main()
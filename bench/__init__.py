@@ -0,0 +1,2 @@
+# Load-testing tools: a local OpenRouter stand-in (mock_openrouter) and a
+# concurrent session driver (load_test). Run either with `python -m bench.<module> --help`.
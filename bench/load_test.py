@@ -0,0 +1,200 @@
+import argparse
+import asyncio
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+import uuid
+
+DEFAULT_QUERY = "Explain the trade-offs between consistency and availability in distributed databases."
+
+def percentile(values, pct):
+    """Linear-interpolated percentile of values (pct in 0-100)."""
+    if not values:
+        return None
+    ordered = sorted(values)
+    rank = (len(ordered) - 1) * pct / 100
+    low = int(rank)
+    high = min(low + 1, len(ordered) - 1)
+    return ordered[low] + (ordered[high] - ordered[low]) * (rank - low)
+
+def summarize(samples):
+    if not samples:
+        return {"count": 0}
+    return {
+        "count": len(samples),
+        "mean": sum(samples) / len(samples),
+        "p50": percentile(samples, 50),
+        "p95": percentile(samples, 95),
+        "p99": percentile(samples, 99),
+        "max": max(samples),
+    }
+
+def peak_rss_bytes():
+    try:
+        import resource
+    except ImportError:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is bytes on macOS and kilobytes on Linux.
+    return peak if sys.platform == "darwin" else peak * 1024
+
+def start_mock_server(args):
+    command = [
+        sys.executable, "-m", "bench.mock_openrouter",
+        "--port", str(args.mock_port),
+        "--latency", str(args.mock_latency),
+        "--tokens-per-second", str(args.mock_tokens_per_second),
+        "--reply-tokens", str(args.mock_reply_tokens),
+        "--error-rate", str(args.mock_error_rate),
+        "--rate-limit-rate", str(args.mock_rate_limit_rate),
+    ]
+    process = subprocess.Popen(command, cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    import httpx
+    deadline = time.time() + 15
+    while time.time() < deadline:
+        try:
+            httpx.get(f"http://127.0.0.1:{args.mock_port}/stats", timeout=0.5)
+            return process
+        except httpx.HTTPError:
+            time.sleep(0.1)
+    process.terminate()
+    raise RuntimeError("mock OpenRouter server did not start")
+
+class Results:
+    def __init__(self):
+        self.submit_latency = []
+        self.ttft = []
+        self.reasoning_latency = []
+        self.errors = 0
+        self.turns = 0
+
+async def run_session(app, index, args, results):
+    session_id = uuid.uuid4().hex
+    chat_history, conversation_id, context_summary = [], None, None
+    for turn in range(args.turns):
+        query = f"[session {index} turn {turn}] {args.query}"
+        hybrid_prompt = None
+        if args.reasoning:
+            started = time.perf_counter()
+            reasoning_result, hybrid_prompt, conversation_id = await app.get_reasoning(
+                query, args.api_key, args.model, session_id, conversation_id
+            )
+            results.reasoning_latency.append(time.perf_counter() - started)
+            if reasoning_result.startswith("Error"):
+                results.errors += 1
+
+        started = time.perf_counter()
+        first_token = None
+        outputs = None
+        async for outputs in app.on_submit(
+            query, chat_history, args.api_key, args.model, hybrid_prompt, None,
+            args.stream, False, session_id, conversation_id, context_summary
+        ):
+            history = outputs[1]
+            if first_token is None and history and history[-1]["role"] == "assistant" and history[-1]["content"]:
+                first_token = time.perf_counter() - started
+        results.submit_latency.append(time.perf_counter() - started)
+        if first_token is not None:
+            results.ttft.append(first_token)
+        chat_history, conversation_id, context_summary = outputs[1], outputs[5], outputs[6]
+        if chat_history[-1]["content"].startswith("Error"):
+            results.errors += 1
+        results.turns += 1
+
+async def run(args):
+    import app
+    results = Results()
+    started = time.perf_counter()
+    await asyncio.gather(*(run_session(app, i, args, results) for i in range(args.sessions)))
+    elapsed = time.perf_counter() - started
+    calls = results.turns + len(results.reasoning_latency)
+    prompt_tokens = {kind: app.metrics.PROMPT_TOKENS.value(operation="chat", model=args.model, kind=kind)
+                     for kind in ("cached", "uncached")}
+    return {
+        "sessions": args.sessions,
+        "turns": results.turns,
+        "elapsed_s": elapsed,
+        "throughput_turns_per_s": results.turns / elapsed if elapsed else None,
+        "throughput_calls_per_s": calls / elapsed if elapsed else None,
+        "errors": results.errors,
+        "submit_latency_s": summarize(results.submit_latency),
+        "ttft_s": summarize(results.ttft),
+        "reasoning_latency_s": summarize(results.reasoning_latency),
+        "chat_prompt_tokens": prompt_tokens,
+    }
+
+def print_report(report):
+    print(f"sessions={report['sessions']} turns={report['turns']} elapsed={report['elapsed_s']:.2f}s "
+          f"errors={report['errors']}")
+    print(f"throughput: {report['throughput_turns_per_s']:.2f} turns/s, "
+          f"{report['throughput_calls_per_s']:.2f} API calls/s")
+    for name in ("submit_latency_s", "ttft_s", "reasoning_latency_s"):
+        stats = report[name]
+        if not stats["count"]:
+            continue
+        print(f"{name:<20} n={stats['count']:<6} mean={stats['mean']:.3f} p50={stats['p50']:.3f} "
+              f"p95={stats['p95']:.3f} p99={stats['p99']:.3f} max={stats['max']:.3f}")
+    prompt_tokens = report["chat_prompt_tokens"]
+    total = prompt_tokens["cached"] + prompt_tokens["uncached"]
+    if total:
+        print(f"chat prompt tokens: {total}, {prompt_tokens['cached'] / total:.0%} served from the provider cache")
+    memory = report["memory"]
+    if memory.get("peak_rss_bytes"):
+        print(f"peak RSS: {memory['peak_rss_bytes'] / 2**20:.1f} MiB")
+    if memory.get("traced_peak_bytes") is not None:
+        print(f"traced Python heap peak: {memory['traced_peak_bytes'] / 2**20:.1f} MiB")
+
+def main():
+    parser = argparse.ArgumentParser(description="Drive concurrent NeuroPrime sessions through on_submit/get_reasoning.")
+    parser.add_argument("--sessions", type=int, default=50, help="concurrent simulated sessions")
+    parser.add_argument("--turns", type=int, default=3, help="chat turns per session")
+    parser.add_argument("--reasoning", action="store_true", help="call get_reasoning before every turn")
+    parser.add_argument("--no-stream", dest="stream", action="store_false", help="use non-streaming completions")
+    parser.add_argument("--model", default="mock/echo")
+    parser.add_argument("--api-key", default="bench-key")
+    parser.add_argument("--query", default=DEFAULT_QUERY)
+    parser.add_argument("--base-url", default=None, help="OpenRouter-compatible base URL (default: spawn the mock)")
+    parser.add_argument("--mock-port", type=int, default=8765)
+    parser.add_argument("--mock-latency", type=float, default=0.2)
+    parser.add_argument("--mock-tokens-per-second", type=float, default=80.0)
+    parser.add_argument("--mock-reply-tokens", type=int, default=120)
+    parser.add_argument("--mock-error-rate", type=float, default=0.0)
+    parser.add_argument("--mock-rate-limit-rate", type=float, default=0.0)
+    parser.add_argument("--trace-memory", action="store_true", help="track Python heap peak with tracemalloc (slower)")
+    parser.add_argument("--json", dest="json_path", default=None, help="also write the report as JSON")
+    args = parser.parse_args()
+
+    mock = None
+    if args.base_url is None:
+        mock = start_mock_server(args)
+        args.base_url = f"http://127.0.0.1:{args.mock_port}/api/v1"
+    # Must be set before app (and through it the OpenRouter client) is imported.
+    os.environ["NEUROPRIME_OPENROUTER_BASE_URL"] = args.base_url
+    os.environ.setdefault("NEUROPRIME_APP_SUPPORT_DIR", tempfile.mkdtemp(prefix="neuroprime-bench-"))
+    os.environ.setdefault("NEUROPRIME_REASONING_CACHE_SIZE", "0")
+    os.environ.setdefault("NEUROPRIME_REASONING_LOCAL_FAST_PATH", "0")
+
+    try:
+        if args.trace_memory:
+            tracemalloc.start()
+        report = asyncio.run(run(args))
+        report["memory"] = {
+            "peak_rss_bytes": peak_rss_bytes(),
+            "traced_peak_bytes": tracemalloc.get_traced_memory()[1] if args.trace_memory else None,
+        }
+    finally:
+        if mock is not None:
+            mock.terminate()
+            mock.wait()
+
+    print_report(report)
+    if args.json_path:
+        with open(args.json_path, "w") as f:
+            json.dump(report, f, indent=2)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,204 @@
+import argparse
+import asyncio
+import hashlib
+import json
+import random
+import time
+import uuid
+
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, Response, StreamingResponse
+
+WORDS = (
+    "the reasoning framework suggests we examine each assumption carefully then combine "
+    "evidence from several independent sources before drawing a conclusion about the system"
+).split()
+
+MOCK_MODELS = [
+    {"id": "openai/gpt-3.5-turbo", "context_length": 16385, "input_modalities": ["text"]},
+    {"id": "openai/gpt-4o", "context_length": 128000, "input_modalities": ["text", "image"]},
+    {"id": "anthropic/claude-3-haiku", "context_length": 200000, "input_modalities": ["text", "image"]},
+    {"id": "mock/echo", "context_length": 8192, "input_modalities": ["text"]},
+]
+
+REASONING_REPLY = (
+    "1. Framework 1: Deductive reasoning - derive consequences from stated premises.\n"
+    "2. Framework 2: Abductive reasoning - propose the most plausible explanation.\n"
+    "3. Why combining them works: one generates hypotheses, the other tests them.\n"
+    "4. Hybrid prompt prefix to add: First propose the most plausible explanations, "
+    "then deduce what each would imply and keep only those consistent with the facts."
+)
+
+# What a model with structured outputs returns for the reasoning request's json_schema.
+REASONING_JSON_REPLY = {
+    "framework_1": {"name": "Deductive reasoning", "justification": "derive consequences from stated premises"},
+    "framework_2": {"name": "Abductive reasoning", "justification": "propose the most plausible explanation"},
+    "why_combined": "one generates hypotheses, the other tests them",
+    "hybrid_prefix": "First propose the most plausible explanations, then deduce what each would imply "
+                     "and keep only those consistent with the facts.",
+}
+
+def _reply_text(body, reply_tokens, rng):
+    if body.get("response_format", {}).get("type") == "json_schema":
+        return json.dumps(REASONING_JSON_REPLY)
+    last = body.get("messages", [{}])[-1].get("content", "")
+    if isinstance(last, list):
+        last = " ".join(part.get("text", "") for part in last if part.get("type") == "text")
+    if "Hybrid prompt prefix to add" in last:
+        return REASONING_REPLY
+    return " ".join(rng.choice(WORDS) for _ in range(reply_tokens))
+
+def _strip_cache_control(message):
+    content = message.get("content")
+    if isinstance(content, list):
+        content = [{k: v for k, v in part.items() if k != "cache_control"} for part in content]
+    return {"role": message.get("role"), "content": content}
+
+def _cached_chars(messages, seen_prefixes):
+    """Simulate a provider prompt cache: the longest run of leading messages seen in an earlier request."""
+    digest = hashlib.sha256()
+    cached = chars = 0
+    for message in messages[:-1]:
+        encoded = json.dumps(_strip_cache_control(message), sort_keys=True)
+        digest.update(encoded.encode("utf-8"))
+        chars += len(encoded)
+        key = digest.hexdigest()
+        if key in seen_prefixes and cached == chars - len(encoded):
+            cached = chars
+        seen_prefixes.add(key)
+    return cached
+
+def _usage(body, text, cached_chars=0):
+    prompt_chars = len(json.dumps(body.get("messages", [])))
+    completion_tokens = max(1, len(text) // 4)
+    return {
+        "prompt_tokens": prompt_chars // 4,
+        "prompt_tokens_details": {"cached_tokens": cached_chars // 4},
+        "completion_tokens": completion_tokens,
+        "total_tokens": prompt_chars // 4 + completion_tokens,
+    }
+
+def create_app(latency=0.2, latency_jitter=0.25, tokens_per_second=80.0, reply_tokens=120,
+               error_rate=0.0, rate_limit_rate=0.0, seed=None):
+    """Build a FastAPI stand-in for the OpenRouter chat-completions and models endpoints.
+
+    latency is the delay before the first byte (+/- latency_jitter as a fraction);
+    tokens_per_second paces generation. error_rate and rate_limit_rate are the
+    probabilities of answering 502 or 429 (with Retry-After) instead.
+    """
+    app = FastAPI(title="Mock OpenRouter")
+    rng = random.Random(seed)
+    stats = {"requests": 0, "errors": 0, "rate_limited": 0, "in_flight": 0, "max_in_flight": 0}
+    seen_prefixes = set()
+
+    def first_byte_delay():
+        return max(0.0, latency * (1 + rng.uniform(-latency_jitter, latency_jitter)))
+
+    @app.post("/api/v1/chat/completions")
+    async def chat_completions(request: Request):
+        body = await request.json()
+        stats["requests"] += 1
+        roll = rng.random()
+        if roll < error_rate:
+            stats["errors"] += 1
+            return JSONResponse({"error": {"message": "mock upstream error", "code": 502}}, status_code=502)
+        if roll < error_rate + rate_limit_rate:
+            stats["rate_limited"] += 1
+            return JSONResponse(
+                {"error": {"message": "mock rate limit", "code": 429}},
+                status_code=429,
+                headers={"Retry-After": "1"}
+            )
+        text = _reply_text(body, reply_tokens, rng)
+        usage = _usage(body, text, _cached_chars(body.get("messages", []), seen_prefixes))
+        completion_id = f"gen-{uuid.uuid4().hex}"
+        model = body.get("model", "mock/echo")
+        stats["in_flight"] += 1
+        stats["max_in_flight"] = max(stats["max_in_flight"], stats["in_flight"])
+
+        if not body.get("stream"):
+            try:
+                await asyncio.sleep(first_byte_delay() + usage["completion_tokens"] / tokens_per_second)
+            finally:
+                stats["in_flight"] -= 1
+            return {
+                "id": completion_id,
+                "model": model,
+                "created": int(time.time()),
+                "choices": [{"index": 0, "message": {"role": "assistant", "content": text}, "finish_reason": "stop"}],
+                "usage": usage,
+            }
+
+        async def events():
+            try:
+                yield ": OPENROUTER PROCESSING\n\n"
+                await asyncio.sleep(first_byte_delay())
+                pieces = [word + " " for word in text.split(" ")]
+                # Emit in ~20 ms batches so pacing holds without one sleep per token.
+                per_batch = max(1, int(tokens_per_second * 0.02))
+                for i in range(0, len(pieces), per_batch):
+                    batch = pieces[i:i + per_batch]
+                    chunk = {"id": completion_id, "model": model,
+                             "choices": [{"index": 0, "delta": {"content": "".join(batch)}}]}
+                    yield f"data: {json.dumps(chunk)}\n\n"
+                    await asyncio.sleep(len(batch) / tokens_per_second)
+                final = {"id": completion_id, "model": model,
+                         "choices": [{"index": 0, "delta": {}, "finish_reason": "stop"}], "usage": usage}
+                yield f"data: {json.dumps(final)}\n\n"
+                yield "data: [DONE]\n\n"
+            finally:
+                stats["in_flight"] -= 1
+
+        return StreamingResponse(events(), media_type="text/event-stream")
+
+    listing = {"data": [
+        {
+            "id": m["id"],
+            "name": m["id"],
+            "context_length": m["context_length"],
+            "architecture": {"input_modalities": m["input_modalities"], "output_modalities": ["text"]},
+            "pricing": {"prompt": "0.000001", "completion": "0.000002"},
+        }
+        for m in MOCK_MODELS
+    ]}
+    listing_etag = f'"{uuid.uuid5(uuid.NAMESPACE_URL, json.dumps(listing, sort_keys=True))}"'
+
+    @app.get("/api/v1/models")
+    async def models(request: Request):
+        if request.headers.get("if-none-match") == listing_etag:
+            return Response(status_code=304, headers={"ETag": listing_etag})
+        return JSONResponse(listing, headers={"ETag": listing_etag})
+
+    @app.get("/stats")
+    async def server_stats():
+        return stats
+
+    return app
+
+def main():
+    parser = argparse.ArgumentParser(description="Run a local stand-in for the OpenRouter API.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--latency", type=float, default=0.2, help="seconds before the first byte")
+    parser.add_argument("--latency-jitter", type=float, default=0.25, help="fractional +/- jitter on latency")
+    parser.add_argument("--tokens-per-second", type=float, default=80.0)
+    parser.add_argument("--reply-tokens", type=int, default=120, help="words per generated reply")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="probability of a 502")
+    parser.add_argument("--rate-limit-rate", type=float, default=0.0, help="probability of a 429")
+    parser.add_argument("--seed", type=int, default=None)
+    args = parser.parse_args()
+
+    import uvicorn
+    app = create_app(
+        latency=args.latency,
+        latency_jitter=args.latency_jitter,
+        tokens_per_second=args.tokens_per_second,
+        reply_tokens=args.reply_tokens,
+        error_rate=args.error_rate,
+        rate_limit_rate=args.rate_limit_rate,
+        seed=args.seed
+    )
+    uvicorn.run(app, host=args.host, port=args.port, log_level="warning")
+
+if __name__ == "__main__":
+    main()
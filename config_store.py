@@ -0,0 +1,138 @@
+import atexit
+import copy
+import json
+import logging
+import os
+import threading
+from contextlib import contextmanager
+
+from fileutil import write_json_atomic
+
+logger = logging.getLogger("NeuroPrime.config")
+
+class ConfigStore:
+    """Owner of config.json and the key that encrypts the API key inside it.
+
+    The file is read on first access and the API key is decrypted only when something
+    asks for it, so importing the app never touches the key file. The Fernet cipher is
+    built once. Readers get the current snapshot without locking;
+    writers copy it under a lock, swap in the new dict and schedule a flush, so a burst
+    of changes is coalesced into one atomic temp-file-and-rename write.
+    """
+
+    def __init__(self, config_file, key_file, defaults, flush_delay=0.5):
+        self.config_file = config_file
+        self.key_file = key_file
+        self.defaults = defaults
+        self.flush_delay = flush_delay
+        self._cipher = None
+        self._cipher_lock = threading.Lock()
+        self._write_lock = threading.RLock()
+        self._flush_timer = None
+        self._dirty = False
+        self._data = None
+        self._sealed = False  # True while _data["api_key"] still holds ciphertext
+        atexit.register(self.flush)
+
+    # --- Encryption ---
+    def _get_cipher(self):
+        if self._cipher is None:
+            with self._cipher_lock:
+                if self._cipher is None:
+                    from cryptography.fernet import Fernet
+                    if os.path.exists(self.key_file):
+                        with open(self.key_file, "rb") as f:
+                            key = f.read()
+                    else:
+                        key = Fernet.generate_key()
+                        os.makedirs(os.path.dirname(self.key_file), exist_ok=True)
+                        with open(self.key_file, "wb") as f:
+                            f.write(key)
+                    self._cipher = Fernet(key)
+        return self._cipher
+
+    def encrypt(self, value):
+        return self._get_cipher().encrypt(value.encode()).decode()
+
+    def decrypt(self, value):
+        return self._get_cipher().decrypt(value.encode()).decode()
+
+    # --- Loading ---
+    def _load(self):
+        data = copy.deepcopy(self.defaults)
+        try:
+            if os.path.exists(self.config_file):
+                with open(self.config_file, "r") as f:
+                    stored = json.load(f)
+                if not stored.get("models"):
+                    stored.pop("models", None)
+                data.update(stored)
+                self._sealed = bool(stored.get("api_key"))
+        except Exception as e:
+            logger.warning(f"Could not read {self.config_file}, using defaults: {e}")
+        return data
+
+    def _current(self, unseal=True):
+        data = self._data
+        if data is None or (unseal and self._sealed):
+            with self._write_lock:
+                if self._data is None:
+                    self._data = self._load()
+                if unseal and self._sealed:
+                    unsealed = dict(self._data)
+                    try:
+                        unsealed["api_key"] = self.decrypt(unsealed["api_key"])
+                    except Exception:
+                        unsealed["api_key"] = ""
+                    self._data = unsealed
+                    self._sealed = False
+                data = self._data
+        return data
+
+    # --- Reads (lock-free once loaded) ---
+    def snapshot(self):
+        """Return the current config. Treat it as read-only; writers replace it rather than mutate it."""
+        return self._current()
+
+    def get(self, key, default=None):
+        return self._current(unseal=key == "api_key").get(key, default)
+
+    # --- Writes ---
+    def update(self, **changes):
+        with self.edit() as draft:
+            draft.update(changes)
+
+    @contextmanager
+    def edit(self):
+        """Yield a private copy of the config; it becomes current when the block exits cleanly."""
+        with self._write_lock:
+            draft = copy.deepcopy(self._current())
+            yield draft
+            self._data = draft
+            self._dirty = True
+            self._schedule_flush()
+
+    def _schedule_flush(self):
+        if self._flush_timer is None:
+            self._flush_timer = threading.Timer(self.flush_delay, self.flush)
+            self._flush_timer.daemon = True
+            self._flush_timer.start()
+
+    def flush(self):
+        """Write pending changes to disk now."""
+        with self._write_lock:
+            if self._flush_timer is not None:
+                self._flush_timer.cancel()
+                self._flush_timer = None
+            if not self._dirty:
+                return True
+            to_save = dict(self._data)
+            if to_save.get("api_key"):
+                to_save["api_key"] = self.encrypt(to_save["api_key"])
+            try:
+                write_json_atomic(self.config_file, to_save)
+            except OSError as e:
+                logger.error(f"Could not save {self.config_file}: {e}")
+                return False
+            self._dirty = False
+            return True
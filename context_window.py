@@ -0,0 +1,101 @@
+import re
+
+import settings
+
+# Rough cost of per-message framing (role markers, separators) in chat templates.
+MESSAGE_OVERHEAD_TOKENS = 4
+# Rough prompt cost of one attached image after downscaling.
+IMAGE_TOKENS = 1000
+SUMMARY_LINE_CHARS = 240
+SUMMARY_HEADER = "Summary of earlier turns in this conversation (oldest first):"
+
+def estimate_tokens(text):
+    """Local token estimate: the larger of ~4 characters per token and ~0.75 words per token."""
+    if not text:
+        return 0
+    words = len(re.findall(r"\w+|[^\w\s]", text))
+    return max(len(text) // 4, int(words * 0.75)) + 1
+
+def message_tokens(message):
+    content = message["content"]
+    if isinstance(content, list):
+        tokens = 0
+        for part in content:
+            if part.get("type") == "text":
+                tokens += estimate_tokens(part.get("text", ""))
+            else:
+                tokens += IMAGE_TOKENS
+        return tokens + MESSAGE_OVERHEAD_TOKENS
+    return estimate_tokens(content) + MESSAGE_OVERHEAD_TOKENS
+
+def summarize_message(message):
+    """Compress one turn to a single line: its leading text, whitespace collapsed."""
+    text = " ".join(str(message["content"]).split())
+    if len(text) > SUMMARY_LINE_CHARS:
+        text = text[:SUMMARY_LINE_CHARS].rsplit(" ", 1)[0] + " ..."
+    return f"- {message['role']}: {text}"
+
+class ContextManager:
+    """Keeps the prompt for each turn inside a per-model token budget.
+
+    The newest turns are always sent verbatim. When the history no longer fits, the
+    oldest verbatim turns are folded into a rolling summary that is carried between
+    turns, and the summary itself drops its oldest lines once it outgrows its share
+    of the budget. Folding goes down to fold_target of the budget rather than just
+    under it, so the summary (and the cacheable prompt prefix it is part of) stays
+    the same for the next few turns instead of changing on every one. The summary state is a plain dict so it can live in gr.State:
+    {"covered": <number of history messages folded>, "lines": [...]}.
+    """
+
+    def __init__(self, default_window=16000, model_windows=None, max_budget=32000,
+                 reply_reserve=2048, summary_share=0.15, min_recent_messages=2, window_lookup=None,
+                 fold_target=0.7):
+        self.default_window = default_window
+        self.model_windows = model_windows or {}
+        # Fallback for models the prefix table does not cover, e.g. ModelCatalog.context_length.
+        self.window_lookup = window_lookup
+        self.max_budget = max_budget
+        self.reply_reserve = reply_reserve
+        self.summary_share = summary_share
+        self.min_recent_messages = min_recent_messages
+        self.fold_target = fold_target
+
+    def context_window_for(self, model):
+        window = settings.lookup_by_prefix(self.model_windows, model, None)
+        if window is not None:
+            return window
+        window = self.window_lookup(model) if self.window_lookup and model else None
+        return window or self.default_window
+
+    def budget_for(self, model):
+        """Prompt tokens allowed for model: its window (capped by max_budget) minus the reply reserve."""
+        return max(min(self.context_window_for(model), self.max_budget) - self.reply_reserve, 256)
+
+    def build(self, system_prompt, history, budget, summary=None, extra_tokens=0):
+        """Return (messages, summary) where messages fit budget and summary is the updated rolling state."""
+        if not summary or summary.get("covered", 0) > len(history):
+            summary = {"covered": 0, "lines": []}
+        covered = summary["covered"]
+        lines = list(summary["lines"])
+        fixed = estimate_tokens(system_prompt) + MESSAGE_OVERHEAD_TOKENS + extra_tokens
+        recent_tokens = [message_tokens(m) for m in history[covered:]]
+        summary_budget = int(budget * self.summary_share)
+
+        def summary_tokens():
+            return estimate_tokens(SUMMARY_HEADER + "\n" + "\n".join(lines)) + MESSAGE_OVERHEAD_TOKENS if lines else 0
+
+        total = fixed + sum(recent_tokens) + summary_tokens()
+        limit = budget if total <= budget else int(budget * self.fold_target)
+        while total > limit and len(history) - covered > self.min_recent_messages:
+            lines.append(summarize_message(history[covered]))
+            recent_tokens.pop(0)
+            covered += 1
+            while len(lines) > 1 and summary_tokens() > summary_budget:
+                lines.pop(0)
+            total = fixed + sum(recent_tokens) + summary_tokens()
+
+        messages = [{"role": "system", "content": system_prompt}]
+        if lines:
+            messages.append({"role": "system", "content": SUMMARY_HEADER + "\n" + "\n".join(lines)})
+        messages.extend(history[covered:])
+        return messages, {"covered": covered, "lines": lines}
@@ -0,0 +1,182 @@
+import os
+import re
+import sqlite3
+import threading
+import time
+import uuid
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS conversations (
+    id TEXT PRIMARY KEY,
+    title TEXT NOT NULL,
+    owner TEXT,
+    created_at REAL NOT NULL,
+    updated_at REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS messages (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    conversation_id TEXT NOT NULL REFERENCES conversations(id) ON DELETE CASCADE,
+    role TEXT NOT NULL,
+    content TEXT NOT NULL,
+    created_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS messages_by_conversation ON messages(conversation_id, id);
+CREATE INDEX IF NOT EXISTS conversations_by_recency ON conversations(updated_at);
+"""
+
+# Run after SCHEMA, once databases created before the owner column have been migrated.
+OWNER_INDEX = "CREATE INDEX IF NOT EXISTS conversations_by_owner ON conversations(owner, updated_at);"
+
+# Full-text index over message content, kept in step with the messages table by triggers
+# so appending a message updates it in the same transaction.
+SEARCH_SCHEMA = """
+CREATE VIRTUAL TABLE IF NOT EXISTS messages_fts USING fts5(
+    content, content='messages', content_rowid='id', tokenize='porter unicode61'
+);
+CREATE TRIGGER IF NOT EXISTS messages_fts_insert AFTER INSERT ON messages BEGIN
+    INSERT INTO messages_fts(rowid, content) VALUES (new.id, new.content);
+END;
+CREATE TRIGGER IF NOT EXISTS messages_fts_delete AFTER DELETE ON messages BEGIN
+    INSERT INTO messages_fts(messages_fts, rowid, content) VALUES ('delete', old.id, old.content);
+END;
+CREATE TRIGGER IF NOT EXISTS messages_fts_update AFTER UPDATE OF content ON messages BEGIN
+    INSERT INTO messages_fts(messages_fts, rowid, content) VALUES ('delete', old.id, old.content);
+    INSERT INTO messages_fts(rowid, content) VALUES (new.id, new.content);
+END;
+"""
+
+# Roles replayed into a chat; "reasoning" rows are stored for search only.
+CHAT_ROLES = ("user", "assistant")
+
+def fts_query(text):
+    """Turn free text into an FTS5 query: every word must match, the last one as a prefix."""
+    words = re.findall(r"\w+", text)
+    if not words:
+        return None
+    terms = [f'"{word}"' for word in words]
+    terms[-1] += "*"
+    return " ".join(terms)
+
+class ConversationStore:
+    """Append-only chat history in SQLite (WAL mode).
+
+    Every message is a single INSERT, so persisting a turn costs the same at message 2
+    and message 2000. Reads are paged so a long conversation is never loaded whole.
+    Connections are per thread; call from worker threads (asyncio.to_thread) in async code.
+    Conversations may carry an owner; passing owner to the read methods scopes them to it.
+    Message text, including stored reasoning, is full-text indexed for search().
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._local = threading.local()
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with self._connect() as conn:
+            conn.executescript(SCHEMA)
+            columns = {row["name"] for row in conn.execute("PRAGMA table_info(conversations)")}
+            if "owner" not in columns:
+                conn.execute("ALTER TABLE conversations ADD COLUMN owner TEXT")
+            conn.execute(OWNER_INDEX)
+            indexed = conn.execute("SELECT 1 FROM sqlite_master WHERE name = 'messages_fts'").fetchone()
+            conn.executescript(SEARCH_SCHEMA)
+        if not indexed:
+            # Databases from before the search index: backfill it once.
+            self.reindex()
+
+    def _connect(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30)
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute("PRAGMA foreign_keys=ON")
+            self._local.conn = conn
+        return conn
+
+    def create_conversation(self, title, owner=None):
+        conversation_id = uuid.uuid4().hex
+        now = time.time()
+        with self._connect() as conn:
+            conn.execute(
+                "INSERT INTO conversations (id, title, owner, created_at, updated_at) VALUES (?, ?, ?, ?, ?)",
+                (conversation_id, title.strip()[:80] or "Untitled", owner, now, now)
+            )
+        return conversation_id
+
+    def append_message(self, conversation_id, role, content):
+        now = time.time()
+        with self._connect() as conn:
+            cursor = conn.execute(
+                "INSERT INTO messages (conversation_id, role, content, created_at) VALUES (?, ?, ?, ?)",
+                (conversation_id, role, content, now)
+            )
+            conn.execute("UPDATE conversations SET updated_at = ? WHERE id = ?", (now, conversation_id))
+        return cursor.lastrowid
+
+    def list_conversations(self, limit=50, offset=0, owner=None):
+        """Most recently active conversations first."""
+        if owner is None:
+            rows = self._connect().execute(
+                "SELECT id, title, created_at, updated_at FROM conversations ORDER BY updated_at DESC LIMIT ? OFFSET ?",
+                (limit, offset)
+            ).fetchall()
+        else:
+            rows = self._connect().execute(
+                "SELECT id, title, created_at, updated_at FROM conversations WHERE owner = ? "
+                "ORDER BY updated_at DESC LIMIT ? OFFSET ?",
+                (owner, limit, offset)
+            ).fetchall()
+        return [dict(row) for row in rows]
+
+    def load_messages(self, conversation_id, before_id=None, limit=50, owner=None):
+        """Return up to limit messages older than before_id (newest page when None), oldest first."""
+        if before_id is None:
+            before_id = 2 ** 63 - 1
+        if owner is not None:
+            row = self._connect().execute("SELECT owner FROM conversations WHERE id = ?", (conversation_id,)).fetchone()
+            if row is None or row["owner"] != owner:
+                return []
+        rows = self._connect().execute(
+            "SELECT id, role, content, created_at FROM messages WHERE conversation_id = ? AND id < ? "
+            "AND role IN (?, ?) ORDER BY id DESC LIMIT ?",
+            (conversation_id, before_id, *CHAT_ROLES, limit)
+        ).fetchall()
+        return [dict(row) for row in reversed(rows)]
+
+    def search(self, text, limit=20, owner=None):
+        """Best-ranked (BM25) matching message per conversation, best first, with a highlighted snippet."""
+        query = fts_query(text)
+        if query is None:
+            return []
+        owner_filter = "AND c.owner = ?" if owner is not None else ""
+        # snippet() needs the FTS cursor, so pick each conversation's best row first, then highlight it.
+        rows = self._connect().execute(
+            f"""
+            WITH best AS (
+                SELECT m.id, MIN(messages_fts.rank) AS score
+                FROM messages_fts JOIN messages m ON m.id = messages_fts.rowid
+                JOIN conversations c ON c.id = m.conversation_id
+                WHERE messages_fts MATCH ? {owner_filter}
+                GROUP BY m.conversation_id ORDER BY score LIMIT ?
+            )
+            SELECT m.id, m.conversation_id, m.role, m.created_at, c.title,
+                   snippet(messages_fts, 0, '[', ']', '...', 12) AS snippet
+            FROM best JOIN messages_fts ON messages_fts.rowid = best.id
+            JOIN messages m ON m.id = best.id JOIN conversations c ON c.id = m.conversation_id
+            WHERE messages_fts MATCH ? ORDER BY best.score
+            """,
+            (query, *([owner] if owner is not None else []), limit, query)
+        ).fetchall()
+        return [dict(row) for row in rows]
+
+    def reindex(self):
+        """Rebuild the search index from the messages table and compact it; returns the message count."""
+        with self._connect() as conn:
+            conn.execute("INSERT INTO messages_fts(messages_fts) VALUES ('rebuild')")
+            conn.execute("INSERT INTO messages_fts(messages_fts) VALUES ('optimize')")
+            return conn.execute("SELECT COUNT(*) FROM messages").fetchone()[0]
+
+    def delete_conversation(self, conversation_id):
+        with self._connect() as conn:
+            conn.execute("DELETE FROM conversations WHERE id = ?", (conversation_id,))
@@ -0,0 +1,43 @@
+import json
+import os
+import tempfile
+
+def write_json_atomic(path, data):
+    """Write JSON through a temp file in the same directory and rename it over path."""
+    directory = os.path.dirname(path)
+    os.makedirs(directory, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=".tmp-", suffix=".json")
+    try:
+        with os.fdopen(fd, "w") as f:
+            json.dump(data, f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+    except BaseException:
+        try:
+            os.unlink(tmp_path)
+        except OSError:
+            pass
+        raise
+
+def create_text_once(path, text):
+    """Create path holding text (mode 0600) unless it exists; returns the file's content either way.
+
+    The file appears complete or not at all, so a process racing to create the same file
+    reads the winner's text instead of an empty or partial one.
+    """
+    directory = os.path.dirname(path)
+    os.makedirs(directory, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=".tmp-")
+    try:
+        with os.fdopen(fd, "w") as f:
+            f.write(text)
+            f.flush()
+            os.fsync(f.fileno())
+        os.link(tmp_path, path)
+        return text
+    except FileExistsError:
+        with open(path, "r") as f:
+            return f.read()
+    finally:
+        os.unlink(tmp_path)
@@ -0,0 +1,292 @@
+import json
+import math
+import re
+from dataclasses import dataclass
+
+# Curated reasoning-framework pairs with ready-made hybrid prompt prefixes, plus a
+# keyword classifier that picks one for a query without calling a model.
+
+@dataclass(frozen=True)
+class FrameworkPair:
+    id: str
+    first: str
+    first_why: str
+    second: str
+    second_why: str
+    why_combined: str
+    hybrid_prefix: str
+    keywords: tuple = ()
+
+LIBRARY = (
+    FrameworkPair(
+        "debugging",
+        "Abductive reasoning", "infers the most plausible causes from the symptoms observed",
+        "Deductive reasoning", "derives what each candidate cause predicts so it can be confirmed or ruled out",
+        "Abduction proposes hypotheses quickly; deduction turns each into a concrete check, so the search narrows instead of wandering.",
+        "List the most plausible causes of the problem given the symptoms, most likely first. For each, state what "
+        "else would have to be true if it were the cause and how to check it. Rule causes out by those checks, then "
+        "give the fix for the one that survives and how to confirm it worked.",
+        ("bug", "debug", "crash", "fail", "broken", "not working", "doesn't work", "exception", "traceback",
+         "troubleshoot", "diagnose", "stack trace", "error message", "wrong output", "segfault"),
+    ),
+    FrameworkPair(
+        "math",
+        "First principles reasoning", "reduces the problem to definitions and known results",
+        "Deductive reasoning", "chains valid steps from those foundations to the answer",
+        "First principles fixes what is actually given; deduction guarantees every step follows, so the result can be verified line by line.",
+        "Restate exactly what is given and what is asked, with definitions. Work from those foundations in small, "
+        "justified steps, showing each calculation. Finish by checking the result against the original conditions "
+        "(units, limiting cases or substitution).",
+        ("prove", "proof", "theorem", "equation", "calculate", "derivative", "integral", "algebra",
+         "geometry", "formula", "math", "lemma", "matrix", "simplify"),
+    ),
+    FrameworkPair(
+        "uncertainty",
+        "Bayesian reasoning", "starts from base rates and updates them on the evidence",
+        "Counterfactual reasoning", "asks what would be observed if the leading estimate were wrong",
+        "Bayesian updating gives a calibrated estimate; counterfactual checks expose evidence that would overturn it.",
+        "Start from a base rate or prior for each outcome and say where it comes from. Update it on each piece of "
+        "evidence, saying how strongly that evidence discriminates between outcomes. Give a calibrated final "
+        "estimate, then name what observation would most change it.",
+        ("probability", "likely", "likelihood", "odds", "risk", "chance", "uncertain", "forecast", "predict",
+         "estimate", "how likely", "base rate", "expected value", "gamble", "bet"),
+    ),
+    FrameworkPair(
+        "decision",
+        "Critical thinking", "weighs each option against explicit criteria and checks for bias",
+        "Counterfactual reasoning", "imagines each choice having been made and how it played out",
+        "Explicit criteria keep the comparison fair; imagining each outcome surfaces costs the criteria missed.",
+        "Name the options and the criteria that matter for this decision, weighting them. Score each option against "
+        "the criteria with brief evidence. For the top two, imagine a year after choosing each and note what went "
+        "wrong. Recommend one and state what would change the recommendation.",
+        ("should i", "choose", "decide", "decision", "versus", "vs", "compare", "better", "pros", "cons",
+         "tradeoff", "trade off", "option", "recommend", "which one", "alternative", "worth it"),
+    ),
+    FrameworkPair(
+        "systems",
+        "Systems thinking", "maps components, their interactions and feedback loops",
+        "First principles reasoning", "grounds each part of the design in the actual requirements and constraints",
+        "Systems thinking catches interactions and bottlenecks; first principles stops the design from copying parts it does not need.",
+        "Pin down the real requirements and hard constraints (load, latency, cost, failure tolerance). Sketch the "
+        "components and how they interact, marking feedback loops, shared resources and single points of failure. "
+        "Justify each design choice from the requirements and note where it will break first as it scales.",
+        ("architecture", "design", "scale", "scalable", "system", "infrastructure", "microservice", "distributed",
+         "pipeline", "throughput", "latency", "database", "bottleneck", "deploy", "organization", "ecosystem"),
+    ),
+    FrameworkPair(
+        "creative",
+        "Lateral thinking", "deliberately breaks the obvious framing to generate unusual options",
+        "Analogical reasoning", "borrows structures that worked in other domains",
+        "Lateral moves widen the search; analogies make the unusual ideas concrete and workable.",
+        "Generate a wide range of ideas before judging any. Deliberately flip or drop one assumption of the request, "
+        "and borrow at least a few ideas from unrelated fields by analogy. Then pick the strongest few and develop "
+        "each enough to be used.",
+        ("idea", "brainstorm", "creative", "name for", "story", "poem", "invent", "slogan", "imagine", "come up with",
+         "novel", "fiction", "tagline", "gift", "game"),
+    ),
+    FrameworkPair(
+        "ethics",
+        "Dialectical reasoning", "develops the strongest opposing positions and looks for a synthesis",
+        "Critical thinking", "tests each argument's premises, evidence and hidden assumptions",
+        "Dialectic makes sure every serious side is heard at full strength; critical evaluation decides which arguments hold up.",
+        "State the strongest case for each major position, in terms its proponents would accept. Examine the key "
+        "premises and evidence behind each, flagging weak steps and value judgements. Conclude with a reasoned view "
+        "or synthesis, and be explicit about the values it depends on.",
+        ("ethical", "ethics", "moral", "morally", "argue", "argument", "debate", "opinion", "controversial",
+         "justify", "right or wrong", "fair", "should society", "policy", "philosophy"),
+    ),
+    FrameworkPair(
+        "causal",
+        "Causal reasoning", "traces mechanisms linking causes to effects",
+        "Counterfactual reasoning", "tests each proposed cause by asking what would have happened without it",
+        "Causal chains explain how the outcome came about; counterfactuals separate the causes that mattered from coincidences.",
+        "Identify the outcome to explain and the candidate causes, separating background conditions from triggers. "
+        "Trace the mechanism by which each cause led to the outcome. For each, ask what would most likely have "
+        "happened without it, and rank the causes by how much they mattered.",
+        ("why did", "cause", "caused", "effect", "impact", "led to", "consequence", "history", "happened", "reason for",
+         "result of", "because", "origin", "war", "collapse"),
+    ),
+    FrameworkPair(
+        "explanation",
+        "Analogical reasoning", "maps the unfamiliar idea onto one the reader already knows",
+        "First principles reasoning", "rebuilds the idea from its basic parts so the analogy does not mislead",
+        "An analogy gives instant intuition; first principles supply the precise version and show where the analogy breaks.",
+        "Open with a familiar analogy that captures the core of the idea. Then explain it properly from its basic "
+        "parts, building up one step at a time. Point out where the analogy stops holding, and end with a concrete "
+        "example.",
+        ("explain", "understand", "how does", "concept", "intuition", "learn", "teach", "eli5",
+         "meaning of", "difference between", "how do", "overview", "introduction"),
+    ),
+    FrameworkPair(
+        "planning",
+        "Systems thinking", "sees the plan's parts, dependencies and constraints as one whole",
+        "Counterfactual reasoning", "runs a pre-mortem: assume the plan failed and ask why",
+        "Systems thinking orders the work around its dependencies; a pre-mortem finds the risks before they happen.",
+        "Clarify the goal, deadline and constraints. Break the work into steps in dependency order with rough effort "
+        "for each. Then assume the plan has failed and list the most likely reasons why; add a mitigation or early "
+        "warning sign for each to the plan.",
+        ("plan", "strategy", "roadmap", "business", "startup", "market", "growth", "launch", "goal", "schedule",
+         "project", "steps to", "timeline", "budget", "career"),
+    ),
+    FrameworkPair(
+        "writing",
+        "Rhetorical analysis", "considers audience, purpose and tone before wording",
+        "Critical thinking", "checks the draft for clarity, accuracy and unsupported claims",
+        "Rhetoric shapes the text for its reader; critical review makes sure it is correct and says only what it can support.",
+        "Identify the audience, the purpose of the text and the right tone. Put the main point first and organise the "
+        "rest around it. Review the draft for unclear sentences, unsupported claims and anything the audience does not "
+        "need, and cut or fix them.",
+        ("write", "essay", "email", "rewrite", "edit", "tone", "draft", "summarize", "summary", "letter",
+         "cover letter", "proofread", "paragraph", "article", "blog post"),
+    ),
+    FrameworkPair(
+        "data",
+        "Inductive reasoning", "generalises carefully from the patterns in the data",
+        "Bayesian reasoning", "weighs how strongly the data supports each explanation against alternatives",
+        "Induction finds the patterns; Bayesian weighing checks whether they are strong enough to believe.",
+        "Describe what the data shows before interpreting it, including sample size and how it was collected. "
+        "Identify the main patterns, then consider alternative explanations (chance, confounders, selection) and "
+        "how much the data favours each. State the conclusion with an honest level of confidence.",
+        ("data", "dataset", "statistics", "statistical", "trend", "correlation", "analyze", "analysis", "experiment",
+         "survey", "sample", "regression", "significant", "a/b test", "metric"),
+    ),
+    FrameworkPair(
+        "coding",
+        "Decompositional reasoning", "splits the task into small, testable units",
+        "Analogical reasoning", "reuses proven patterns and idioms for each unit",
+        "Decomposition keeps each piece simple and checkable; known patterns avoid reinventing (and re-debugging) solutions.",
+        "Restate the inputs, outputs and edge cases. Break the task into small functions or steps and pick a standard, "
+        "idiomatic approach for each. Write the code, then walk through it with a normal case and an edge case to "
+        "check it.",
+        ("code", "function", "implement", "python", "javascript", "script", "algorithm", "api", "class", "sql",
+         "regex", "program", "refactor", "unit test", "library", "typescript", "rust"),
+    ),
+)
+
+# --- Classifier ---
+STOPWORDS = frozenset("a an the and or of to in on for with is are be it this that my me i do can you how".split())
+
+def stem(word):
+    """Crude suffix stripping so "crashes", "crashed" and "crashing" share one term."""
+    for suffix in ("ing", "ed", "es", "s"):
+        if word.endswith(suffix) and len(word) - len(suffix) >= 3:
+            return word[:-len(suffix)]
+    return word
+
+def tokenize(text):
+    return [stem(word) for word in re.findall(r"[a-z0-9']+(?:/[a-z0-9]+)?", text.lower())]
+
+def terms(text, max_words=3):
+    """Set of stemmed 1- to max_words-grams; single stopwords are dropped but may appear inside phrases."""
+    tokens = tokenize(text)
+    found = set()
+    for size in range(1, max_words + 1):
+        for i in range(len(tokens) - size + 1):
+            gram = tokens[i:i + size]
+            if size == 1 and gram[0] in STOPWORDS:
+                continue
+            found.add(" ".join(gram))
+    return found
+
+class FrameworkClassifier:
+    """Keyword classifier over the library, weighted like TF-IDF.
+
+    A keyword listed by fewer pairs carries more weight (idf), and multi-word phrases
+    count extra. A query is matched only when the best pair has at least min_hits
+    distinct keyword hits, clears min_score and beats the runner-up by margin; anything
+    else is left to the model. Keywords are kept specific to their pair: a lone word
+    like "fix" or "solve" says too little about the request to skip the model.
+    """
+
+    def __init__(self, pairs=LIBRARY, min_score=2.0, margin=1.25, min_hits=2):
+        self.pairs = pairs
+        self.min_score = min_score
+        self.margin = margin
+        self.min_hits = min_hits
+        postings = {}
+        for index, pair in enumerate(pairs):
+            for keyword in pair.keywords:
+                postings.setdefault(" ".join(tokenize(keyword)), set()).add(index)
+        self._weights = {}
+        for term, indexes in postings.items():
+            weight = math.log(1 + len(pairs) / len(indexes)) * (1 + 0.5 * term.count(" "))
+            for index in indexes:
+                self._weights.setdefault(term, []).append((index, weight))
+        self._max_words = max((term.count(" ") + 1 for term in postings), default=1)
+
+    def scores(self, query):
+        """(score, distinct keyword hits) for each pair."""
+        scores = [0.0] * len(self.pairs)
+        hits = [0] * len(self.pairs)
+        for term in terms(query, self._max_words):
+            for index, weight in self._weights.get(term, ()):
+                scores[index] += weight
+                hits[index] += 1
+        return list(zip(scores, hits))
+
+    def classify(self, query):
+        """The best FrameworkPair for query, or None when no pair is a confident match."""
+        scores = self.scores(query or "")
+        ranked = sorted(range(len(scores)), key=lambda index: scores[index][0], reverse=True)
+        best, hits = scores[ranked[0]] if ranked else (0.0, 0)
+        runner_up = scores[ranked[1]][0] if len(ranked) > 1 else 0.0
+        if hits < self.min_hits or best < self.min_score or best < runner_up * self.margin:
+            return None
+        return self.pairs[ranked[0]]
+
+# --- Rendering and Structured Output ---
+def format_reasoning(pair):
+    """The reasoning text shown in the UI, in the same layout for library and model answers."""
+    return (
+        f"1. Framework 1: {pair.first} - {pair.first_why}\n"
+        f"2. Framework 2: {pair.second} - {pair.second_why}\n"
+        f"3. Why combining them works: {pair.why_combined}\n"
+        f"4. Hybrid prompt prefix to add: {pair.hybrid_prefix}"
+    )
+
+_FRAMEWORK_SCHEMA = {
+    "type": "object",
+    "properties": {"name": {"type": "string"}, "justification": {"type": "string"}},
+    "required": ["name", "justification"],
+    "additionalProperties": False,
+}
+
+# JSON schema for response_format, so the model's answer parses without guesswork.
+RESPONSE_SCHEMA = {
+    "name": "reasoning_frameworks",
+    "strict": True,
+    "schema": {
+        "type": "object",
+        "properties": {
+            "framework_1": _FRAMEWORK_SCHEMA,
+            "framework_2": _FRAMEWORK_SCHEMA,
+            "why_combined": {"type": "string"},
+            "hybrid_prefix": {"type": "string"},
+        },
+        "required": ["framework_1", "framework_2", "why_combined", "hybrid_prefix"],
+        "additionalProperties": False,
+    },
+}
+
+def parse_structured(content):
+    """Build a FrameworkPair from a model's JSON answer; raises ValueError if it does not match the schema."""
+    text = content.strip()
+    if text.startswith("```"):
+        # Some providers wrap JSON in a code fence even when asked not to.
+        text = text.strip("`").partition("\n")[2]
+    start, end = text.find("{"), text.rfind("}")
+    if start < 0 or end < start:
+        raise ValueError("reasoning reply is not JSON")
+    data = json.loads(text[start:end + 1])
+    try:
+        pair = FrameworkPair(
+            "model",
+            data["framework_1"]["name"].strip(), data["framework_1"]["justification"].strip(),
+            data["framework_2"]["name"].strip(), data["framework_2"]["justification"].strip(),
+            data["why_combined"].strip(), data["hybrid_prefix"].strip(),
+        )
+    except (KeyError, TypeError, AttributeError) as e:
+        raise ValueError(f"reasoning reply does not match the schema ({e!r})") from e
+    if not pair.hybrid_prefix:
+        raise ValueError("reasoning reply has an empty hybrid_prefix")
+    return pair
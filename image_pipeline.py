@@ -0,0 +1,102 @@
+import base64
+import hashlib
+import io
+import threading
+from collections import OrderedDict
+
+import settings
+import startup
+
+Image = startup.lazy_import("PIL.Image")
+
+MAX_QUALITY = 90
+MIN_QUALITY = 40
+# Each retry shrinks the image by this factor when even MIN_QUALITY misses the budget.
+SHRINK_FACTOR = 0.75
+
+def to_rgb(image):
+    """Convert any PIL mode to RGB, flattening transparency onto white (JPEG has no alpha)."""
+    if image.mode == "RGB":
+        return image
+    if image.mode in ("RGBA", "LA", "PA") or (image.mode == "P" and "transparency" in image.info):
+        rgba = image.convert("RGBA")
+        background = Image.new("RGB", rgba.size, (255, 255, 255))
+        background.paste(rgba, mask=rgba.getchannel("A"))
+        return background
+    if image.mode.startswith("I;16") or image.mode in ("I", "F"):
+        # High bit-depth grayscale: scale into 8 bits before converting.
+        return image.convert("I").point(lambda v: v / 256).convert("L").convert("RGB")
+    return image.convert("RGB")
+
+def downscale(image, max_edge):
+    if max(image.size) <= max_edge:
+        return image
+    scale = max_edge / max(image.size)
+    size = (max(1, round(image.width * scale)), max(1, round(image.height * scale)))
+    return image.resize(size, Image.LANCZOS)
+
+def encode_jpeg(image, quality):
+    buffer = io.BytesIO()
+    image.save(buffer, format="JPEG", quality=quality, optimize=True)
+    return buffer.getvalue()
+
+def encode_within_budget(image, byte_budget):
+    """Return the highest-quality JPEG bytes that fit byte_budget, shrinking the image if needed."""
+    while True:
+        best = None
+        low, high = MIN_QUALITY, MAX_QUALITY
+        while low <= high:
+            quality = (low + high) // 2
+            data = encode_jpeg(image, quality)
+            if len(data) <= byte_budget:
+                best, low = data, quality + 1
+            else:
+                high = quality - 1
+        if best is not None:
+            return best
+        if max(image.size) <= 64:
+            return encode_jpeg(image, MIN_QUALITY)
+        image = downscale(image, int(max(image.size) * SHRINK_FACTOR))
+
+def content_hash(image):
+    digest = hashlib.sha256()
+    digest.update(f"{image.mode}:{image.size}".encode())
+    digest.update(image.tobytes())
+    return digest.hexdigest()
+
+class ImagePipeline:
+    """Turns uploaded PIL images into compact base64 JPEG payloads for a given model.
+
+    Images are converted to RGB, downscaled to the model's maximum edge and encoded at
+    the best quality that fits the byte budget. Results are cached by content hash and
+    target size, so sending the same image again skips the encode.
+    """
+
+    def __init__(self, default_max_edge=2048, model_max_edges=None, byte_budget=1_000_000, cache_size=32):
+        self.default_max_edge = default_max_edge
+        self.model_max_edges = model_max_edges or {}
+        self.byte_budget = byte_budget
+        self.cache_size = cache_size
+        self._cache = OrderedDict()
+        self._lock = threading.Lock()
+
+    def max_edge_for(self, model):
+        """Longest configured model-id prefix wins, e.g. "anthropic/" or "openai/gpt-4o"."""
+        return settings.lookup_by_prefix(self.model_max_edges, model, self.default_max_edge)
+
+    def prepare(self, image, model=None):
+        if image is None:
+            return None
+        max_edge = self.max_edge_for(model)
+        key = (content_hash(image), max_edge, self.byte_budget)
+        with self._lock:
+            if key in self._cache:
+                self._cache.move_to_end(key)
+                return self._cache[key]
+        data = encode_within_budget(downscale(to_rgb(image), max_edge), self.byte_budget)
+        encoded = base64.b64encode(data).decode("utf-8")
+        with self._lock:
+            self._cache[key] = encoded
+            while len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+        return encoded
@@ -0,0 +1,182 @@
+import bisect
+import threading
+import time
+
+# Prometheus instrumentation without the prometheus_client dependency: a few
+# label-aware histograms and counters rendered in the text exposition format.
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0)
+BYTE_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304, 16777216)
+# ASGI scope key stamped by RequestTimingMiddleware when a request reaches the server.
+RECEIVED_AT_KEY = "neuroprime.received_at"
+
+_registry = []
+
+def _format_labels(labelnames, values, extra=None):
+    pairs = list(zip(labelnames, values))
+    if extra:
+        pairs.append(extra)
+    if not pairs:
+        return ""
+    escaped = (str(v).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") for _, v in pairs)
+    return "{" + ",".join(f'{k}="{v}"' for (k, _), v in zip(pairs, escaped)) + "}"
+
+def _format_value(value):
+    return repr(float(value)) if value != int(value) else str(int(value))
+
+class Counter:
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+        _registry.append(self)
+
+    def inc(self, amount=1, **labels):
+        key = tuple(str(labels.get(name, "")) for name in self.labelnames)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels):
+        return self._values.get(tuple(str(labels.get(name, "")) for name in self.labelnames), 0)
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            for key, value in sorted(self._values.items()):
+                lines.append(f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}")
+        return lines
+
+class Histogram:
+    def __init__(self, name, documentation, labelnames=(), buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(sorted(buckets))
+        self._series = {}
+        self._lock = threading.Lock()
+        _registry.append(self)
+
+    def observe(self, value, **labels):
+        key = tuple(str(labels.get(name, "")) for name in self.labelnames)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            series[0][index] += 1
+            series[1] += value
+            series[2] += 1
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            for key, (counts, total, count) in sorted(self._series.items()):
+                cumulative = 0
+                for bound, bucket_count in zip(self.buckets + (float("inf"),), counts):
+                    cumulative += bucket_count
+                    le = "+Inf" if bound == float("inf") else _format_value(bound)
+                    lines.append(f"{self.name}_bucket{_format_labels(self.labelnames, key, ('le', le))} {cumulative}")
+                lines.append(f"{self.name}_sum{_format_labels(self.labelnames, key)} {_format_value(total)}")
+                lines.append(f"{self.name}_count{_format_labels(self.labelnames, key)} {count}")
+        return lines
+
+def render_latest():
+    lines = []
+    for metric in _registry:
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
+
+# --- NeuroPrime Metrics ---
+STAGE_SECONDS = Histogram(
+    "neuroprime_stage_seconds",
+    "Time spent per stage: queue_wait, context_build, prompt_build, request_build, rate_limit_wait, ttfb, first_token, network, json_parse, image_encode, handler; by the outcome of the call or handler it belonged to.",
+    ("operation", "model", "stage", "outcome")
+)
+PAYLOAD_BYTES = Histogram(
+    "neuroprime_payload_bytes",
+    "Size of OpenRouter request and response bodies.",
+    ("operation", "model", "direction"),
+    buckets=BYTE_BUCKETS
+)
+REQUESTS_TOTAL = Counter(
+    "neuroprime_requests_total",
+    "OpenRouter calls and UI handler runs by outcome.",
+    ("operation", "model", "outcome")
+)
+
+RESPONSE_CACHE_TOTAL = Counter(
+    "neuroprime_response_cache_lookups_total",
+    "Response cache lookups: hit, miss, or bypass for non-deterministic sampling.",
+    ("result",)
+)
+REASONING_RESULTS = Counter(
+    "neuroprime_reasoning_results_total",
+    "Reasoning frameworks served, by source: library (local classifier), cache or model.",
+    ("source",)
+)
+RESPONSE_CACHE_EVICTIONS = Counter(
+    "neuroprime_response_cache_evictions_total",
+    "Cached responses evicted to stay under the size bound."
+)
+
+PROMPT_TOKENS = Counter(
+    "neuroprime_prompt_tokens_total",
+    "Prompt tokens reported by the provider, by kind: cached (served from the provider's prompt cache) or uncached.",
+    ("operation", "model", "kind")
+)
+
+def observe_stage(operation, model, stage, seconds, outcome="ok"):
+    STAGE_SECONDS.observe(seconds, operation=operation, model=model or "unknown", stage=stage, outcome=outcome)
+
+def observe_usage(operation, model, usage):
+    """Count the prompt tokens in a response's usage block, split by whether the provider cache served them."""
+    prompt = usage.get("prompt_tokens") or 0
+    cached = (usage.get("prompt_tokens_details") or {}).get("cached_tokens") or 0
+    model = model or "unknown"
+    PROMPT_TOKENS.inc(cached, operation=operation, model=model, kind="cached")
+    PROMPT_TOKENS.inc(max(prompt - cached, 0), operation=operation, model=model, kind="uncached")
+
+def observe_queue_wait(operation, model, request):
+    """Record how long a Gradio event waited between reaching the server and its handler starting."""
+    received_at = None
+    http_request = getattr(request, "request", None) if request is not None else None
+    scope = getattr(http_request, "scope", None)
+    if scope is not None:
+        received_at = scope.get(RECEIVED_AT_KEY)
+    if received_at is not None:
+        observe_stage(operation, model, "queue_wait", time.perf_counter() - received_at)
+
+def outcome_of(error):
+    """Coarse, low-cardinality outcome label for an exception (or None for success)."""
+    if error is None:
+        return "ok"
+    status = getattr(getattr(error, "response", None), "status_code", None)
+    if status is not None:
+        return f"{status // 100}xx" if status != 429 else "rate_limited"
+    name = type(error).__name__
+    if name == "DeadlineExceeded":
+        return "deadline"
+    if "Timeout" in name:
+        return "timeout"
+    if name in ("CancelledError", "GeneratorExit"):
+        return "cancelled"
+    if "Connect" in name or "Protocol" in name or "Network" in name:
+        return "network_error"
+    return "error"
+
+class RequestTimingMiddleware:
+    """Pure ASGI middleware stamping each HTTP request with its arrival time."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "http":
+            scope.setdefault(RECEIVED_AT_KEY, time.perf_counter())
+        await self.app(scope, receive, send)
+
+def metrics_endpoint():
+    from fastapi.responses import PlainTextResponse
+    return PlainTextResponse(render_latest(), media_type="text/plain; version=0.0.4")
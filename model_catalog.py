@@ -0,0 +1,173 @@
+import bisect
+import json
+import logging
+import threading
+import time
+
+from fileutil import write_json_atomic
+
+CATALOG_VERSION = 1
+# After a failed refresh, wait this long before trying the network again.
+RETRY_AFTER_FAILURE = 60.0
+
+logger = logging.getLogger("NeuroPrime.model_catalog")
+
+def summarize_model(entry):
+    """Keep the fields the app uses from one /models entry."""
+    architecture = entry.get("architecture") or {}
+    modalities = architecture.get("input_modalities")
+    if not modalities:
+        # Older listings only carry "text+image->text".
+        modalities = architecture.get("modality", "text->text").partition("->")[0].split("+")
+    return {
+        "id": entry["id"],
+        "name": entry.get("name") or entry["id"],
+        "context_length": entry.get("context_length"),
+        "input_modalities": modalities,
+    }
+
+class _Index:
+    """Immutable lookup tables over one catalog snapshot; replaced wholesale on refresh."""
+
+    def __init__(self, models):
+        self.models = {m["id"]: m for m in models}
+        # Two sorted key lists so "gpt-4" completes as well as "openai/gpt-4".
+        self.ids = sorted((model_id.lower(), model_id) for model_id in self.models)
+        self.short_ids = sorted(
+            (model_id.partition("/")[2].lower(), model_id) for model_id in self.models if "/" in model_id
+        )
+
+def _prefix_matches(keys, prefix, limit):
+    start = bisect.bisect_left(keys, (prefix,))
+    for key, model_id in keys[start:start + limit]:
+        if not key.startswith(prefix):
+            break
+        yield model_id
+
+class ModelCatalog:
+    """OpenRouter's model listing, cached on disk and indexed in memory.
+
+    fetch(etag) returns (models, etag), with models None when the server answered
+    304 Not Modified. The listing is revalidated once it is older than ttl; until then
+    every lookup is served from memory. Lookups never block on the network: a stale
+    catalog keeps answering while a background refresh runs, and with no catalog at
+    all (offline, first run) they report the model as unknown rather than invalid.
+    """
+
+    def __init__(self, path, fetch, ttl=6 * 3600.0):
+        self.path = path
+        self.fetch = fetch
+        self.ttl = ttl
+        self._index = None
+        self._etag = None
+        self._fetched_at = 0.0
+        self._next_attempt = 0.0
+        self._load_lock = threading.Lock()
+        self._refresh_lock = threading.Lock()
+
+    def _load(self):
+        models = []
+        try:
+            with open(self.path, "r") as f:
+                data = json.load(f)
+            if data.get("version") == CATALOG_VERSION:
+                models = data["models"]
+                self._etag = data.get("etag")
+                self._fetched_at = data.get("fetched_at", 0.0)
+        except FileNotFoundError:
+            pass
+        except (OSError, ValueError, KeyError) as e:
+            logger.warning(f"Ignoring unreadable model catalog {self.path}: {e}")
+        return _Index(models)
+
+    def _current(self):
+        if self._index is None:
+            with self._load_lock:
+                if self._index is None:
+                    self._index = self._load()
+        return self._index
+
+    def _save(self, models):
+        write_json_atomic(self.path, {
+            "version": CATALOG_VERSION,
+            "etag": self._etag,
+            "fetched_at": self._fetched_at,
+            "models": models,
+        })
+
+    def is_stale(self):
+        self._current()
+        return time.time() - self._fetched_at > self.ttl
+
+    def refresh(self, force=False):
+        """Revalidate the listing if it is stale (or force is set); return True if it changed."""
+        with self._refresh_lock:
+            index = self._current()
+            if not force and (not self.is_stale() or time.time() < self._next_attempt):
+                return False
+            try:
+                models, etag = self.fetch(self._etag if index.models else None)
+            except Exception as e:
+                self._next_attempt = time.time() + RETRY_AFTER_FAILURE
+                logger.warning(f"Model catalog refresh failed: {e!r}")
+                return False
+            self._fetched_at = time.time()
+            if models is None:
+                # 304: what we have is current; just record that we checked.
+                self._save(list(index.models.values()))
+                return False
+            models = [summarize_model(m) for m in models if m.get("id")]
+            self._etag = etag
+            self._save(models)
+            self._index = _Index(models)
+            logger.info(f"Model catalog refreshed: {len(models)} models")
+            return True
+
+    def refresh_in_background(self):
+        """Start a refresh thread if the catalog is stale and none is running."""
+        if self._refresh_lock.locked() or time.time() < self._next_attempt or not self.is_stale():
+            return
+        threading.Thread(target=self.refresh, name="model-catalog-refresh", daemon=True).start()
+
+    def __len__(self):
+        return len(self._current().models)
+
+    def get(self, model_id):
+        """The catalog entry for model_id, or None if the catalog does not list it."""
+        self.refresh_in_background()
+        models = self._current().models
+        # Variant suffixes such as ":free" or ":online" share the base model's capabilities.
+        return models.get(model_id) or models.get(model_id.partition(":")[0])
+
+    def is_known(self, model_id):
+        """True/False once a catalog is available; None when there is nothing to check against."""
+        index = self._current()
+        if not index.models:
+            return None
+        return model_id in index.models or model_id.partition(":")[0] in index.models
+
+    def complete(self, prefix, limit=20):
+        """Model ids starting with prefix, either with or without the "provider/" part."""
+        prefix = (prefix or "").strip().lower()
+        if not prefix:
+            return []
+        index = self._current()
+        keys = index.short_ids if "/" not in prefix else []
+        matches = list(_prefix_matches(index.ids, prefix, limit))
+        for model_id in _prefix_matches(keys, prefix, limit):
+            if len(matches) >= limit:
+                break
+            if model_id not in matches:
+                matches.append(model_id)
+        return matches
+
+    def supports(self, model_id, modality):
+        """Whether model_id accepts modality ("image", "file", ...) as input; None if unknown."""
+        entry = self.get(model_id)
+        if entry is None:
+            return None
+        return modality in entry["input_modalities"]
+
+    def context_length(self, model_id):
+        entry = self.get(model_id)
+        return entry["context_length"] if entry else None
@@ -0,0 +1,86 @@
+import asyncio
+import time
+from dataclasses import dataclass, field
+
+import openrouter_client
+
+@dataclass
+class ModelRun:
+    """Progress and timing of one model's streamed answer during a fan-out."""
+    model: str
+    content: str = ""
+    error: str | None = None
+    started_at: float | None = None
+    first_token_at: float | None = None
+    finished_at: float | None = None
+    usage: dict = field(default_factory=dict)
+
+    @property
+    def done(self):
+        return self.finished_at is not None
+
+    @property
+    def ttft(self):
+        if self.first_token_at is None:
+            return None
+        return self.first_token_at - self.started_at
+
+    @property
+    def latency(self):
+        end = self.finished_at if self.done else time.perf_counter()
+        return end - self.started_at if self.started_at is not None else None
+
+    @property
+    def completion_tokens(self):
+        # Providers report usage on the final chunk; until then estimate ~4 characters per token.
+        return self.usage.get("completion_tokens") or len(self.content) // 4
+
+    @property
+    def tokens_per_second(self):
+        if self.first_token_at is None:
+            return None
+        end = self.finished_at if self.done else time.perf_counter()
+        generating = end - self.first_token_at
+        return self.completion_tokens / generating if generating > 0 else None
+
+async def _drive(run, api_key, payload, updates):
+    run.started_at = time.perf_counter()
+    try:
+        async for chunk in openrouter_client.async_stream_chat_completion(api_key, payload):
+            delta = openrouter_client.chunk_delta(chunk)
+            if chunk.get("usage"):
+                run.usage = chunk["usage"]
+            if delta:
+                if run.first_token_at is None:
+                    run.first_token_at = time.perf_counter()
+                run.content += delta
+                updates.put_nowait(run)
+    except Exception as e:
+        run.error = str(e)
+    finally:
+        run.finished_at = time.perf_counter()
+        updates.put_nowait(None)
+
+async def fan_out(api_key, payload, models):
+    """Stream the same payload to every model concurrently.
+
+    Yields the list of ModelRun objects each time one or more of them made progress,
+    coalescing bursts so a slow consumer only sees the latest state.
+    """
+    runs = [ModelRun(model) for model in models]
+    updates = asyncio.Queue()
+    tasks = [
+        asyncio.ensure_future(_drive(run, api_key, dict(payload, model=run.model, usage={"include": True}), updates))
+        for run in runs
+    ]
+    remaining = len(tasks)
+    try:
+        while remaining:
+            batch = [await updates.get()]
+            while not updates.empty():
+                batch.append(updates.get_nowait())
+            remaining -= batch.count(None)
+            yield runs
+    finally:
+        for task in tasks:
+            task.cancel()
@@ -0,0 +1,133 @@
+import json
+import logging
+import statistics
+import threading
+import time
+from collections import deque
+
+from fileutil import write_json_atomic
+
+STATS_VERSION = 1
+# Outcomes that count against a model. A 4xx is included: a model that rejects every
+# request (retired, no endpoint for these parameters) must not stay unmeasured, or route()
+# would keep exploring it. Cancellations say nothing about the model.
+ERROR_OUTCOMES = ("4xx", "5xx", "rate_limited", "timeout", "deadline", "network_error", "error")
+
+logger = logging.getLogger("NeuroPrime.model_stats")
+
+def _median(values):
+    values = [v for v in values if v is not None]
+    return statistics.median(values) if values else None
+
+class ModelStats:
+    """Rolling per-model performance measured from finished API calls, persisted as JSON.
+
+    Each model keeps its last `window` calls (dropping any older than max_age seconds):
+    time to first token and tokens/second for streamed calls, total seconds, whether
+    it failed, and the cost OpenRouter reported. route() picks among a session's
+    models using these numbers.
+    """
+
+    def __init__(self, path, window=100, max_age=6 * 3600.0, save_interval=30.0):
+        self.path = path
+        self.window = window
+        self.max_age = max_age
+        self.save_interval = save_interval
+        self._samples = {}
+        self._lock = threading.Lock()
+        self._saved_at = time.monotonic()
+        self._load()
+
+    def _load(self):
+        try:
+            with open(self.path, "r") as f:
+                data = json.load(f)
+            if data.get("version") != STATS_VERSION:
+                return
+            for model, samples in data.get("models", {}).items():
+                self._samples[model] = deque((tuple(s) for s in samples), maxlen=self.window)
+        except FileNotFoundError:
+            pass
+        except (OSError, ValueError, TypeError) as e:
+            logger.warning(f"Ignoring unreadable model stats {self.path}: {e}")
+
+    def save(self):
+        with self._lock:
+            data = {"version": STATS_VERSION, "models": {m: list(s) for m, s in self._samples.items()}}
+        try:
+            write_json_atomic(self.path, data)
+        except OSError as e:
+            logger.warning(f"Could not save model stats: {e}")
+
+    # --- Recording ---
+    def record(self, model, ttft=None, tokens_per_second=None, seconds=None, error=False, cost=None):
+        with self._lock:
+            samples = self._samples.get(model)
+            if samples is None:
+                samples = self._samples[model] = deque(maxlen=self.window)
+            samples.append((time.time(), ttft, tokens_per_second, seconds, bool(error), cost))
+            due = time.monotonic() - self._saved_at >= self.save_interval
+            if due:
+                self._saved_at = time.monotonic()
+        if due:
+            # Off the caller's thread: this runs on the event loop after every API call.
+            threading.Thread(target=self.save, name="model-stats-save", daemon=True).start()
+
+    def observe_call(self, result):
+        """openrouter_client call listener."""
+        if not result.model or result.outcome not in ("ok",) + ERROR_OUTCOMES:
+            return
+        usage = result.usage or {}
+        self.record(
+            result.model,
+            ttft=result.ttft,
+            tokens_per_second=result.tokens_per_second,
+            seconds=result.seconds,
+            error=result.outcome != "ok",
+            cost=usage.get("cost")
+        )
+
+    # --- Queries ---
+    def summary(self, model):
+        """Medians and rates over model's recent calls; samples is 0 when there are none."""
+        cutoff = time.time() - self.max_age
+        with self._lock:
+            samples = [s for s in self._samples.get(model, ()) if s[0] >= cutoff]
+        costs = [s[5] for s in samples if s[5] is not None]
+        return {
+            "model": model,
+            "samples": len(samples),
+            "ttft": _median(s[1] for s in samples),
+            "tokens_per_second": _median(s[2] for s in samples),
+            "seconds": _median(s[3] for s in samples if not s[4]),
+            "error_rate": sum(s[4] for s in samples) / len(samples) if samples else 0.0,
+            "cost": sum(costs) / len(costs) if costs else None,
+        }
+
+    @staticmethod
+    def expected_seconds(summary, reply_tokens):
+        """Estimated seconds for a reply_tokens-long answer; inf with no timing data."""
+        if summary["ttft"] is not None and summary["tokens_per_second"]:
+            return summary["ttft"] + reply_tokens / summary["tokens_per_second"]
+        if summary["seconds"] is not None:
+            return summary["seconds"]
+        return float("inf")
+
+    def route(self, candidates, accept=None, min_samples=3, max_error_rate=0.25, reply_tokens=300):
+        """The fastest healthy model among candidates that accept() allows, or None if none does.
+
+        Until every eligible model has min_samples recent calls, the least measured one is
+        chosen so the comparison rests on data. A model whose error rate is above
+        max_error_rate is skipped unless every eligible model is that unhealthy.
+        """
+        eligible = [model for model in candidates if accept is None or accept(model)]
+        if not eligible:
+            return None
+        summaries = {model: self.summary(model) for model in eligible}
+        unmeasured = [model for model in eligible if summaries[model]["samples"] < min_samples]
+        if unmeasured:
+            return min(unmeasured, key=lambda model: summaries[model]["samples"])
+        healthy = [model for model in eligible if summaries[model]["error_rate"] <= max_error_rate]
+        if not healthy:
+            return min(eligible, key=lambda model: summaries[model]["error_rate"])
+        return min(healthy, key=lambda model: self.expected_seconds(summaries[model], reply_tokens))
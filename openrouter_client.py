@@ -0,0 +1,445 @@
+import asyncio
+import atexit
+import json
+import logging
+import random
+import threading
+import time
+import weakref
+from contextlib import asynccontextmanager
+from dataclasses import dataclass
+
+import metrics
+import settings
+import startup
+from rate_limiter import RateLimiter, parse_retry_after
+
+# Loaded on first use so importing this module (e.g. from app.py) stays cheap.
+httpx = startup.lazy_import("httpx")
+
+OPENROUTER_API_URL = settings.OPENROUTER_BASE_URL.rstrip("/")
+CHAT_COMPLETIONS_PATH = "/chat/completions"
+MODELS_PATH = "/models"
+
+# Only "not accepted" answers are retried. A 502 or 504 can arrive after the provider has
+# started (and billed) a generation, so sending the POST again could pay for it twice.
+RETRYABLE_STATUS_CODES = {503}
+
+logger = logging.getLogger("NeuroPrime.openrouter")
+
+# One limiter per process, so every session and batch worker sharing a key is paced together.
+rate_limiter = RateLimiter(
+    key_rate=settings.RATE_LIMIT_KEY_RPS,
+    key_burst=settings.RATE_LIMIT_KEY_BURST,
+    model_rate=settings.RATE_LIMIT_MODEL_RPS,
+    model_rates=settings.RATE_LIMIT_MODEL_RATES,
+    model_burst=settings.RATE_LIMIT_MODEL_BURST,
+    initial_concurrency=settings.RATE_LIMIT_INITIAL_CONCURRENCY,
+    min_concurrency=settings.RATE_LIMIT_MIN_CONCURRENCY,
+    max_concurrency=settings.RATE_LIMIT_MAX_CONCURRENCY
+)
+
+_client = None
+_client_lock = threading.Lock()
+# httpx.AsyncClient is bound to the event loop that first uses it, so keep one per loop.
+_async_clients = weakref.WeakKeyDictionary()
+
+# --- Client Construction ---
+def retryable_exceptions():
+    """Connect-phase failures: the request was never sent, so sending it again cannot
+    double-bill or duplicate a completion. Errors after the request went out (read
+    timeouts, a connection dropped mid-response) are raised, not retried."""
+    return (
+        httpx.ConnectError,
+        httpx.ConnectTimeout,
+        httpx.PoolTimeout,
+    )
+
+def _http2_enabled():
+    if not settings.HTTP2:
+        return False
+    try:
+        import h2  # noqa: F401
+    except ImportError:
+        logger.warning("NEUROPRIME_HTTP2 is on but the h2 package is missing; using HTTP/1.1 (pip install httpx[http2])")
+        return False
+    return True
+
+def _timeout():
+    return httpx.Timeout(
+        connect=settings.HTTP_CONNECT_TIMEOUT,
+        read=settings.HTTP_READ_TIMEOUT,
+        write=settings.HTTP_WRITE_TIMEOUT,
+        pool=settings.HTTP_POOL_TIMEOUT,
+    )
+
+def _limits():
+    return httpx.Limits(
+        max_connections=settings.HTTP_MAX_CONNECTIONS,
+        max_keepalive_connections=settings.HTTP_MAX_KEEPALIVE_CONNECTIONS,
+        keepalive_expiry=settings.HTTP_KEEPALIVE_EXPIRY,
+    )
+
+def get_client():
+    """Return the process-wide pooled client, creating it on first use."""
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                http2 = _http2_enabled()
+                _client = httpx.Client(
+                    base_url=OPENROUTER_API_URL,
+                    http2=http2,
+                    timeout=_timeout(),
+                    limits=_limits(),
+                )
+                logger.info(f"OpenRouter client ready (http2={http2})")
+    return _client
+
+def close_client():
+    global _client
+    with _client_lock:
+        if _client is not None:
+            _client.close()
+            _client = None
+
+def get_async_client():
+    """Return the pooled async client for the running event loop, creating it on first use."""
+    loop = asyncio.get_running_loop()
+    client = _async_clients.get(loop)
+    if client is None:
+        http2 = _http2_enabled()
+        client = httpx.AsyncClient(
+            base_url=OPENROUTER_API_URL,
+            http2=http2,
+            timeout=_timeout(),
+            limits=_limits(),
+        )
+        _async_clients[loop] = client
+        logger.info(f"OpenRouter async client ready (http2={http2})")
+    return client
+
+async def aclose_async_client():
+    client = _async_clients.pop(asyncio.get_running_loop(), None)
+    if client is not None:
+        await client.aclose()
+
+atexit.register(close_client)
+
+# --- Deadlines ---
+class DeadlineExceeded(Exception):
+    """An LLM call ran past its wall-clock deadline; its connection has been closed."""
+
+def deadline_for(model):
+    """Seconds allowed for one call to model (longest matching prefix wins), or 0 for no limit."""
+    return settings.lookup_by_prefix(settings.REQUEST_MODEL_DEADLINES, model, settings.REQUEST_DEADLINE)
+
+class _Deadline:
+    """Wall-clock budget for one call, shared by all of its attempts.
+
+    Each attempt's httpx timeouts are capped at the time left, so a hung connection is
+    cut off at the deadline, and streams check it between lines to stop a slow trickle.
+    """
+
+    def __init__(self, model):
+        self.seconds = deadline_for(model)
+        self.expires = time.monotonic() + self.seconds if self.seconds > 0 else None
+
+    def remaining(self):
+        return self.expires - time.monotonic() if self.expires is not None else None
+
+    def check(self):
+        remaining = self.remaining()
+        if remaining is not None and remaining <= 0:
+            raise DeadlineExceeded(f"No complete response within the {self.seconds:g}s deadline")
+
+    def timeout(self):
+        remaining = self.remaining()
+        if remaining is None:
+            return _timeout()
+        self.check()
+        return httpx.Timeout(
+            connect=min(settings.HTTP_CONNECT_TIMEOUT, remaining),
+            read=min(settings.HTTP_READ_TIMEOUT, remaining),
+            write=min(settings.HTTP_WRITE_TIMEOUT, remaining),
+            pool=min(settings.HTTP_POOL_TIMEOUT, remaining),
+        )
+
+    def retry_delay(self, delay):
+        """delay, unless sleeping that long before retrying would already miss the deadline."""
+        remaining = self.remaining()
+        if remaining is not None and delay >= remaining:
+            raise DeadlineExceeded(f"No complete response within the {self.seconds:g}s deadline")
+        return delay
+
+# --- Requests ---
+def get_models(etag=None):
+    """GET the public model listing; returns (models, etag), or (None, etag) on 304 Not Modified."""
+    headers = {"If-None-Match": etag} if etag else {}
+    response = get_client().get(MODELS_PATH, headers=headers)
+    if response.status_code == 304:
+        return None, etag
+    response.raise_for_status()
+    return response.json().get("data", []), response.headers.get("ETag")
+
+def _auth_headers(api_key):
+    return {
+        "Authorization": f"Bearer {api_key}",
+        "Content-Type": "application/json"
+    }
+
+def _backoff_delay(attempt):
+    delay = min(settings.HTTP_RETRY_BACKOFF * (2 ** attempt), settings.HTTP_RETRY_BACKOFF_MAX)
+    return delay * random.uniform(0.5, 1.0)
+
+def _retry_after(response):
+    return parse_retry_after(response.headers.get("Retry-After")) if response.status_code == 429 else None
+
+def _should_retry(response, attempt):
+    if response.status_code == 429:
+        retry_after = _retry_after(response)
+        return attempt < settings.RATE_LIMIT_MAX_RETRIES and (retry_after or 0) <= settings.RATE_LIMIT_MAX_WAIT
+    return response.status_code in RETRYABLE_STATUS_CODES and attempt < settings.HTTP_MAX_RETRIES
+
+def _retry_delay(response, attempt):
+    # A 429 with Retry-After blocks the key and model in the limiter, so the next acquire does the waiting.
+    return 0.0 if _retry_after(response) is not None else _backoff_delay(attempt)
+
+def _release(permit, slot):
+    response = slot.get("response")
+    if response is None:
+        rate_limiter.release(permit)
+    else:
+        rate_limiter.release(permit, response.status_code, _retry_after(response))
+
+@asynccontextmanager
+async def _async_rate_limited(api_key, call, deadline):
+    """Hold a rate-limiter permit for one attempt; put the response in the yielded dict for feedback.
+
+    An httpx timeout raised once the deadline has passed surfaces as DeadlineExceeded.
+    """
+    try:
+        permit = await asyncio.wait_for(rate_limiter.acquire_async(api_key, call.model), deadline.remaining())
+    except asyncio.TimeoutError:
+        deadline.check()
+        raise
+    call.stage("rate_limit_wait", permit.waited)
+    slot = {}
+    try:
+        deadline.check()
+        yield slot
+    except httpx.TimeoutException:
+        deadline.check()
+        raise
+    finally:
+        _release(permit, slot)
+
+@dataclass
+class CallResult:
+    """What one finished API call measured; handed to every add_call_listener callback."""
+    operation: str
+    model: str
+    outcome: str
+    ttft: float = None  # streams only: request sent to first token
+    seconds: float = None  # request sent to last byte, for the attempt that answered
+    usage: dict = None
+
+    @property
+    def tokens_per_second(self):
+        tokens = (self.usage or {}).get("completion_tokens")
+        if not tokens or self.ttft is None or self.seconds is None or self.seconds <= self.ttft:
+            return None
+        return tokens / (self.seconds - self.ttft)
+
+_call_listeners = []
+
+def add_call_listener(listener):
+    """Call listener(CallResult) after every chat-completion call finishes, successful or not."""
+    _call_listeners.append(listener)
+
+class _CallMetrics:
+    """Stage timings, payload sizes and outcome of one API call, labelled by operation and model."""
+
+    def __init__(self, operation, payload):
+        self.operation = operation
+        self.model = payload.get("model")
+        started = time.perf_counter()
+        # Stage timings are held until finish() so they can be labelled with the call's outcome.
+        self._stages = []
+        self.body = json.dumps(payload).encode("utf-8")
+        self.stage("request_build", time.perf_counter() - started)
+        self.size("request", len(self.body))
+        self.parse_seconds = 0.0
+        self.ttft = None
+        self.seconds = None
+        self.usage = None
+
+    def stage(self, stage, seconds):
+        self._stages.append((stage, seconds))
+        if stage == "first_token":
+            self.ttft = seconds
+        elif stage == "network":
+            self.seconds = seconds
+
+    def size(self, direction, num_bytes):
+        metrics.PAYLOAD_BYTES.observe(num_bytes, operation=self.operation, model=self.model or "unknown",
+                                      direction=direction)
+
+    def decode(self, data):
+        started = time.perf_counter()
+        try:
+            decoded = json.loads(data)
+        finally:
+            self.parse_seconds += time.perf_counter() - started
+        # A full response, or the last chunk of a stream, carries the token usage.
+        if isinstance(decoded, dict) and decoded.get("usage"):
+            self.usage = decoded["usage"]
+            metrics.observe_usage(self.operation, self.model, self.usage)
+        return decoded
+
+    def finish(self, error):
+        if self.parse_seconds:
+            self.stage("json_parse", self.parse_seconds)
+        outcome = metrics.outcome_of(error)
+        for stage, seconds in self._stages:
+            metrics.observe_stage(self.operation, self.model, stage, seconds, outcome)
+        metrics.REQUESTS_TOTAL.inc(operation=self.operation, model=self.model or "unknown", outcome=outcome)
+        if _call_listeners:
+            result = CallResult(self.operation, self.model, outcome, self.ttft, self.seconds, self.usage)
+            for listener in _call_listeners:
+                try:
+                    listener(result)
+                except Exception as e:
+                    logger.warning(f"Call listener failed: {e!r}")
+
+_SSE_DONE = object()
+
+def _parse_sse_line(line, call):
+    """Return the decoded event on an SSE data line, _SSE_DONE at the end, otherwise None."""
+    # Skips event separators and ": OPENROUTER PROCESSING" keep-alive comments.
+    if not line.startswith("data:"):
+        return None
+    data = line[len("data:"):].strip()
+    if data == "[DONE]":
+        return _SSE_DONE
+    return call.decode(data)
+
+def chunk_delta(chunk):
+    """Return the text delta carried by a streamed chunk, raising if the chunk reports an error."""
+    if "error" in chunk:
+        # Usually {"message": ..., "code": ...}, but some providers send a bare string.
+        error = chunk["error"]
+        raise RuntimeError(error.get("message", error) if isinstance(error, dict) else error)
+    if chunk.get("choices"):
+        return chunk["choices"][0].get("delta", {}).get("content") or ""
+    return ""
+
+async def async_post_chat_completion(api_key, payload, operation="chat"):
+    """POST a chat completion through the shared pool and return the decoded JSON body.
+
+    Every attempt is paced by the shared rate limiter. Connect failures, 503s and 429s
+    are retried (429s after their Retry-After); any other HTTP error is raised as
+    httpx.HTTPStatusError. The whole call, retries included, must finish within
+    deadline_for(model) or DeadlineExceeded is raised.
+    """
+    call = _CallMetrics(operation, payload)
+    deadline = _Deadline(call.model)
+    client = get_async_client()
+    error = None
+    try:
+        attempt = 0
+        while True:
+            async with _async_rate_limited(api_key, call, deadline) as slot:
+                request = client.build_request(
+                    "POST", CHAT_COMPLETIONS_PATH, headers=_auth_headers(api_key), content=call.body, timeout=deadline.timeout()
+                )
+                sent = time.perf_counter()
+                try:
+                    response = await client.send(request, stream=True)
+                except retryable_exceptions() as e:
+                    if attempt >= settings.HTTP_MAX_RETRIES:
+                        raise
+                    logger.warning(f"OpenRouter request failed ({e!r}), retrying")
+                    delay = _backoff_delay(attempt)
+                else:
+                    slot["response"] = response
+                    try:
+                        call.stage("ttfb", time.perf_counter() - sent)
+                        content = await response.aread()
+                        call.stage("network", time.perf_counter() - sent)
+                    finally:
+                        await response.aclose()
+                    if not _should_retry(response, attempt):
+                        response.raise_for_status()
+                        call.size("response", len(content))
+                        return call.decode(content)
+                    logger.warning(f"OpenRouter returned {response.status_code}, retrying")
+                    delay = _retry_delay(response, attempt)
+            await asyncio.sleep(deadline.retry_delay(delay))
+            attempt += 1
+    except BaseException as e:
+        error = e
+        raise
+    finally:
+        call.finish(error)
+
+async def async_stream_chat_completion(api_key, payload, operation="chat"):
+    """Stream a chat completion over SSE, yielding each decoded chunk.
+
+    Retries follow async_post_chat_completion, but only until the first chunk arrives;
+    a stream that breaks midway is raised to the caller. The rate-limiter permit is
+    held until the stream ends, so concurrency counts open streams.
+    """
+    call = _CallMetrics(operation, dict(payload, stream=True))
+    deadline = _Deadline(call.model)
+    client = get_async_client()
+    error = None
+    started = False
+    received = 0
+    try:
+        attempt = 0
+        while True:
+            async with _async_rate_limited(api_key, call, deadline) as slot:
+                request = client.build_request(
+                    "POST", CHAT_COMPLETIONS_PATH, headers=_auth_headers(api_key), content=call.body, timeout=deadline.timeout()
+                )
+                sent = time.perf_counter()
+                try:
+                    response = await client.send(request, stream=True)
+                    slot["response"] = response
+                    try:
+                        call.stage("ttfb", time.perf_counter() - sent)
+                        if not _should_retry(response, attempt):
+                            if response.is_error:
+                                await response.aread()
+                                response.raise_for_status()
+                            async for line in response.aiter_lines():
+                                received += len(line) + 1
+                                deadline.check()
+                                event = _parse_sse_line(line, call)
+                                if event is _SSE_DONE:
+                                    break
+                                if event is not None:
+                                    if not started:
+                                        started = True
+                                        call.stage("first_token", time.perf_counter() - sent)
+                                    yield event
+                            call.stage("network", time.perf_counter() - sent)
+                            call.size("response", received)
+                            return
+                        logger.warning(f"OpenRouter returned {response.status_code}, retrying")
+                        delay = _retry_delay(response, attempt)
+                    finally:
+                        await response.aclose()
+                except retryable_exceptions() as e:
+                    if started or attempt >= settings.HTTP_MAX_RETRIES:
+                        raise
+                    logger.warning(f"OpenRouter stream failed ({e!r}), retrying")
+                    delay = _backoff_delay(attempt)
+            await asyncio.sleep(deadline.retry_delay(delay))
+            attempt += 1
+    except BaseException as e:
+        error = e
+        raise
+    finally:
+        call.finish(error)
@@ -0,0 +1,67 @@
+import settings
+
+# Turns the context manager's message list into the chat-completions "messages" array,
+# laid out so that everything up to the newest user turn is byte-identical from one turn
+# to the next. Providers with prompt caching (automatic for OpenAI and DeepSeek, opt-in
+# through cache_control breakpoints for Anthropic and Gemini) then bill and process that
+# prefix as a cache read instead of recomputing it.
+#
+# Layout: system prompt [+ rolling summary], earlier turns, then the new user message,
+# which carries everything that changes per turn as content parts after the last
+# breakpoint: the hybrid prompt prefix as a leading text part, the user's text, then the
+# image. The prefix is not sent as a system message: Anthropic and Gemini take only one
+# system prompt, so a later system message would be folded into it and break the cache.
+#
+# Breakpoints go after the static system prompt, after the rolling summary and after the
+# previous turn. The summary only changes on the turns where the context manager folds
+# more history into it; on those turns the system prompt is still a cache hit.
+
+CACHE_CONTROL = {"type": "ephemeral"}
+
+def supports_cache_control(model):
+    """Whether model takes explicit cache_control breakpoints (others cache automatically or not at all)."""
+    return bool(model) and settings.PROMPT_CACHE_BREAKPOINTS and any(
+        model.startswith(prefix) for prefix in settings.PROMPT_CACHE_MODELS
+    )
+
+def _as_parts(message, breakpoint=False):
+    """message with its text as a content-part list, optionally ending in a cache breakpoint."""
+    part = {"type": "text", "text": message["content"]}
+    if breakpoint:
+        part["cache_control"] = CACHE_CONTROL
+    return {"role": message["role"], "content": [part]}
+
+def build_messages(messages, hybrid_prompt=None, image_data=None, cache_breakpoints=False):
+    """Format messages (leading system messages, history, new user turn last) for the API.
+
+    With cache_breakpoints, marks the end of the first system message, the end of the
+    leading system messages and the end of the previous turn, the points the next
+    request will share with this one. Every
+    earlier message is then sent as a content-part list, so a message renders the same
+    whether or not it carries the breakpoint this turn. The hybrid prompt becomes the
+    first text part of the new user message.
+    """
+    formatted = [{"role": m["role"], "content": m["content"]} for m in messages]
+    last = formatted.pop() if formatted and formatted[-1]["role"] == "user" else None
+    if cache_breakpoints and formatted:
+        leading = 0
+        while leading < len(formatted) and formatted[leading]["role"] == "system":
+            leading += 1
+        marks = {0, leading - 1, len(formatted) - 1}
+        formatted = [_as_parts(m, i in marks and bool(m["content"])) for i, m in enumerate(formatted)]
+    if last is not None:
+        if cache_breakpoints or image_data or hybrid_prompt:
+            last = _as_parts(last)
+        if hybrid_prompt:
+            last["content"].insert(0, {"type": "text", "text": hybrid_prompt})
+        if image_data:
+            last["content"].append({"type": "image_url", "image_url": {"url": f"data:image/jpeg;base64,{image_data}"}})
+        formatted.append(last)
+    elif hybrid_prompt:
+        formatted.append({"role": "user", "content": hybrid_prompt})
+    return formatted
+
+def cached_tokens(usage):
+    """Prompt tokens the provider served from its cache, from a response's usage block."""
+    details = (usage or {}).get("prompt_tokens_details") or {}
+    return details.get("cached_tokens") or 0
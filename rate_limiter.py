@@ -0,0 +1,215 @@
+import asyncio
+import hashlib
+import threading
+import time
+from collections import deque
+from email.utils import parsedate_to_datetime
+
+import settings
+
+def parse_retry_after(value):
+    """Seconds to wait from a Retry-After header (delta-seconds or HTTP date), or None."""
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+class TokenBucket:
+    """Classic token bucket. reserve() takes a token now and returns how long to wait for it.
+
+    Tokens may go negative, so callers that arrive during a burst are spaced out in
+    arrival order instead of all retrying at once.
+    """
+
+    def __init__(self, rate, burst):
+        self.rate = rate
+        self.burst = max(burst, 1)
+        self._tokens = float(self.burst)
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def reserve(self):
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            self._tokens -= 1
+            return max(0.0, -self._tokens / self.rate)
+
+class AdaptiveConcurrency:
+    """AIMD limit on requests in flight: +1 per window of successes, halved on a 429.
+
+    Only a 429 for a request started after the last decrease cuts the limit again, so a
+    burst of rejections from one overloaded moment counts once. Waiters are served in
+    order and can be threads or asyncio tasks on any loop.
+    """
+
+    def __init__(self, initial=64, minimum=1, maximum=256, decrease_factor=0.5):
+        self.minimum = minimum
+        self.maximum = maximum
+        self.decrease_factor = decrease_factor
+        self.limit = float(min(max(initial, minimum), maximum))
+        self.in_flight = 0
+        self._epoch = 0
+        self._waiters = deque()
+        self._lock = threading.Lock()
+
+    def _take(self):
+        if not self._waiters and self.in_flight < int(self.limit):
+            self.in_flight += 1
+            return True
+        return False
+
+    def acquire(self):
+        with self._lock:
+            if self._take():
+                return self._epoch
+            event = threading.Event()
+            self._waiters.append(event)
+        event.wait()
+        return self._epoch
+
+    async def acquire_async(self):
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            if self._take():
+                return self._epoch
+            future = loop.create_future()
+            waiter = (loop, future)
+            self._waiters.append(waiter)
+        try:
+            await future
+        except asyncio.CancelledError:
+            with self._lock:
+                if waiter in self._waiters:
+                    self._waiters.remove(waiter)
+                    raise
+            # The slot was handed over just as we were cancelled; give it back.
+            self.release(None, rate_limited=False, success=False)
+            raise
+        return self._epoch
+
+    def release(self, epoch, rate_limited, success):
+        with self._lock:
+            self.in_flight -= 1
+            if rate_limited and epoch == self._epoch:
+                self.limit = max(self.minimum, self.limit * self.decrease_factor)
+                self._epoch += 1
+            elif success:
+                self.limit = min(self.maximum, self.limit + 1 / self.limit)
+            while self._waiters and self.in_flight < int(self.limit):
+                waiter = self._waiters.popleft()
+                if isinstance(waiter, threading.Event):
+                    waiter.set()
+                else:
+                    loop, future = waiter
+                    try:
+                        loop.call_soon_threadsafe(_resolve, future)
+                    except RuntimeError:
+                        continue  # the waiter's event loop has closed
+                self.in_flight += 1
+
+def _resolve(future):
+    if not future.done():
+        future.set_result(None)
+
+class Permit:
+    __slots__ = ("key_id", "model", "epoch", "waited")
+
+    def __init__(self, key_id, model, epoch, waited):
+        self.key_id = key_id
+        self.model = model
+        self.epoch = epoch
+        self.waited = waited
+
+class RateLimiter:
+    """Shared pacing for every call made with the same OpenRouter key.
+
+    A request first waits out any Retry-After the server sent for its key and model,
+    then takes a token from the per-key and per-model buckets, then a slot under the
+    key's adaptive concurrency limit. Bursts therefore queue instead of failing.
+    """
+
+    def __init__(self, key_rate=0.0, key_burst=20, model_rate=0.0, model_rates=None, model_burst=10,
+                 initial_concurrency=64, min_concurrency=1, max_concurrency=256):
+        self.key_rate = key_rate
+        self.key_burst = key_burst
+        self.model_rate = model_rate
+        self.model_rates = model_rates or {}
+        self.model_burst = model_burst
+        self.initial_concurrency = initial_concurrency
+        self.min_concurrency = min_concurrency
+        self.max_concurrency = max_concurrency
+        self._buckets = {}
+        self._concurrency = {}
+        self._blocked_until = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def key_id(api_key):
+        return hashlib.sha256(api_key.encode("utf-8")).hexdigest()[:16]
+
+    def rate_for(self, model):
+        return settings.lookup_by_prefix(self.model_rates, model, self.model_rate)
+
+    def _bucket(self, scope, rate, burst):
+        if rate <= 0:
+            return None
+        with self._lock:
+            bucket = self._buckets.get(scope)
+            if bucket is None:
+                bucket = self._buckets[scope] = TokenBucket(rate, burst)
+            return bucket
+
+    def concurrency_for(self, key_id):
+        with self._lock:
+            limiter = self._concurrency.get(key_id)
+            if limiter is None:
+                limiter = self._concurrency[key_id] = AdaptiveConcurrency(
+                    self.initial_concurrency, self.min_concurrency, self.max_concurrency
+                )
+            return limiter
+
+    def _pacing_delay(self, key_id, model):
+        """Seconds to wait before sending: Retry-After blocks first, then both token buckets."""
+        delay = max(0.0, self._blocked_until.get((key_id, model), 0.0) - time.monotonic())
+        for bucket in (self._bucket(("key", key_id), self.key_rate, self.key_burst),
+                       self._bucket(("model", key_id, model), self.rate_for(model), self.model_burst)):
+            if bucket is not None:
+                delay = max(delay, bucket.reserve())
+        return delay
+
+    def acquire(self, api_key, model):
+        started = time.monotonic()
+        key_id = self.key_id(api_key)
+        delay = self._pacing_delay(key_id, model)
+        if delay:
+            time.sleep(delay)
+        epoch = self.concurrency_for(key_id).acquire()
+        return Permit(key_id, model, epoch, time.monotonic() - started)
+
+    async def acquire_async(self, api_key, model):
+        started = time.monotonic()
+        key_id = self.key_id(api_key)
+        delay = self._pacing_delay(key_id, model)
+        if delay:
+            await asyncio.sleep(delay)
+        epoch = await self.concurrency_for(key_id).acquire_async()
+        return Permit(key_id, model, epoch, time.monotonic() - started)
+
+    def release(self, permit, status_code=None, retry_after=None):
+        """Return the slot; a 429 shrinks the key's concurrency and honours Retry-After for its model."""
+        rate_limited = status_code == 429
+        if rate_limited and retry_after:
+            until = time.monotonic() + retry_after
+            with self._lock:
+                scope = (permit.key_id, permit.model)
+                self._blocked_until[scope] = max(self._blocked_until.get(scope, 0.0), until)
+        success = status_code is not None and status_code < 400
+        self.concurrency_for(permit.key_id).release(permit.epoch, rate_limited, success)
@@ -0,0 +1,135 @@
+import hashlib
+import json
+import logging
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+
+from fileutil import write_json_atomic
+
+CACHE_VERSION = 1
+
+logger = logging.getLogger("NeuroPrime.reasoning_cache")
+
+def normalize_query(query):
+    """Lowercase, drop punctuation and collapse whitespace so trivially different queries share a key."""
+    return " ".join(re.findall(r"\w+", query.lower()))
+
+def shingles(text, size=3):
+    """Character n-gram shingles of normalized text, used for near-duplicate matching."""
+    if len(text) <= size:
+        return frozenset([text]) if text else frozenset()
+    return frozenset(text[i:i + size] for i in range(len(text) - size + 1))
+
+def jaccard(a, b):
+    if not a or not b:
+        return 0.0
+    return len(a & b) / len(a | b)
+
+class ReasoningCache:
+    """LRU cache with TTL for reasoning-framework selections, persisted as JSON on disk.
+
+    Entries are keyed on the normalized query plus the model. With a non-zero
+    similarity_threshold, a miss falls back to the most similar cached query for
+    the same model, scored by Jaccard similarity of character shingles.
+    """
+
+    def __init__(self, path, max_entries=512, ttl=7 * 24 * 3600, similarity_threshold=0.0):
+        self.path = path
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.similarity_threshold = similarity_threshold
+        self._entries = OrderedDict()
+        self._shingles = {}
+        self._lock = threading.Lock()
+        self._load()
+
+    @property
+    def enabled(self):
+        return self.max_entries > 0
+
+    def _key(self, normalized_query, model):
+        return hashlib.sha256(f"{model}\n{normalized_query}".encode("utf-8")).hexdigest()
+
+    def _expired(self, entry, now):
+        return self.ttl > 0 and now - entry["created_at"] > self.ttl
+
+    def _load(self):
+        if not self.enabled or not os.path.exists(self.path):
+            return
+        try:
+            with open(self.path, "r") as f:
+                data = json.load(f)
+            if data.get("version") != CACHE_VERSION:
+                return
+            now = time.time()
+            for entry in data.get("entries", [])[-self.max_entries:]:
+                if not self._expired(entry, now):
+                    self._entries[entry["key"]] = entry
+                    self._shingles[entry["key"]] = shingles(entry["query"])
+        except Exception as e:
+            logger.warning(f"Ignoring unreadable reasoning cache {self.path}: {e}")
+
+    def _save(self):
+        write_json_atomic(self.path, {"version": CACHE_VERSION, "entries": list(self._entries.values())})
+
+    def _drop(self, key):
+        self._entries.pop(key, None)
+        self._shingles.pop(key, None)
+
+    def _nearest(self, normalized_query, model, now):
+        query_shingles = shingles(normalized_query)
+        best_key, best_score = None, self.similarity_threshold
+        for key, entry in self._entries.items():
+            if entry["model"] != model or self._expired(entry, now):
+                continue
+            score = jaccard(query_shingles, self._shingles[key])
+            if score >= best_score:
+                best_key, best_score = key, score
+        return best_key
+
+    def get(self, query, model):
+        """Return (result, hybrid_prompt) for a cached query, or None on a miss."""
+        if not self.enabled:
+            return None
+        normalized = normalize_query(query)
+        now = time.time()
+        with self._lock:
+            key = self._key(normalized, model)
+            entry = self._entries.get(key)
+            if entry is not None and self._expired(entry, now):
+                self._drop(key)
+                entry = None
+            if entry is None and self.similarity_threshold > 0:
+                key = self._nearest(normalized, model, now)
+                entry = self._entries.get(key) if key else None
+            if entry is None:
+                return None
+            self._entries.move_to_end(key)
+            return entry["result"], entry["hybrid_prompt"]
+
+    def put(self, query, model, result, hybrid_prompt):
+        if not self.enabled:
+            return
+        normalized = normalize_query(query)
+        with self._lock:
+            key = self._key(normalized, model)
+            self._entries[key] = {
+                "key": key,
+                "model": model,
+                "query": normalized,
+                "result": result,
+                "hybrid_prompt": hybrid_prompt,
+                "created_at": time.time(),
+            }
+            self._entries.move_to_end(key)
+            self._shingles[key] = shingles(normalized)
+            while len(self._entries) > self.max_entries:
+                oldest = next(iter(self._entries))
+                self._drop(oldest)
+            try:
+                self._save()
+            except OSError as e:
+                logger.warning(f"Could not persist reasoning cache: {e}")
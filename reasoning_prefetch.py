@@ -0,0 +1,75 @@
+import asyncio
+import logging
+
+from reasoning_cache import normalize_query
+
+logger = logging.getLogger("NeuroPrime.prefetch")
+
+class _Speculation:
+    def __init__(self, key):
+        self.key = key
+        self.task = None
+        self.fetching = False
+
+class ReasoningPrefetcher:
+    """Speculatively fetches the reasoning framework for whatever a session is typing.
+
+    Each session keeps at most one speculation alive: a new draft cancels the previous
+    one, and every speculation waits out a debounce delay before calling fetch. Results
+    land in the reasoning cache through fetch, so a later submit for the same text is
+    either a cache hit or joins the request that is already in flight.
+    """
+
+    def __init__(self, fetch, debounce=0.6):
+        self._fetch = fetch
+        self.debounce = debounce
+        self._speculations = {}
+
+    def _key(self, query, model):
+        return normalize_query(query), model
+
+    async def _run(self, speculation, query, api_key, model):
+        await asyncio.sleep(self.debounce)
+        speculation.fetching = True
+        return await self._fetch(query, api_key, model)
+
+    def _forget(self, session_id, speculation):
+        if self._speculations.get(session_id) is speculation:
+            del self._speculations[session_id]
+
+    def discard(self, session_id):
+        speculation = self._speculations.pop(session_id, None)
+        if speculation is not None:
+            speculation.task.cancel()
+
+    async def _join(self, speculation):
+        try:
+            return await asyncio.shield(speculation.task)
+        except asyncio.CancelledError:
+            if speculation.task.cancelled():
+                return None
+            raise
+
+    async def speculate(self, session_id, query, api_key, model):
+        """Start (or join) the speculation for query; returns None if a newer draft superseded it."""
+        key = self._key(query, model)
+        current = self._speculations.get(session_id)
+        if current is not None and current.key == key:
+            return await self._join(current)
+        self.discard(session_id)
+        speculation = _Speculation(key)
+        speculation.task = asyncio.ensure_future(self._run(speculation, query, api_key, model))
+        speculation.task.add_done_callback(lambda _: self._forget(session_id, speculation))
+        self._speculations[session_id] = speculation
+        return await self._join(speculation)
+
+    async def result_for(self, session_id, query, api_key, model):
+        """Return (result, hybrid_prompt) for query, reusing a matching in-flight speculation."""
+        current = self._speculations.get(session_id)
+        if current is not None and current.key == self._key(query, model) and current.fetching:
+            result = await self._join(current)
+            if result is not None:
+                return result
+        # Nothing useful in flight (or still debouncing): fetch now, skipping the debounce.
+        self.discard(session_id)
+        return await self._fetch(query, api_key, model)
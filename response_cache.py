@@ -0,0 +1,128 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+
+import metrics
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS responses (
+    key TEXT PRIMARY KEY,
+    model TEXT,
+    content TEXT NOT NULL,
+    size INTEGER NOT NULL,
+    created_at REAL NOT NULL,
+    last_used REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS responses_by_last_use ON responses(last_used);
+"""
+
+# Transport-only fields that do not change what the model returns.
+IGNORED_FIELDS = ("stream", "stream_options", "usage")
+
+def is_deterministic(payload):
+    """True when the request pins sampling: temperature 0, top_k 1 or an explicit seed."""
+    return payload.get("temperature") == 0 or payload.get("top_k") == 1 or payload.get("seed") is not None
+
+def payload_key(payload):
+    canonical = {k: v for k, v in payload.items() if k not in IGNORED_FIELDS}
+    data = json.dumps(canonical, sort_keys=True, separators=(",", ":"), ensure_ascii=False)
+    return hashlib.sha256(data.encode("utf-8")).hexdigest()
+
+class ResponseCache:
+    """Disk-backed cache of assistant replies keyed by a canonical hash of the request payload.
+
+    Only deterministic payloads are looked up or stored; anything sampled is counted as a
+    bypass. Total content size is bounded by max_bytes, evicting least recently used
+    entries first. Connections are per thread; call from worker threads in async code.
+    """
+
+    def __init__(self, path, max_bytes=64 * 2**20, enabled=True):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.enabled = enabled and max_bytes > 0
+        self._local = threading.local()
+        self._size_lock = threading.Lock()
+        self._total_bytes = None
+
+    def _connect(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            conn = sqlite3.connect(self.path, timeout=30)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.executescript(SCHEMA)
+            self._local.conn = conn
+        return conn
+
+    def _applies(self, payload):
+        if not self.enabled:
+            return False
+        if not is_deterministic(payload):
+            metrics.RESPONSE_CACHE_TOTAL.inc(result="bypass")
+            return False
+        return True
+
+    def get(self, payload):
+        """Return the cached reply for payload, or None."""
+        if not self._applies(payload):
+            return None
+        key = payload_key(payload)
+        with self._connect() as conn:
+            row = conn.execute("SELECT content FROM responses WHERE key = ?", (key,)).fetchone()
+            if row is not None:
+                conn.execute("UPDATE responses SET last_used = ? WHERE key = ?", (time.time(), key))
+        metrics.RESPONSE_CACHE_TOTAL.inc(result="hit" if row is not None else "miss")
+        return row[0] if row is not None else None
+
+    def put(self, payload, content):
+        if not self.enabled or not content or not is_deterministic(payload):
+            return
+        size = len(content.encode("utf-8"))
+        if size > self.max_bytes:
+            return
+        key = payload_key(payload)
+        now = time.time()
+        with self._connect() as conn:
+            old = conn.execute("SELECT size FROM responses WHERE key = ?", (key,)).fetchone()
+            conn.execute(
+                "INSERT OR REPLACE INTO responses (key, model, content, size, created_at, last_used) VALUES (?, ?, ?, ?, ?, ?)",
+                (key, payload.get("model"), content, size, now, now)
+            )
+        self._grow(size - (old[0] if old else 0))
+
+    def _grow(self, delta):
+        with self._size_lock:
+            conn = self._connect()
+            if self._total_bytes is None:
+                self._total_bytes = conn.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+            else:
+                self._total_bytes += delta
+            while self._total_bytes > self.max_bytes:
+                with conn:
+                    rows = conn.execute("SELECT key, size FROM responses ORDER BY last_used LIMIT 64").fetchall()
+                    if not rows:
+                        self._total_bytes = 0
+                        break
+                    freed = evicted = 0
+                    for key, size in rows:
+                        conn.execute("DELETE FROM responses WHERE key = ?", (key,))
+                        freed += size
+                        evicted += 1
+                        if self._total_bytes - freed <= self.max_bytes:
+                            break
+                    self._total_bytes -= freed
+                metrics.RESPONSE_CACHE_EVICTIONS.inc(evicted)
+
+    def stats(self):
+        with self._connect() as conn:
+            entries, total = conn.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM responses").fetchone()
+        return {"entries": entries, "bytes": total, "max_bytes": self.max_bytes}
+
+    def clear(self):
+        with self._size_lock, self._connect() as conn:
+            conn.execute("DELETE FROM responses")
+            self._total_bytes = 0
@@ -0,0 +1,40 @@
+class SessionConfig:
+    """Per-session view of the user-editable settings (API key and model list).
+
+    A session's own changes are a small overrides dict kept in gr.State and layered over
+    the shared ConfigStore. In single-user mode every session is the same person, so
+    writes go straight through to the store and persist as before. In multi-user mode the
+    store is read-only shared defaults: changes stay in the session and never reach
+    other users or the disk. Reads never lock; writes return a new overrides dict
+    instead of mutating the old one.
+    """
+
+    def __init__(self, store, multi_user=False):
+        self.store = store
+        self.multi_user = multi_user
+
+    def get(self, overrides, key, default=None):
+        if overrides and key in overrides:
+            return overrides[key]
+        if key == "api_key" and self.multi_user:
+            # The saved key belongs to whoever runs the server; never hand it to a browser.
+            return default
+        return self.store.get(key, default)
+
+    def update(self, overrides, **changes):
+        """Apply changes and return the session's new overrides."""
+        if not self.multi_user:
+            self.store.update(**changes)
+            return overrides
+        return {**(overrides or {}), **changes}
+
+    def edit_models(self, overrides, edit):
+        """Call edit(models) on a private copy of the model list; return (overrides, models)."""
+        if not self.multi_user:
+            with self.store.edit() as draft:
+                edit(draft["models"])
+                models = draft["models"]
+            return overrides, models
+        models = list(self.get(overrides, "models"))
+        edit(models)
+        return {**(overrides or {}), "models": models}, models
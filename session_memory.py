@@ -0,0 +1,386 @@
+import hashlib
+import json
+import logging
+import os
+import shutil
+import threading
+import time
+from contextlib import contextmanager
+
+logger = logging.getLogger("NeuroPrime.session_memory")
+
+BLOB_PREFIX = "spill:"
+# Rough per-message cost on top of the text (dict, keys, list slot).
+MESSAGE_OVERHEAD_BYTES = 200
+
+def history_bytes(history):
+    return sum(len(str(m.get("content", ""))) + MESSAGE_OVERHEAD_BYTES for m in history)
+
+class _Session:
+    __slots__ = ("history", "messages", "history_size", "history_spilled", "blob", "blob_size", "blob_resident",
+                 "last_active", "in_use", "version")
+
+    def __init__(self):
+        self.history = None  # the very list object held in the session's gr.State
+        self.messages = 0
+        self.history_size = 0
+        self.history_spilled = False
+        self.blob = None  # (handle, data or None when spilled)
+        self.blob_size = 0
+        self.blob_resident = False
+        self.last_active = time.monotonic()
+        self.in_use = 0
+        self.version = 0  # bumped by every change, so a spill written meanwhile can tell it is stale
+
+    @property
+    def resident_bytes(self):
+        history = 0 if self.history_spilled else self.history_size
+        return history + (self.blob_size if self.blob_resident else 0)
+
+def _unlink(path):
+    if path is None:
+        return
+    try:
+        os.unlink(path)
+    except OSError:
+        pass
+
+class SessionMemory:
+    """Keeps the large per-session state within a process-wide memory budget.
+
+    Large strings (encoded images) are held here and gr.State keeps only a short
+    "spill:<hash>" handle; resolve() turns it back into the data. Chat histories stay in
+    gr.State, but this registry holds the same list object so it can spill it: the list
+    is written to disk and emptied in place, then refilled by use() the next time a
+    handler touches that session. Sessions idle longer than idle_ttl are spilled, and the
+    least recently active ones are spilled whenever the total resident size goes over
+    budget_bytes. A session is never spilled while a handler is using it.
+
+    Spilling happens on the sweeper thread started by start(); handlers only flag that
+    the budget is exceeded, so they never wait on spill writes. Files are written outside
+    the lock, and a spill is dropped if its session changed while it was being written.
+
+    Spill files go under spill_dir/<pid>, since they only mean something to the process
+    that wrote them; other processes sharing the app data directory never touch them.
+    """
+
+    def __init__(self, spill_dir, budget_bytes=256 * 2**20, idle_ttl=900.0):
+        self.root_dir = spill_dir
+        self.spill_dir = os.path.join(spill_dir, str(os.getpid()))
+        self.budget_bytes = budget_bytes
+        self.idle_ttl = idle_ttl
+        self._sessions = {}
+        self._lock = threading.Lock()
+        self._sweeper = None
+        self._wake = threading.Event()
+
+    def _session(self, session_id):
+        session = self._sessions.get(session_id)
+        if session is None:
+            session = self._sessions[session_id] = _Session()
+        return session
+
+    def _path(self, session_id, name):
+        return os.path.join(self.spill_dir, session_id, name)
+
+    def _blob_path(self, session_id, handle):
+        return self._path(session_id, handle[len(BLOB_PREFIX):])
+
+    # --- Blobs ---
+    def store_blob(self, session_id, data):
+        """Keep data for session_id and return the handle to put in gr.State (replaces its previous blob)."""
+        if session_id is None or data is None:
+            return data
+        handle = BLOB_PREFIX + hashlib.sha256(data.encode("utf-8")).hexdigest()[:32]
+        with self._lock:
+            session = self._session(session_id)
+            stale = self._drop_blob(session_id, session)
+            session.blob = (handle, data)
+            session.blob_size = len(data)
+            session.blob_resident = True
+            session.last_active = time.monotonic()
+        if stale != self._blob_path(session_id, handle):
+            _unlink(stale)
+        self.enforce_budget()
+        return handle
+
+    def resolve(self, session_id, value):
+        """The data behind a handle, reloading it from disk if it was spilled; other values pass through."""
+        if not isinstance(value, str) or not value.startswith(BLOB_PREFIX):
+            return value
+        with self._lock:
+            session = self._sessions.get(session_id)
+            if session is None or session.blob is None or session.blob[0] != value:
+                logger.warning("Session image is no longer available; it was probably evicted")
+                return None
+            session.last_active = time.monotonic()
+            data = session.blob[1]
+            if data is not None:
+                return data
+        try:
+            with open(self._blob_path(session_id, value), "r") as f:
+                data = f.read()
+        except OSError as e:
+            logger.warning(f"Dropping spilled session image: {e}")
+            with self._lock:
+                if session.blob is not None and session.blob[0] == value:
+                    self._drop_blob(session_id, session)
+            return None
+        with self._lock:
+            if session.blob is not None and session.blob[0] == value:
+                session.blob = (value, data)
+                session.blob_resident = True
+                session.version += 1
+        return data
+
+    def release_blob(self, session_id):
+        with self._lock:
+            session = self._sessions.get(session_id)
+            stale = self._drop_blob(session_id, session) if session is not None else None
+        _unlink(stale)
+
+    def _drop_blob(self, session_id, session):
+        """Forget session's blob; returns its spill path for the caller to unlink outside the lock."""
+        # A blob reloaded after a spill still has its file on disk.
+        stale = self._blob_path(session_id, session.blob[0]) if session.blob is not None else None
+        session.blob = None
+        session.blob_size = 0
+        session.blob_resident = False
+        session.version += 1
+        return stale
+
+    # --- Histories ---
+    @contextmanager
+    def use(self, session_id, history=None):
+        """Mark session_id busy for a handler: reload its spilled history into history, and
+        re-measure it afterwards. Yields history (the same list)."""
+        if session_id is None:
+            yield history
+            return
+        restore = stale = None
+        with self._lock:
+            session = self._session(session_id)
+            session.in_use += 1
+            session.version += 1
+            if history is not None and session.history_spilled:
+                if history is session.history:
+                    restore = self._path(session_id, "history.json")
+                else:
+                    # The session moved on to a different list (e.g. after a reload); the spilled copy is stale.
+                    stale = self._discard_spilled_history(session_id, session)
+        _unlink(stale)
+        if restore is not None:
+            # Nothing else spills or restores this session while in_use is held.
+            try:
+                with open(restore, "r", encoding="utf-8") as f:
+                    history[:0] = json.load(f)
+            except (OSError, ValueError) as e:
+                logger.warning(f"Dropping spilled session history: {e}")
+            with self._lock:
+                stale = self._discard_spilled_history(session_id, session)
+            _unlink(stale)
+        try:
+            yield history
+        finally:
+            with self._lock:
+                session.in_use -= 1
+                session.version += 1
+                session.last_active = time.monotonic()
+                if history is not None:
+                    self._measure(session, history)
+            self.enforce_budget()
+
+    def track(self, session_id, history):
+        """Register a history a handler has just replaced (loaded or cleared) for session_id."""
+        if session_id is None:
+            return
+        with self._lock:
+            session = self._session(session_id)
+            stale = self._discard_spilled_history(session_id, session)
+            self._measure(session, history)
+            session.version += 1
+            session.last_active = time.monotonic()
+        _unlink(stale)
+        self.enforce_budget()
+
+    def _measure(self, session, history):
+        session.history = history
+        session.messages = len(history)
+        session.history_size = history_bytes(history)
+
+    def _discard_spilled_history(self, session_id, session):
+        """Mark the history resident again; returns the spill file for the caller to unlink."""
+        if not session.history_spilled:
+            return None
+        session.history_spilled = False
+        return self._path(session_id, "history.json")
+
+    # --- Eviction ---
+    def _spill(self, session_ids):
+        """Move the given sessions' histories and blobs to disk; returns the bytes freed.
+
+        The state is snapshotted under the lock, written without it, and committed only
+        for sessions that did not change in the meantime.
+        """
+        with self._lock:
+            snapshots = []
+            for session_id in session_ids:
+                session = self._sessions.get(session_id)
+                if session is None or session.in_use:
+                    continue
+                history = list(session.history) if session.history and not session.history_spilled else None
+                blob = session.blob if session.blob_resident else None
+                if history or blob:
+                    snapshots.append((session_id, session, session.version, history, blob))
+        written = []
+        for session_id, session, version, history, blob in snapshots:
+            paths = [None, None]
+            try:
+                os.makedirs(os.path.join(self.spill_dir, session_id), exist_ok=True)
+                if history:
+                    paths[0] = self._path(session_id, "history.json")
+                    with open(paths[0], "w", encoding="utf-8") as f:
+                        json.dump(history, f, ensure_ascii=False)
+                if blob:
+                    paths[1] = self._blob_path(session_id, blob[0])
+                    if not os.path.exists(paths[1]):
+                        with open(paths[1], "w") as f:
+                            f.write(blob[1])
+            except OSError as e:
+                logger.warning(f"Could not spill session: {e}")
+                for path in paths:
+                    _unlink(path)
+                continue
+            written.append((session_id, session, version, paths))
+        freed = 0
+        abandoned = []
+        with self._lock:
+            for session_id, session, version, paths in written:
+                if self._sessions.get(session_id) is not session or session.in_use or session.version != version:
+                    abandoned.append((session_id, paths))
+                    continue
+                if paths[0]:
+                    session.history.clear()
+                    session.history_spilled = True
+                    freed += session.history_size
+                if paths[1]:
+                    session.blob = (session.blob[0], None)
+                    session.blob_resident = False
+                    freed += session.blob_size
+        for session_id, paths in abandoned:
+            for path in paths:
+                _unlink(path)
+            if session_id not in self._sessions:
+                shutil.rmtree(os.path.join(self.spill_dir, session_id), ignore_errors=True)
+        return freed
+
+    def resident_bytes(self):
+        return sum(session.resident_bytes for session in self._sessions.values())
+
+    def enforce_budget(self):
+        """Wake the sweeper when the total resident size is over the budget; never spills inline."""
+        if self.budget_bytes <= 0:
+            return
+        with self._lock:
+            over = self.resident_bytes() > self.budget_bytes
+        if over:
+            self._wake.set()
+
+    def spill_over_budget(self):
+        """Spill the least recently active idle sessions until the total fits the budget."""
+        if self.budget_bytes <= 0:
+            return
+        with self._lock:
+            excess = self.resident_bytes() - self.budget_bytes
+            if excess <= 0:
+                return
+            candidates = sorted(
+                ((s.last_active, sid, s) for sid, s in self._sessions.items() if not s.in_use and s.resident_bytes),
+                key=lambda item: item[0]
+            )
+            victims = []
+            for _, session_id, session in candidates:
+                victims.append(session_id)
+                excess -= session.resident_bytes
+                if excess <= 0:
+                    break
+        self._spill(victims)
+
+    def sweep(self):
+        """Spill every session idle for longer than idle_ttl."""
+        if self.idle_ttl <= 0:
+            return
+        cutoff = time.monotonic() - self.idle_ttl
+        with self._lock:
+            victims = [
+                session_id for session_id, session in self._sessions.items()
+                if not session.in_use and session.last_active < cutoff and session.resident_bytes
+            ]
+        self._spill(victims)
+
+    def forget(self, session_id):
+        """Drop everything held for a session that has ended."""
+        with self._lock:
+            self._sessions.pop(session_id, None)
+        shutil.rmtree(os.path.join(self.spill_dir, session_id), ignore_errors=True)
+
+    def clear_stale(self):
+        """Delete spill directories left behind by processes that are no longer running."""
+        try:
+            entries = os.listdir(self.root_dir)
+        except OSError:
+            return
+        for entry in entries:
+            if not entry.isdigit() or int(entry) == os.getpid():
+                continue
+            try:
+                os.kill(int(entry), 0)
+                continue  # still running
+            except ProcessLookupError:
+                pass
+            except OSError:
+                continue  # running under another user
+            shutil.rmtree(os.path.join(self.root_dir, entry), ignore_errors=True)
+
+    def start(self, interval=30.0):
+        """Run the sweeper thread: sweep() every interval seconds, spill_over_budget() when woken."""
+        if self._sweeper is not None or (self.idle_ttl <= 0 and self.budget_bytes <= 0):
+            return
+
+        def loop():
+            while True:
+                self._wake.wait(interval)
+                self._wake.clear()
+                try:
+                    self.sweep()
+                    self.spill_over_budget()
+                except Exception as e:
+                    logger.warning(f"Session sweep failed: {e!r}")
+
+        self._sweeper = threading.Thread(target=loop, name="session-sweeper", daemon=True)
+        self._sweeper.start()
+
+    # --- Diagnostics ---
+    def stats(self):
+        """Per-session sizes, most resident first, plus totals."""
+        now = time.monotonic()
+        with self._lock:
+            sessions = [
+                {
+                    "session": session_id[:8],
+                    "messages": session.messages,
+                    "resident_bytes": session.resident_bytes,
+                    "spilled_bytes": (session.history_size if session.history_spilled else 0)
+                                     + (0 if session.blob_resident else session.blob_size),
+                    "idle_seconds": round(now - session.last_active),
+                    "busy": bool(session.in_use),
+                }
+                for session_id, session in self._sessions.items()
+            ]
+        sessions.sort(key=lambda s: -s["resident_bytes"])
+        return {
+            "sessions": sessions,
+            "resident_bytes": sum(s["resident_bytes"] for s in sessions),
+            "spilled_bytes": sum(s["spilled_bytes"] for s in sessions),
+            "budget_bytes": self.budget_bytes,
+        }
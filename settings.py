@@ -0,0 +1,212 @@
+import os
+
+# Runtime tuning knobs. Every value can be overridden with a NEUROPRIME_* environment
+# variable so deployments can be tuned without editing code.
+
+def env_str(name, default):
+    value = os.environ.get(name)
+    return value if value not in (None, "") else default
+
+def env_int(name, default):
+    try:
+        return int(os.environ[name])
+    except (KeyError, ValueError):
+        return default
+
+def env_float(name, default):
+    try:
+        return float(os.environ[name])
+    except (KeyError, ValueError):
+        return default
+
+def env_bool(name, default):
+    value = os.environ.get(name)
+    if value is None or value == "":
+        return default
+    return value.strip().lower() in ("1", "true", "yes", "on")
+
+def env_list(name, default):
+    """Parse "a,b,c" into a tuple of non-empty strings."""
+    value = os.environ.get(name)
+    if value is None:
+        return tuple(default)
+    return tuple(item.strip() for item in value.split(",") if item.strip())
+
+def env_map(name, default, cast=str):
+    """Parse "key=value,key=value" into a dict; malformed entries are ignored."""
+    value = os.environ.get(name)
+    if not value:
+        return dict(default)
+    result = {}
+    for item in value.split(","):
+        key, sep, raw = item.partition("=")
+        if not sep:
+            continue
+        try:
+            result[key.strip()] = cast(raw.strip())
+        except ValueError:
+            continue
+    return result
+
+def lookup_by_prefix(mapping, model, default):
+    """mapping's value for the longest key that model starts with (e.g. "openai/gpt-4o" over "openai/"), else default."""
+    matches = [prefix for prefix in mapping if model and model.startswith(prefix)]
+    if not matches:
+        return default
+    return mapping[max(matches, key=len)]
+
+# --- OpenRouter HTTP Client ---
+# Point at a local stand-in (see bench/mock_openrouter.py) for load tests.
+OPENROUTER_BASE_URL = env_str("NEUROPRIME_OPENROUTER_BASE_URL", "https://openrouter.ai/api/v1")
+HTTP_CONNECT_TIMEOUT = env_float("NEUROPRIME_HTTP_CONNECT_TIMEOUT", 10.0)
+HTTP_READ_TIMEOUT = env_float("NEUROPRIME_HTTP_READ_TIMEOUT", 120.0)
+HTTP_WRITE_TIMEOUT = env_float("NEUROPRIME_HTTP_WRITE_TIMEOUT", 30.0)
+HTTP_POOL_TIMEOUT = env_float("NEUROPRIME_HTTP_POOL_TIMEOUT", 30.0)
+HTTP_MAX_CONNECTIONS = env_int("NEUROPRIME_HTTP_MAX_CONNECTIONS", 512)
+HTTP_MAX_KEEPALIVE_CONNECTIONS = env_int("NEUROPRIME_HTTP_MAX_KEEPALIVE_CONNECTIONS", 64)
+HTTP_KEEPALIVE_EXPIRY = env_float("NEUROPRIME_HTTP_KEEPALIVE_EXPIRY", 60.0)
+# HTTP/2 needs the `h2` package, which requirements.txt installs via httpx[http2]; without it
+# the client logs a warning and stays on HTTP/1.1.
+HTTP2 = env_bool("NEUROPRIME_HTTP2", True)
+HTTP_MAX_RETRIES = env_int("NEUROPRIME_HTTP_MAX_RETRIES", 2)
+HTTP_RETRY_BACKOFF = env_float("NEUROPRIME_HTTP_RETRY_BACKOFF", 0.5)
+HTTP_RETRY_BACKOFF_MAX = env_float("NEUROPRIME_HTTP_RETRY_BACKOFF_MAX", 8.0)
+# Wall-clock limit on one LLM call, covering rate-limit waits, retries and the whole stream;
+# 0 disables it. Per-model overrides keyed by model-id prefix, e.g. "openai/o1=600,mock/=5".
+REQUEST_DEADLINE = env_float("NEUROPRIME_REQUEST_DEADLINE", 300.0)
+REQUEST_MODEL_DEADLINES = env_map("NEUROPRIME_REQUEST_MODEL_DEADLINES", {}, float)
+
+# --- Chat ---
+STREAM_RESPONSES = env_bool("NEUROPRIME_STREAM_RESPONSES", True)
+# Pipeline mode prefetches the reasoning framework while the user types; off by default
+# because it spends a reasoning call on drafts that may never be sent.
+PIPELINE_MODE = env_bool("NEUROPRIME_PIPELINE_MODE", False)
+PIPELINE_DEBOUNCE = env_float("NEUROPRIME_PIPELINE_DEBOUNCE", 0.6)
+# Compare mode fans one prompt out to this many models at most (one UI pane each).
+MAX_COMPARE_MODELS = env_int("NEUROPRIME_MAX_COMPARE_MODELS", 4)
+
+# --- Rate Limiting ---
+# Token buckets in requests/second shared by every session using the same key; 0 disables one.
+# Set them from your OpenRouter plan, e.g. "meta-llama/=0.33" in the model map for a 20/minute free tier.
+RATE_LIMIT_KEY_RPS = env_float("NEUROPRIME_RATE_LIMIT_KEY_RPS", 0.0)
+RATE_LIMIT_KEY_BURST = env_int("NEUROPRIME_RATE_LIMIT_KEY_BURST", 20)
+RATE_LIMIT_MODEL_RPS = env_float("NEUROPRIME_RATE_LIMIT_MODEL_RPS", 0.0)
+RATE_LIMIT_MODEL_RATES = env_map("NEUROPRIME_RATE_LIMIT_MODEL_RATES", {}, float)
+RATE_LIMIT_MODEL_BURST = env_int("NEUROPRIME_RATE_LIMIT_MODEL_BURST", 10)
+# Adaptive cap on requests in flight per key: halved on a 429, +1 per window of successes.
+RATE_LIMIT_INITIAL_CONCURRENCY = env_int("NEUROPRIME_RATE_LIMIT_INITIAL_CONCURRENCY", 64)
+RATE_LIMIT_MIN_CONCURRENCY = env_int("NEUROPRIME_RATE_LIMIT_MIN_CONCURRENCY", 1)
+RATE_LIMIT_MAX_CONCURRENCY = env_int("NEUROPRIME_RATE_LIMIT_MAX_CONCURRENCY", 256)
+# 429s are retried this many times; a Retry-After longer than RATE_LIMIT_MAX_WAIT seconds is surfaced instead.
+RATE_LIMIT_MAX_RETRIES = env_int("NEUROPRIME_RATE_LIMIT_MAX_RETRIES", 4)
+RATE_LIMIT_MAX_WAIT = env_float("NEUROPRIME_RATE_LIMIT_MAX_WAIT", 60.0)
+
+# --- Sampling ---
+# Unset means the provider default. A temperature of 0 or a fixed seed makes replies
+# deterministic, which is what the response cache needs.
+CHAT_TEMPERATURE = env_float("NEUROPRIME_TEMPERATURE", None)
+CHAT_SEED = env_int("NEUROPRIME_SEED", None)
+
+# --- Prompt Caching ---
+# Chat requests keep their prefix (system prompt, summary, earlier turns) byte-identical across
+# turns so providers can serve it from their prompt cache. Models matching these id prefixes
+# also get explicit cache_control breakpoints; OpenAI-style providers cache automatically.
+PROMPT_CACHE_BREAKPOINTS = env_bool("NEUROPRIME_PROMPT_CACHE_BREAKPOINTS", True)
+PROMPT_CACHE_MODELS = env_list("NEUROPRIME_PROMPT_CACHE_MODELS", ("anthropic/", "google/gemini"))
+
+# --- Response Cache ---
+# Opt-in: replays replies to byte-identical deterministic requests from disk.
+RESPONSE_CACHE_ENABLED = env_bool("NEUROPRIME_RESPONSE_CACHE", False)
+RESPONSE_CACHE_MAX_BYTES = env_int("NEUROPRIME_RESPONSE_CACHE_MAX_BYTES", 64 * 2**20)
+
+# --- Server ---
+SERVER_HOST = env_str("NEUROPRIME_HOST", env_str("GRADIO_SERVER_NAME", "127.0.0.1"))
+SERVER_PORT = env_int("NEUROPRIME_PORT", env_int("GRADIO_SERVER_PORT", 7860))
+# Serve a team from one process: the saved config becomes read-only shared defaults, each
+# browser session keeps its own API key and model list, and history is scoped per user.
+MULTI_USER = env_bool("NEUROPRIME_MULTI_USER", False)
+# Encrypts the per-browser id kept in localStorage. Defaults to a secret generated once and
+# stored in the app data directory; set it when several server processes share one database.
+BROWSER_STATE_SECRET = env_str("NEUROPRIME_BROWSER_STATE_SECRET", None)
+
+# --- Request Queue ---
+# Per-event limits on in-flight handlers; the shared HTTP pool should be at least as large.
+CHAT_CONCURRENCY_LIMIT = env_int("NEUROPRIME_CHAT_CONCURRENCY_LIMIT", 256)
+REASONING_CONCURRENCY_LIMIT = env_int("NEUROPRIME_REASONING_CONCURRENCY_LIMIT", 128)
+QUEUE_DEFAULT_CONCURRENCY_LIMIT = env_int("NEUROPRIME_QUEUE_DEFAULT_CONCURRENCY_LIMIT", 8)
+QUEUE_MAX_SIZE = env_int("NEUROPRIME_QUEUE_MAX_SIZE", 0)  # 0 means unbounded
+
+# --- Config Persistence ---
+# Config changes are coalesced and written this many seconds after the first one in a burst.
+CONFIG_FLUSH_DELAY = env_float("NEUROPRIME_CONFIG_FLUSH_DELAY", 0.5)
+
+# --- Reasoning Frameworks ---
+# Match queries to the curated framework library locally and skip the reasoning call when
+# the classifier is confident. Raise the minimum score to send more queries to the model.
+REASONING_LOCAL_FAST_PATH = env_bool("NEUROPRIME_REASONING_LOCAL_FAST_PATH", True)
+REASONING_LOCAL_MIN_SCORE = env_float("NEUROPRIME_REASONING_LOCAL_MIN_SCORE", 2.0)
+
+# --- Reasoning Cache ---
+REASONING_CACHE_SIZE = env_int("NEUROPRIME_REASONING_CACHE_SIZE", 512)  # 0 disables the cache
+REASONING_CACHE_TTL = env_float("NEUROPRIME_REASONING_CACHE_TTL", 7 * 24 * 3600.0)
+# Jaccard similarity (0-1) for near-duplicate hits; 0 restricts the cache to exact matches.
+REASONING_CACHE_SIMILARITY = env_float("NEUROPRIME_REASONING_CACHE_SIMILARITY", 0.0)
+
+# --- Conversation History ---
+HISTORY_PAGE_SIZE = env_int("NEUROPRIME_HISTORY_PAGE_SIZE", 50)
+HISTORY_LIST_SIZE = env_int("NEUROPRIME_HISTORY_LIST_SIZE", 50)
+# The Chatbot renders only this many of the newest messages (0 shows all), so each turn
+# costs the same to send and render however long the conversation gets.
+CHAT_WINDOW_MESSAGES = env_int("NEUROPRIME_CHAT_WINDOW_MESSAGES", 50)
+SEARCH_RESULTS = env_int("NEUROPRIME_SEARCH_RESULTS", 20)
+
+# --- Session Memory ---
+# Resident size of all sessions' chat histories and pending images; past it, the least
+# recently active sessions are spilled to disk (0 disables the budget).
+SESSION_MEMORY_BUDGET = env_int("NEUROPRIME_SESSION_MEMORY_BUDGET", 256 * 2**20)
+# Sessions idle this long are spilled by a sweep every SESSION_SWEEP_INTERVAL seconds (0 disables).
+SESSION_IDLE_TTL = env_float("NEUROPRIME_SESSION_IDLE_TTL", 900.0)
+SESSION_SWEEP_INTERVAL = env_float("NEUROPRIME_SESSION_SWEEP_INTERVAL", 30.0)
+
+# --- Image Uploads ---
+IMAGE_MAX_EDGE = env_int("NEUROPRIME_IMAGE_MAX_EDGE", 2048)
+# Per-model overrides keyed by model-id prefix, e.g. "anthropic/=1568,google/=3072".
+IMAGE_MODEL_MAX_EDGES = env_map("NEUROPRIME_IMAGE_MODEL_MAX_EDGES", {"anthropic/": 1568, "openai/": 2048}, int)
+IMAGE_BYTE_BUDGET = env_int("NEUROPRIME_IMAGE_BYTE_BUDGET", 1_000_000)
+IMAGE_CACHE_SIZE = env_int("NEUROPRIME_IMAGE_CACHE_SIZE", 32)
+
+# --- Model Catalog ---
+# The /models listing is cached on disk and revalidated (with its ETag) once it is this old.
+MODEL_CATALOG_TTL = env_float("NEUROPRIME_MODEL_CATALOG_TTL", 6 * 3600.0)
+
+# --- Model Router ---
+# Each model keeps its last MODEL_STATS_WINDOW calls (none older than MODEL_STATS_MAX_AGE seconds):
+# time to first token, tokens/second, outcome and cost.
+MODEL_STATS_WINDOW = env_int("NEUROPRIME_MODEL_STATS_WINDOW", 100)
+MODEL_STATS_MAX_AGE = env_float("NEUROPRIME_MODEL_STATS_MAX_AGE", 6 * 3600.0)
+# The "auto" model tries each model ROUTER_MIN_SAMPLES times, then picks the one expected to finish
+# a ROUTER_REPLY_TOKENS-token reply soonest among those failing at most ROUTER_MAX_ERROR_RATE of calls.
+ROUTER_MIN_SAMPLES = env_int("NEUROPRIME_ROUTER_MIN_SAMPLES", 3)
+ROUTER_MAX_ERROR_RATE = env_float("NEUROPRIME_ROUTER_MAX_ERROR_RATE", 0.25)
+ROUTER_REPLY_TOKENS = env_int("NEUROPRIME_ROUTER_REPLY_TOKENS", 300)
+
+# --- Context Window ---
+# Prompt budget per turn is min(model window, CONTEXT_MAX_BUDGET) minus the reply reserve;
+# older turns beyond it are folded into a rolling summary.
+CONTEXT_DEFAULT_WINDOW = env_int("NEUROPRIME_CONTEXT_DEFAULT_WINDOW", 16000)
+CONTEXT_MODEL_WINDOWS = env_map("NEUROPRIME_CONTEXT_MODEL_WINDOWS", {
+    "openai/gpt-3.5-turbo": 16385,
+    "openai/gpt-4o": 128000,
+    "anthropic/": 200000,
+    "google/gemini": 1000000,
+}, int)
+CONTEXT_MAX_BUDGET = env_int("NEUROPRIME_CONTEXT_MAX_BUDGET", 32000)
+CONTEXT_REPLY_RESERVE = env_int("NEUROPRIME_CONTEXT_REPLY_RESERVE", 2048)
+CONTEXT_SUMMARY_SHARE = env_float("NEUROPRIME_CONTEXT_SUMMARY_SHARE", 0.15)
+# Once a turn overflows the budget, fold old turns until the prompt is down to this share
+# of it, so the summary (part of the cached prefix) changes only every few turns.
+CONTEXT_FOLD_TARGET = env_float("NEUROPRIME_CONTEXT_FOLD_TARGET", 0.7)
+
+# --- Batch Mode ---
+# Queries in flight at once when running batch.py; each may make a reasoning and an answer call.
+BATCH_CONCURRENCY = env_int("NEUROPRIME_BATCH_CONCURRENCY", 16)
@@ -0,0 +1,94 @@
+import builtins
+import importlib.util
+import sys
+import threading
+import time
+from contextlib import contextmanager
+
+# Cold-start bookkeeping: lazy module loading plus the phase and import timings
+# printed by `python app.py --profile-startup`.
+
+PROFILE_FLAG = "--profile-startup"
+STARTED_AT = time.perf_counter()
+
+_phases = []
+_checkpoint = STARTED_AT
+_import_seconds = {}
+_import_state = threading.local()
+_original_import = None
+
+# --- Lazy Imports ---
+def lazy_import(name):
+    """Return module name without executing it; the import runs on first attribute access."""
+    if name in sys.modules:
+        return sys.modules[name]
+    spec = importlib.util.find_spec(name)
+    if spec is None:
+        raise ImportError(f"No module named {name!r}")
+    loader = importlib.util.LazyLoader(spec.loader)
+    spec.loader = loader
+    module = importlib.util.module_from_spec(spec)
+    sys.modules[name] = module
+    loader.exec_module(module)
+    parent, _, child = name.rpartition(".")
+    if parent:
+        # A normal import binds submodules on their package; `import PIL.Image` elsewhere relies on it.
+        setattr(sys.modules[parent], child, module)
+    return module
+
+# --- Profiling ---
+def profiling():
+    return _original_import is not None
+
+def begin():
+    """Start timing imports when the process was launched with --profile-startup."""
+    global _original_import
+    if PROFILE_FLAG in sys.argv and _original_import is None:
+        _original_import = builtins.__import__
+        builtins.__import__ = _timed_import
+
+def _timed_import(name, globals=None, locals=None, fromlist=(), level=0):
+    # Only the outermost import of a module not yet loaded is timed, so each package's
+    # figure includes everything it pulls in and nothing is counted twice.
+    if level or getattr(_import_state, "depth", 0) or name in sys.modules:
+        return _original_import(name, globals, locals, fromlist, level)
+    _import_state.depth = 1
+    started = time.perf_counter()
+    try:
+        return _original_import(name, globals, locals, fromlist, level)
+    finally:
+        _import_state.depth = 0
+        package = name.partition(".")[0]
+        _import_seconds[package] = _import_seconds.get(package, 0.0) + time.perf_counter() - started
+
+def mark(name):
+    """Record the time since the previous mark or phase as a phase called name."""
+    global _checkpoint
+    now = time.perf_counter()
+    _phases.append((name, now - _checkpoint))
+    _checkpoint = now
+
+@contextmanager
+def phase(name):
+    global _checkpoint
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        _checkpoint = time.perf_counter()
+        _phases.append((name, _checkpoint - started))
+
+def summary():
+    phases = ", ".join(f"{name} {seconds:.2f}s" for name, seconds in _phases)
+    return f"Startup took {time.perf_counter() - STARTED_AT:.2f}s ({phases})"
+
+def report(top=20):
+    lines = ["Startup phases:"]
+    for name, seconds in _phases:
+        lines.append(f"  {name:<28} {seconds * 1000:9.1f} ms")
+    if _import_seconds:
+        lines.append(f"Slowest imports (inclusive, top {top}):")
+        for package, seconds in sorted(_import_seconds.items(), key=lambda item: -item[1])[:top]:
+            lines.append(f"  {package:<28} {seconds * 1000:9.1f} ms")
+    lines.append(f"Total since startup began: {(time.perf_counter() - STARTED_AT) * 1000:.1f} ms")
+    return "\n".join(lines)
@@ -0,0 +1,76 @@
+from context_window import (
+    MESSAGE_OVERHEAD_TOKENS, SUMMARY_HEADER, ContextManager, estimate_tokens, message_tokens
+)
+
+SYSTEM = "You are a helpful assistant."
+
+def turns(count, words=50):
+    return [
+        {"role": "user" if i % 2 == 0 else "assistant", "content": f"turn {i} " + "word " * words}
+        for i in range(count)
+    ]
+
+def prompt_tokens(messages):
+    return sum(message_tokens(m) for m in messages)
+
+def test_short_history_is_sent_verbatim():
+    history = turns(4)
+    messages, summary = ContextManager().build(SYSTEM, history, budget=10000)
+    assert messages == [{"role": "system", "content": SYSTEM}] + history
+    assert summary == {"covered": 0, "lines": []}
+
+def test_long_history_is_folded_into_a_summary_within_budget():
+    history = turns(40)
+    messages, summary = ContextManager().build(SYSTEM, history, budget=1000)
+    assert summary["covered"] > 0
+    assert messages[1]["role"] == "system" and messages[1]["content"].startswith(SUMMARY_HEADER)
+    # The newest turns stay verbatim and in order.
+    assert messages[2:] == history[summary["covered"]:]
+    assert prompt_tokens(messages) <= 1000
+
+def test_min_recent_messages_are_kept_even_over_budget():
+    history = turns(6, words=2000)
+    messages, summary = ContextManager(min_recent_messages=2).build(SYSTEM, history, budget=300)
+    assert messages[-2:] == history[-2:]
+    assert summary["covered"] == 4
+
+def test_summary_is_carried_between_turns():
+    manager = ContextManager()
+    history = turns(40)
+    _, summary = manager.build(SYSTEM, history, budget=1000)
+    history += turns(2)
+    messages, next_summary = manager.build(SYSTEM, history, budget=1000, summary=summary)
+    assert next_summary["covered"] >= summary["covered"]
+    assert messages[-2:] == history[-2:]
+
+def test_stale_summary_is_reset_when_history_shrinks():
+    manager = ContextManager()
+    messages, summary = manager.build(SYSTEM, turns(2), budget=10000, summary={"covered": 30, "lines": ["- user: old"]})
+    assert summary == {"covered": 0, "lines": []}
+    assert len(messages) == 3
+
+def test_summary_share_caps_the_summary():
+    manager = ContextManager(summary_share=0.1)
+    messages, summary = manager.build(SYSTEM, turns(200), budget=2000)
+    assert estimate_tokens(messages[1]["content"]) + MESSAGE_OVERHEAD_TOKENS <= 200 or len(summary["lines"]) == 1
+
+def test_extra_tokens_shrink_the_verbatim_window():
+    manager = ContextManager()
+    history = turns(40)
+    _, plain = manager.build(SYSTEM, history, budget=2000)
+    _, with_image = manager.build(SYSTEM, history, budget=2000, extra_tokens=1000)
+    assert with_image["covered"] > plain["covered"]
+
+def test_budget_uses_longest_matching_prefix_and_lookup():
+    manager = ContextManager(
+        default_window=8000, model_windows={"openai/": 16000, "openai/gpt-4o": 128000}, max_budget=32000,
+        reply_reserve=2000, window_lookup=lambda model: 64000 if model == "meta/llama" else None
+    )
+    assert manager.budget_for("openai/gpt-4o") == 30000
+    assert manager.budget_for("openai/gpt-3.5-turbo") == 14000
+    assert manager.budget_for("meta/llama") == 30000
+    assert manager.budget_for("unknown/model") == 6000
+
+def test_image_parts_count_as_image_tokens():
+    message = {"role": "user", "content": [{"type": "text", "text": "hi"}, {"type": "image_url", "image_url": {}}]}
+    assert message_tokens(message) > 1000
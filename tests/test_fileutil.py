@@ -0,0 +1,16 @@
+import os
+
+from fileutil import create_text_once
+
+def test_create_text_once_creates_a_private_file(tmp_path):
+    path = str(tmp_path / "sub" / "secret")
+    assert create_text_once(path, "first") == "first"
+    assert open(path).read() == "first"
+    assert os.stat(path).st_mode & 0o777 == 0o600
+
+def test_create_text_once_keeps_the_existing_file(tmp_path):
+    path = str(tmp_path / "secret")
+    create_text_once(path, "first")
+    assert create_text_once(path, "second") == "first"
+    assert open(path).read() == "first"
+    assert os.listdir(tmp_path) == ["secret"]
@@ -0,0 +1,52 @@
+import pytest
+
+import frameworks
+
+@pytest.fixture
+def classifier():
+    return frameworks.FrameworkClassifier()
+
+@pytest.mark.parametrize("query, expected", [
+    ("Why does my code throw an exception and crash?", "debugging"),
+    ("Prove this theorem about the integral", "math"),
+    ("What is the probability and odds of winning this bet", "uncertainty"),
+    ("Should I choose option A or B, pros and cons?", "decision"),
+    ("Design a scalable distributed architecture", "systems"),
+    ("Brainstorm a creative name for my startup", "creative"),
+    ("Why did the Roman empire collapse, what caused it", "causal"),
+    ("Explain the concept of entropy so I understand it", "explanation"),
+    ("Plan a roadmap and timeline for my startup launch", "planning"),
+    ("Rewrite this email in a friendlier tone", "writing"),
+    ("Analyze this dataset for correlation and trend", "data"),
+    ("Implement a python function to parse dates", "coding"),
+])
+def test_confident_matches(classifier, query, expected):
+    assert classifier.classify(query).id == expected
+
+@pytest.mark.parametrize("query", [
+    "Fix my resume wording",
+    "Solve this riddle",
+    "Compute the meaning of life",
+    "Explain quantum physics",
+    "What is the weather like today",
+    "",
+    None,
+])
+def test_vague_queries_go_to_the_model(classifier, query):
+    assert classifier.classify(query) is None
+
+def test_single_keyword_hit_is_not_enough(classifier):
+    score, hits = max(classifier.scores("Explain quantum physics"))
+    assert hits == 1 and score >= classifier.min_score
+    assert classifier.classify("Explain quantum physics") is None
+
+def test_tie_between_pairs_goes_to_the_model(classifier):
+    # "script" (coding) and "crash" + "traceback" (debugging) split the vote.
+    assert classifier.classify("My Python script crashes with a traceback") is None
+
+def test_min_hits_is_configurable():
+    assert frameworks.FrameworkClassifier(min_hits=1).classify("Explain quantum physics").id == "explanation"
+
+def test_generic_verbs_are_not_keywords():
+    keywords = {keyword for pair in frameworks.LIBRARY for keyword in pair.keywords}
+    assert not keywords & {"fix", "issue", "error", "solve", "compute"}
@@ -0,0 +1,53 @@
+import httpx
+import pytest
+
+import metrics
+from model_stats import ModelStats
+from openrouter_client import CallResult
+
+@pytest.fixture
+def stats(tmp_path):
+    return ModelStats(str(tmp_path / "model_stats.json"), save_interval=1e9)
+
+def fast(stats, model, calls=3, ttft=0.2, seconds=1.0):
+    for _ in range(calls):
+        stats.observe_call(CallResult("chat", model, "ok", ttft=ttft, seconds=seconds, usage={"completion_tokens": 200}))
+
+def http_error(status):
+    request = httpx.Request("POST", "https://openrouter.ai/api/v1/chat/completions")
+    return httpx.HTTPStatusError("error", request=request, response=httpx.Response(status, request=request))
+
+def test_client_errors_count_against_the_model(stats):
+    for _ in range(3):
+        stats.observe_call(CallResult("chat", "dead/model", metrics.outcome_of(http_error(404))))
+    summary = stats.summary("dead/model")
+    assert summary["samples"] == 3
+    assert summary["error_rate"] == 1.0
+
+def test_cancellations_are_not_recorded(stats):
+    stats.observe_call(CallResult("chat", "a/model", "cancelled"))
+    assert stats.summary("a/model")["samples"] == 0
+
+def test_route_explores_unmeasured_models_first(stats):
+    fast(stats, "a/model")
+    assert stats.route(["a/model", "b/model"]) == "b/model"
+
+def test_route_stops_exploring_a_model_that_rejects_requests(stats):
+    fast(stats, "a/model")
+    for _ in range(3):
+        assert stats.route(["a/model", "dead/model"]) == "dead/model"
+        stats.observe_call(CallResult("chat", "dead/model", metrics.outcome_of(http_error(400))))
+    assert stats.route(["a/model", "dead/model"]) == "a/model"
+
+def test_route_prefers_the_faster_healthy_model(stats):
+    fast(stats, "slow/model", ttft=1.0, seconds=5.0)
+    fast(stats, "quick/model", ttft=0.1, seconds=1.0)
+    assert stats.route(["slow/model", "quick/model"]) == "quick/model"
+    assert stats.route(["slow/model", "quick/model"], accept=lambda model: model != "quick/model") == "slow/model"
+    assert stats.route(["quick/model"], accept=lambda model: False) is None
+
+def test_stats_survive_a_restart(stats, tmp_path):
+    fast(stats, "a/model")
+    stats.save()
+    reloaded = ModelStats(str(tmp_path / "model_stats.json"))
+    assert reloaded.summary("a/model")["samples"] == 3
@@ -0,0 +1,18 @@
+import pytest
+
+from openrouter_client import chunk_delta
+
+def test_chunk_delta_returns_the_text():
+    assert chunk_delta({"choices": [{"delta": {"content": "hi"}}]}) == "hi"
+    assert chunk_delta({"choices": [{"delta": {}}]}) == ""
+    assert chunk_delta({"choices": []}) == ""
+
+@pytest.mark.parametrize("error, message", [
+    ({"message": "Provider overloaded", "code": 502}, "Provider overloaded"),
+    ({"code": 502}, "{'code': 502}"),
+    ("Provider overloaded", "Provider overloaded"),
+])
+def test_chunk_delta_raises_the_provider_message(error, message):
+    with pytest.raises(RuntimeError) as excinfo:
+        chunk_delta({"error": error})
+    assert str(excinfo.value) == message
@@ -0,0 +1,75 @@
+import prompt_builder
+from context_window import ContextManager
+
+HISTORY = [
+    {"role": "system", "content": "You are helpful."},
+    {"role": "user", "content": "first question"},
+    {"role": "assistant", "content": "first answer"},
+    {"role": "user", "content": "second question"},
+]
+
+def test_hybrid_prompt_leads_the_new_user_message():
+    messages = prompt_builder.build_messages(HISTORY, hybrid_prompt="Think step by step.")
+    assert [m["role"] for m in messages] == ["system", "user", "assistant", "user"]
+    assert messages[-1]["content"] == [
+        {"type": "text", "text": "Think step by step."},
+        {"type": "text", "text": "second question"},
+    ]
+
+def test_no_system_message_after_the_history():
+    messages = prompt_builder.build_messages(HISTORY, hybrid_prompt="prefix", image_data="abc", cache_breakpoints=True)
+    roles = [m["role"] for m in messages]
+    assert "system" not in roles[1:]
+    parts = messages[-1]["content"]
+    assert [p["type"] for p in parts] == ["text", "text", "image_url"]
+    assert all("cache_control" not in p for p in parts)
+
+def test_breakpoints_mark_system_prompt_and_previous_turn():
+    messages = prompt_builder.build_messages(HISTORY, hybrid_prompt="prefix", cache_breakpoints=True)
+    marked = [i for i, m in enumerate(messages) if m["content"][-1].get("cache_control")]
+    assert marked == [0, 2]
+
+def test_prefix_is_identical_with_and_without_a_hybrid_prompt():
+    plain = prompt_builder.build_messages(HISTORY, cache_breakpoints=True)
+    hybrid = prompt_builder.build_messages(HISTORY, hybrid_prompt="prefix", cache_breakpoints=True)
+    assert plain[:-1] == hybrid[:-1]
+
+def test_plain_turn_keeps_string_content():
+    messages = prompt_builder.build_messages(HISTORY)
+    assert messages == HISTORY
+
+def _strip_breakpoints(messages):
+    return [
+        {"role": m["role"], "content": [{k: v for k, v in part.items() if k != "cache_control"} for part in m["content"]]}
+        for m in messages
+    ]
+
+def _shared_prefix(previous, current):
+    shared = 0
+    for old, new in zip(_strip_breakpoints(previous), _strip_breakpoints(current)):
+        if old != new:
+            break
+        shared += 1
+    return shared
+
+def test_prefix_stays_cacheable_after_folding_starts():
+    manager = ContextManager()
+    history, summary, requests = [], None, []
+    for turn in range(40):
+        history.append({"role": "user", "content": f"question {turn} " + "word " * 60})
+        messages, summary = manager.build("You are helpful.", history, 1500, summary)
+        requests.append((summary["covered"], prompt_builder.build_messages(messages, cache_breakpoints=True)))
+        history.append({"role": "assistant", "content": f"answer {turn} " + "word " * 60})
+
+    folding = [i for i in range(1, len(requests)) if requests[i - 1][0] > 0]
+    assert len(folding) > 20
+    reused = 0
+    for i in folding:
+        previous, current = requests[i - 1][1], requests[i][1]
+        shared = _shared_prefix(previous, current)
+        # The static system prompt always matches, and carries its own breakpoint.
+        assert shared >= 1 and current[0]["content"][-1].get("cache_control")
+        # Everything the previous request sent, up to its new user message, is reused.
+        reused += shared >= len(previous) - 1
+    # Only the turns that fold more history change the summary.
+    assert reused >= len(folding) * 0.6
@@ -0,0 +1,146 @@
+import asyncio
+import threading
+
+import pytest
+
+import rate_limiter
+from rate_limiter import AdaptiveConcurrency, RateLimiter, TokenBucket, parse_retry_after
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+        self.slept = []
+
+    def monotonic(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.slept.append(seconds)
+        self.now += seconds
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(rate_limiter.time, "monotonic", clock.monotonic)
+    monkeypatch.setattr(rate_limiter.time, "sleep", clock.sleep)
+    return clock
+
+# --- Token bucket ---
+def test_bucket_allows_a_burst_then_spaces_requests(clock):
+    bucket = TokenBucket(rate=2.0, burst=3)
+    assert [bucket.reserve() for _ in range(3)] == [0.0, 0.0, 0.0]
+    # Callers beyond the burst queue up in arrival order, 1/rate apart.
+    assert bucket.reserve() == pytest.approx(0.5)
+    assert bucket.reserve() == pytest.approx(1.0)
+
+def test_bucket_refills_over_time_up_to_burst(clock):
+    bucket = TokenBucket(rate=2.0, burst=2)
+    bucket.reserve()
+    bucket.reserve()
+    clock.now += 0.5
+    assert bucket.reserve() == 0.0
+    assert bucket.reserve() == pytest.approx(0.5)
+    clock.now += 3600
+    # An idle hour refills to the burst size, not beyond it.
+    assert [bucket.reserve() for _ in range(2)] == [0.0, 0.0]
+    assert bucket.reserve() > 0
+
+# --- AIMD concurrency ---
+def test_concurrency_queues_beyond_the_limit_and_hands_over_on_release():
+    limiter = AdaptiveConcurrency(initial=1)
+    epoch = limiter.acquire()
+    acquired = threading.Event()
+    thread = threading.Thread(target=lambda: (limiter.acquire(), acquired.set()))
+    thread.start()
+    assert not acquired.wait(0.05)
+    limiter.release(epoch, rate_limited=False, success=True)
+    assert acquired.wait(1)
+    thread.join()
+    assert limiter.in_flight == 1
+
+def test_429_halves_the_limit_once_per_overload():
+    limiter = AdaptiveConcurrency(initial=16, minimum=2)
+    epochs = [limiter.acquire() for _ in range(4)]
+    for epoch in epochs:
+        limiter.release(epoch, rate_limited=True, success=False)
+    # Four rejections from requests started before the first cut count as one.
+    assert limiter.limit == 8
+    epoch = limiter.acquire()
+    limiter.release(epoch, rate_limited=True, success=False)
+    assert limiter.limit == 4
+    for _ in range(3):
+        limiter.release(limiter.acquire(), rate_limited=True, success=False)
+    assert limiter.limit == 2  # never below the minimum
+
+def test_successes_grow_the_limit_additively_up_to_maximum():
+    limiter = AdaptiveConcurrency(initial=4, maximum=6)
+    for _ in range(4):
+        limiter.release(limiter.acquire(), rate_limited=False, success=True)
+    assert limiter.limit == pytest.approx(5, abs=0.1)
+    for _ in range(100):
+        limiter.release(limiter.acquire(), rate_limited=False, success=True)
+    assert limiter.limit == 6
+
+def test_failures_other_than_429_leave_the_limit_alone():
+    limiter = AdaptiveConcurrency(initial=4)
+    limiter.release(limiter.acquire(), rate_limited=False, success=False)
+    assert limiter.limit == 4
+    assert limiter.in_flight == 0
+
+def test_cancelled_async_waiter_does_not_leak_a_slot():
+    async def scenario():
+        limiter = AdaptiveConcurrency(initial=1)
+        epoch = await limiter.acquire_async()
+        waiter = asyncio.ensure_future(limiter.acquire_async())
+        await asyncio.sleep(0)
+        waiter.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await waiter
+        limiter.release(epoch, rate_limited=False, success=True)
+        assert limiter.in_flight == 0
+        await asyncio.wait_for(limiter.acquire_async(), 1)
+        assert limiter.in_flight == 1
+    asyncio.run(scenario())
+
+# --- Shared limiter ---
+def test_retry_after_blocks_the_key_and_model(clock):
+    limiter = RateLimiter()
+    permit = limiter.acquire("key", "openai/gpt-4o")
+    limiter.release(permit, status_code=429, retry_after=5)
+    permit = limiter.acquire("key", "openai/gpt-4o")
+    assert clock.slept == [5]
+    assert permit.waited == pytest.approx(5)
+    limiter.release(permit, status_code=200)
+    # Other models on the same key are not blocked.
+    limiter.release(limiter.acquire("key", "anthropic/claude-3-haiku"), status_code=200)
+    assert clock.slept == [5]
+
+def test_429_recovers_after_successes(clock):
+    limiter = RateLimiter(initial_concurrency=8)
+    limiter.release(limiter.acquire("key", "m"), status_code=429)
+    concurrency = limiter.concurrency_for(RateLimiter.key_id("key"))
+    assert concurrency.limit == 4
+    for _ in range(30):
+        limiter.release(limiter.acquire("key", "m"), status_code=200)
+    assert concurrency.limit > 7
+
+def test_keys_are_limited_independently(clock):
+    limiter = RateLimiter(key_rate=1.0, key_burst=1)
+    limiter.release(limiter.acquire("a", "m"), status_code=200)
+    limiter.release(limiter.acquire("b", "m"), status_code=200)
+    assert clock.slept == []
+    limiter.release(limiter.acquire("a", "m"), status_code=200)
+    assert clock.slept == [pytest.approx(1.0)]
+
+def test_model_rate_uses_longest_prefix():
+    limiter = RateLimiter(model_rate=5.0, model_rates={"meta-llama/": 0.33, "meta-llama/llama-3-70b": 1.0})
+    assert limiter.rate_for("meta-llama/llama-3-70b-instruct") == 1.0
+    assert limiter.rate_for("meta-llama/llama-3-8b") == 0.33
+    assert limiter.rate_for("openai/gpt-4o") == 5.0
+
+def test_parse_retry_after():
+    assert parse_retry_after("2.5") == 2.5
+    assert parse_retry_after("-3") == 0.0
+    assert parse_retry_after(None) is None
+    assert parse_retry_after("not a date") is None
+    assert parse_retry_after("Wed, 21 Oct 2015 07:28:00 GMT") == 0.0
@@ -0,0 +1,174 @@
+import json
+import os
+import time
+import types
+
+import pytest
+
+import session_memory
+from session_memory import SessionMemory
+
+def make_history(turns, size=100):
+    history = []
+    for i in range(turns):
+        history.append({"role": "user", "content": f"question {i} " + "q" * size})
+        history.append({"role": "assistant", "content": f"answer {i} " + "a" * size})
+    return history
+
+@pytest.fixture
+def memory(tmp_path):
+    return SessionMemory(str(tmp_path / "spill"), budget_bytes=0, idle_ttl=60.0)
+
+def spill_all(memory):
+    memory._spill(list(memory._sessions))
+
+def test_spill_files_live_in_a_per_process_directory(tmp_path):
+    root = tmp_path / "spill"
+    (root / "other").mkdir(parents=True)
+    (root / "other" / "keep").write_text("x")
+    memory = SessionMemory(str(root))
+    assert memory.spill_dir == os.path.join(str(root), str(os.getpid()))
+    # Constructing one (batch.py, --reindex-search) must not delete anything.
+    assert (root / "other" / "keep").exists()
+
+def test_spilled_history_is_restored_in_place(memory):
+    history = make_history(3)
+    expected = [dict(m) for m in history]
+    memory.track("s1", history)
+    spill_all(memory)
+    assert history == []
+    assert memory.resident_bytes() == 0
+    with memory.use("s1", history) as restored:
+        assert restored is history
+        assert history == expected
+    assert not os.path.exists(os.path.join(memory.spill_dir, "s1", "history.json"))
+
+def test_missing_history_file_drops_the_spilled_state(memory, caplog):
+    history = make_history(2)
+    memory.track("s1", history)
+    spill_all(memory)
+    os.unlink(os.path.join(memory.spill_dir, "s1", "history.json"))
+    with memory.use("s1", history):
+        assert history == []
+    assert not memory._sessions["s1"].history_spilled
+    assert "Dropping spilled session history" in caplog.text
+
+def test_blob_round_trip_through_disk(memory):
+    data = "b" * 5000
+    handle = memory.store_blob("s1", data)
+    assert handle.startswith(session_memory.BLOB_PREFIX)
+    spill_all(memory)
+    assert memory._sessions["s1"].blob == (handle, None)
+    assert memory.resolve("s1", handle) == data
+    assert memory.resolve("s1", "plain value") == "plain value"
+
+def test_missing_blob_file_resolves_to_none(memory, caplog):
+    handle = memory.store_blob("s1", "b" * 5000)
+    spill_all(memory)
+    os.unlink(os.path.join(memory.spill_dir, "s1", handle[len(session_memory.BLOB_PREFIX):]))
+    assert memory.resolve("s1", handle) is None
+    assert memory._sessions["s1"].blob is None
+    assert "Dropping spilled session image" in caplog.text
+
+def test_stale_handle_resolves_to_none(memory):
+    memory.store_blob("s1", "first")
+    handle = memory.store_blob("s1", "second")
+    assert memory.resolve("s1", session_memory.BLOB_PREFIX + "0" * 32) is None
+    assert memory.resolve("s1", handle) == "second"
+
+def test_budget_spills_least_recently_active_first(tmp_path):
+    size = session_memory.history_bytes(make_history(5))
+    memory = SessionMemory(str(tmp_path / "spill"), budget_bytes=int(size * 2.5))
+    histories = {sid: make_history(5) for sid in ("old", "mid", "new")}
+    for sid in ("old", "mid", "new"):
+        memory.track(sid, histories[sid])
+    # Handlers only flag the overrun; the sweeper thread does the writing.
+    assert histories["old"] and memory._wake.is_set()
+    memory.spill_over_budget()
+    assert histories["old"] == []
+    assert histories["mid"] and histories["new"]
+    assert memory.resident_bytes() <= memory.budget_bytes
+
+def test_budget_never_spills_a_busy_session(tmp_path):
+    size = session_memory.history_bytes(make_history(5))
+    memory = SessionMemory(str(tmp_path / "spill"), budget_bytes=size)
+    busy, other = make_history(5), make_history(5)
+    memory.track("busy", busy)
+    with memory.use("busy", busy):
+        memory.track("other", other)
+        memory.spill_over_budget()
+        assert busy
+    assert other == []
+
+def test_sweep_spills_idle_sessions(memory):
+    idle, active = make_history(2), make_history(2)
+    memory.track("idle", idle)
+    memory.track("active", active)
+    memory._sessions["idle"].last_active -= 120
+    memory.sweep()
+    assert idle == [] and active
+
+def test_forget_removes_the_session_and_its_files(memory):
+    history = make_history(2)
+    memory.track("s1", history)
+    spill_all(memory)
+    memory.forget("s1")
+    assert "s1" not in memory._sessions
+    assert not os.path.exists(os.path.join(memory.spill_dir, "s1"))
+
+def test_clear_stale_only_removes_dead_processes(tmp_path, monkeypatch):
+    root = tmp_path / "spill"
+    memory = SessionMemory(str(root))
+    for pid in ("111", "222", str(os.getpid())):
+        (root / pid).mkdir(parents=True)
+
+    def fake_kill(pid, signal):
+        if pid == 111:
+            raise ProcessLookupError
+
+    monkeypatch.setattr(session_memory.os, "kill", fake_kill)
+    memory.clear_stale()
+    assert sorted(p.name for p in root.iterdir()) == sorted(["222", str(os.getpid())])
+
+def test_spill_is_dropped_when_the_session_changes_meanwhile(memory, monkeypatch):
+    history = make_history(2)
+    memory.track("s1", history)
+
+    def dump(data, f, **kwargs):
+        # A handler picks the session up while its spill is being written.
+        memory.track("s1", history)
+        json.dump(data, f, **kwargs)
+
+    monkeypatch.setattr(session_memory, "json", types.SimpleNamespace(dump=dump, load=json.load))
+    spill_all(memory)
+    assert len(history) == 4
+    assert not memory._sessions["s1"].history_spilled
+    assert not os.path.exists(os.path.join(memory.spill_dir, "s1", "history.json"))
+
+def test_spill_writes_happen_outside_the_lock(memory, monkeypatch):
+    memory.track("s1", make_history(2))
+    held = []
+
+    def dump(data, f, **kwargs):
+        acquired = memory._lock.acquire(blocking=False)
+        held.append(not acquired)
+        if acquired:
+            memory._lock.release()
+        json.dump(data, f, **kwargs)
+
+    monkeypatch.setattr(session_memory, "json", types.SimpleNamespace(dump=dump, load=json.load))
+    spill_all(memory)
+    assert held == [False]
+
+def test_sweeper_thread_spills_over_budget(tmp_path):
+    size = session_memory.history_bytes(make_history(5))
+    memory = SessionMemory(str(tmp_path / "spill"), budget_bytes=size, idle_ttl=0)
+    first, second = make_history(5), make_history(5)
+    memory.track("first", first)
+    memory.start(interval=60.0)
+    memory.track("second", second)
+    for _ in range(200):
+        if first == []:
+            break
+        time.sleep(0.01)
+    assert first == [] and second